@@ -1,11 +1,27 @@
 from flask import Blueprint, jsonify, request, session
 from src.models import db, User, Book, BorrowRecord, Fees
 from datetime import datetime, timedelta
-from sqlalchemy import func, and_
+from sqlalchemy.orm import contains_eager, joinedload
+from src.library_counters import increment_counters, read_counters
+from src.keyset_pagination import InvalidCursor, clamp_page_size, keyset_page
+from src.query_budget import query_budget
+from src.catalog_etag import catalog_etag
+from src.reporting_db import use_reporting_db
+from src.signals import book_changed, send_after_commit, user_changed
+from src.stats_service import get_stats
+from src.leaderboards import LEADERBOARD_WINDOWS, top_books, top_users
+from src.book_search import search_books_query
+from src.search_fanout import merge_results, run_searches
+from src.circulation_reports import active_users, circulation_summary, popular_books, year_over_year
 
 admin_bp = Blueprint('admin_api', __name__)
 
+def _wants_total():
+    """Whether the client asked for an (O(1), counter-based) estimated total"""
+    return request.args.get('include_total', '').lower() in ('1', 'true', 'yes')
+
 @admin_bp.route('/dashboard', methods=['GET'])
+@query_budget(2)
 def get_admin_dashboard():
     """Get comprehensive admin dashboard data"""
     try:
@@ -18,30 +34,17 @@ def get_admin_dashboard():
             return jsonify({'error': 'Access denied'}), 403
         
         # Get dashboard statistics
-        total_books = Book.query.count()
-        total_users = User.query.count()
-        borrowed_books = BorrowRecord.query.filter_by(return_date=None).count()
-        total_fines = db.session.query(
-            func.coalesce(func.sum(Fees.amount), 0)
-        ).scalar()
-        
-        active_students = User.query.filter_by(role='student').count()
-        overdue_books = BorrowRecord.query.filter(
-            and_(
-                BorrowRecord.return_date.is_(None),
-                BorrowRecord.due_date < datetime.utcnow()
-            )
-        ).count()
+        stats = get_stats()
         
         return jsonify({
             'success': True,
             'stats': {
-                'totalBooks': total_books,
-                'totalUsers': total_users,
-                'borrowedBooks': borrowed_books,
-                'totalFines': float(total_fines),
-                'activeStudents': active_students,
-                'overdueBooks': overdue_books
+                'totalBooks': stats['total_books'],
+                'totalUsers': stats['total_users'],
+                'borrowedBooks': stats['open_loans'],
+                'totalFines': stats['total_fines'],
+                'activeStudents': stats['total_students'],
+                'overdueBooks': stats['overdue_loans']
             }
         })
         
@@ -49,6 +52,7 @@ def get_admin_dashboard():
         return jsonify({'error': str(e)}), 500
 
 @admin_bp.route('/activity', methods=['GET'])
+@query_budget(4)
 def get_admin_activity():
     """Get recent admin activity"""
     try:
@@ -83,14 +87,15 @@ def get_admin_activity():
             })
         
         # Recent borrowings
-        recent_borrows = BorrowRecord.query.order_by(BorrowRecord.borrow_date.desc()).limit(5).all()
+        recent_borrows = BorrowRecord.query.options(
+            joinedload(BorrowRecord.book),
+            joinedload(BorrowRecord.user)
+        ).order_by(BorrowRecord.borrow_date.desc()).limit(5).all()
         for record in recent_borrows:
-            book = Book.query.get(record.book_id)
-            user = User.query.get(record.user_id)
             activities.append({
                 'type': 'book_borrowed',
                 'title': 'Book Borrowed',
-                'description': f"'{book.title}' borrowed by {user.fullname}",
+                'description': f"'{record.book.title}' borrowed by {record.user.fullname}",
                 'date': record.borrow_date.isoformat()
             })
         
@@ -102,9 +107,85 @@ def get_admin_activity():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _search_books(query):
+    return [{
+        'id': book.id,
+        'title': book.title,
+        'author': book.author,
+        'isbn': book.isbn,
+        'category': book.category,
+        'available_quantity': book.available_quantity,
+        'total_quantity': book.total_quantity
+    } for book in search_books_query(query).limit(10).all()]
+
+def _search_users(query):
+    users = User.query.filter(
+        User.fullname.ilike(f'%{query}%') |
+        User.username.ilike(f'%{query}%') |
+        User.email.ilike(f'%{query}%')
+    ).limit(10).all()
+    
+    return [{
+        'id': user.id,
+        'fullname': user.fullname,
+        'username': user.username,
+        'email': user.email,
+        'role': user.role
+    } for user in users]
+
+def _search_borrowed(query):
+    records = BorrowRecord.query.join(BorrowRecord.user).join(BorrowRecord.book).options(
+        contains_eager(BorrowRecord.user),
+        contains_eager(BorrowRecord.book)
+    ).filter(
+        User.fullname.ilike(f'%{query}%') |
+        Book.title.ilike(f'%{query}%')
+    ).limit(10).all()
+    
+    return [{
+        'id': record.id,
+        'user_name': record.user.fullname,
+        'book_title': record.book.title,
+        'borrow_date': record.borrow_date.isoformat(),
+        'due_date': record.due_date.isoformat(),
+        'return_date': record.return_date.isoformat() if record.return_date else None
+    } for record in records]
+
+def _search_fines(query):
+    fines = Fees.query.join(Fees.user).options(
+        contains_eager(Fees.user)
+    ).filter(
+        User.fullname.ilike(f'%{query}%') |
+        Fees.reason.ilike(f'%{query}%')
+    ).limit(10).all()
+    
+    return [{
+        'id': fine.id,
+        'user_name': fine.user.fullname,
+        'amount': float(fine.amount),
+        'reason': fine.reason,
+        'date': fine.date.isoformat()
+    } for fine in fines]
+
+ADMIN_SEARCHES = {
+    'books': _search_books,
+    'users': _search_users,
+    'borrowed': _search_borrowed,
+    'fines': _search_fines,
+}
+
+# Fields each type's results are ranked on in a merged (type=all) search
+ADMIN_SEARCH_FIELDS = {
+    'books': ('title', 'author', 'isbn'),
+    'users': ('fullname', 'username', 'email'),
+    'borrowed': ('user_name', 'book_title'),
+    'fines': ('user_name', 'reason'),
+}
+
 @admin_bp.route('/search', methods=['GET'])
+@query_budget(5)
 def admin_search():
-    """Admin search functionality"""
+    """Admin search: one type, or type=all for every type at once, merged by relevance"""
     try:
         if 'user_id' not in session:
             return jsonify({'error': 'Unauthorized'}), 401
@@ -116,82 +197,35 @@ def admin_search():
         query = request.args.get('q', '')
         search_type = request.args.get('type', 'books')
         
-        results = []
+        if search_type == 'all':
+            searches = ADMIN_SEARCHES
+        else:
+            searches = {name: search for name, search in ADMIN_SEARCHES.items() if name == search_type}
         
-        if search_type == 'books':
-            books = Book.query.filter(
-                Book.title.ilike(f'%{query}%') |
-                Book.author.ilike(f'%{query}%') |
-                Book.isbn.ilike(f'%{query}%')
-            ).limit(10).all()
-            
-            results = [{
-                'id': book.id,
-                'title': book.title,
-                'author': book.author,
-                'isbn': book.isbn,
-                'category': book.category,
-                'available_quantity': book.available_quantity,
-                'total_quantity': book.total_quantity
-            } for book in books]
-        
-        elif search_type == 'users':
-            users = User.query.filter(
-                User.fullname.ilike(f'%{query}%') |
-                User.username.ilike(f'%{query}%') |
-                User.email.ilike(f'%{query}%')
-            ).limit(10).all()
-            
-            results = [{
-                'id': user.id,
-                'fullname': user.fullname,
-                'username': user.username,
-                'email': user.email,
-                'role': user.role
-            } for user in users]
-        
-        elif search_type == 'borrowed':
-            records = BorrowRecord.query.join(User).join(Book).filter(
-                User.fullname.ilike(f'%{query}%') |
-                Book.title.ilike(f'%{query}%')
-            ).limit(10).all()
-            
-            results = [{
-                'id': record.id,
-                'user_name': record.user.fullname,
-                'book_title': record.book.title,
-                'borrow_date': record.borrow_date.isoformat(),
-                'due_date': record.due_date.isoformat(),
-                'return_date': record.return_date.isoformat() if record.return_date else None
-            } for record in records]
-        
-        elif search_type == 'fines':
-            fines = Fees.query.join(User).filter(
-                User.fullname.ilike(f'%{query}%') |
-                Fees.reason.ilike(f'%{query}%')
-            ).limit(10).all()
-            
-            results = [{
-                'id': fine.id,
-                'user_name': fine.user.fullname,
-                'amount': float(fine.amount),
-                'reason': fine.reason,
-                'date': fine.date.isoformat()
-            } for fine in fines]
+        # Concurrent, each type against its own deadline; late types are left out
+        found, timed_out = run_searches(searches, query)
+        
+        if search_type == 'all':
+            results = merge_results(query, found, ADMIN_SEARCH_FIELDS)
+        else:
+            results = found.get(search_type, [])
         
         return jsonify({
             'success': True,
             'results': results,
             'type': search_type,
-            'query': query
+            'query': query,
+            'timed_out': timed_out
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @admin_bp.route('/books', methods=['GET'])
+@query_budget(4)
+@catalog_etag(private=True)
 def get_all_books():
-    """Get all books with pagination"""
+    """Get all books with keyset pagination"""
     try:
         if 'user_id' not in session:
             return jsonify({'error': 'Unauthorized'}), 401
@@ -200,10 +234,11 @@ def get_all_books():
         if not user or user.role != 'admin':
             return jsonify({'error': 'Access denied'}), 403
         
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
+        per_page = clamp_page_size(request.args.get('per_page', type=int))
         
-        books = Book.query.paginate(page=page, per_page=per_page, error_out=False)
+        books, next_cursor = keyset_page(
+            Book.query, Book.id, request.args.get('cursor'), per_page
+        )
         
         books_data = [{
             'id': book.id,
@@ -214,16 +249,20 @@ def get_all_books():
             'available_quantity': book.available_quantity,
             'total_quantity': book.total_quantity,
             'description': book.description
-        } for book in books.items]
+        } for book in books]
         
-        return jsonify({
+        response = {
             'success': True,
             'books': books_data,
-            'total': books.total,
-            'page': page,
+            'next_cursor': next_cursor,
             'per_page': per_page
-        })
+        }
+        if _wants_total():
+            response['total'] = read_counters()['total_books']
+        return jsonify(response)
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -251,6 +290,15 @@ def add_book():
         )
         
         db.session.add(book)
+        db.session.flush()
+        increment_counters(
+            total_books=1,
+            available_titles=1 if book.available_quantity > 0 else 0,
+            total_copies=book.total_quantity,
+            available_copies=book.available_quantity
+        )
+        send_after_commit(book_changed, book_id=book.id, action='added', title=book.title,
+                          author=book.author, isbn=book.isbn)
         db.session.commit()
         
         return jsonify({
@@ -281,6 +329,7 @@ def update_book(book_id):
         
         book = Book.query.get_or_404(book_id)
         data = request.get_json()
+        old_total, old_available = book.total_quantity, book.available_quantity
         
         book.title = data.get('title', book.title)
         book.author = data.get('author', book.author)
@@ -292,6 +341,13 @@ def update_book(book_id):
             book.total_quantity = data['total_quantity']
             book.available_quantity = data['total_quantity'] - (book.total_quantity - book.available_quantity)
         
+        increment_counters(
+            available_titles=int(book.available_quantity > 0) - int(old_available > 0),
+            total_copies=book.total_quantity - old_total,
+            available_copies=book.available_quantity - old_available
+        )
+        send_after_commit(book_changed, book_id=book_id, action='updated', title=book.title,
+                          author=book.author, isbn=book.isbn)
         db.session.commit()
         
         return jsonify({
@@ -326,6 +382,14 @@ def delete_book(book_id):
             return jsonify({'error': 'Cannot delete book with active borrows'}), 400
         
         db.session.delete(book)
+        increment_counters(
+            total_books=-1,
+            available_titles=-1 if book.available_quantity > 0 else 0,
+            total_copies=-book.total_quantity,
+            available_copies=-book.available_quantity
+        )
+        send_after_commit(book_changed, book_id=book_id, action='deleted', title=book.title,
+                          author=book.author, isbn=book.isbn)
         db.session.commit()
         
         return jsonify({
@@ -338,8 +402,9 @@ def delete_book(book_id):
         return jsonify({'error': str(e)}), 500
 
 @admin_bp.route('/users', methods=['GET'])
+@query_budget(3)
 def get_all_users():
-    """Get all users with pagination"""
+    """Get all users with keyset pagination"""
     try:
         if 'user_id' not in session:
             return jsonify({'error': 'Unauthorized'}), 401
@@ -348,10 +413,11 @@ def get_all_users():
         if not user or user.role != 'admin':
             return jsonify({'error': 'Access denied'}), 403
         
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
+        per_page = clamp_page_size(request.args.get('per_page', type=int))
         
-        users = User.query.paginate(page=page, per_page=per_page, error_out=False)
+        users, next_cursor = keyset_page(
+            User.query, User.id, request.args.get('cursor'), per_page
+        )
         
         users_data = [{
             'id': user.id,
@@ -359,16 +425,20 @@ def get_all_users():
             'username': user.username,
             'email': user.email,
             'role': user.role
-        } for user in users.items]
+        } for user in users]
         
-        return jsonify({
+        response = {
             'success': True,
             'users': users_data,
-            'total': users.total,
-            'page': page,
+            'next_cursor': next_cursor,
             'per_page': per_page
-        })
+        }
+        if _wants_total():
+            response['total'] = read_counters()['total_users']
+        return jsonify(response)
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -386,10 +456,15 @@ def update_user(user_id):
         user = User.query.get_or_404(user_id)
         data = request.get_json()
         
+        old_role = user.role
         user.fullname = data.get('fullname', user.fullname)
         user.email = data.get('email', user.email)
         user.role = data.get('role', user.role)
         
+        increment_counters(
+            total_students=int(user.role == 'student') - int(old_role == 'student')
+        )
+        send_after_commit(user_changed, user_id=user_id, action='updated')
         db.session.commit()
         
         return jsonify({
@@ -424,6 +499,11 @@ def delete_user(user_id):
             return jsonify({'error': 'Cannot delete user with active borrows'}), 400
         
         db.session.delete(user)
+        increment_counters(
+            total_users=-1,
+            total_students=-1 if user.role == 'student' else 0
+        )
+        send_after_commit(user_changed, user_id=user_id, action='deleted')
         db.session.commit()
         
         return jsonify({
@@ -436,8 +516,9 @@ def delete_user(user_id):
         return jsonify({'error': str(e)}), 500
 
 @admin_bp.route('/borrowing-records', methods=['GET'])
+@query_budget(3)
 def get_borrowing_records():
-    """Get all borrowing records"""
+    """Get borrowing records, newest first, with keyset pagination"""
     try:
         if 'user_id' not in session:
             return jsonify({'error': 'Unauthorized'}), 401
@@ -446,29 +527,49 @@ def get_borrowing_records():
         if not user or user.role != 'admin':
             return jsonify({'error': 'Access denied'}), 403
         
-        records = BorrowRecord.query.join(User).join(Book).all()
+        per_page = clamp_page_size(request.args.get('per_page', type=int))
+        
+        query = db.session.query(
+            BorrowRecord, User.fullname, Book.title
+        ).join(
+            User, BorrowRecord.user_id == User.id
+        ).join(
+            Book, BorrowRecord.book_id == Book.id
+        )
+        records, next_cursor = keyset_page(
+            query, BorrowRecord.id, request.args.get('cursor'), per_page,
+            descending=True, key=lambda row: row[0].id
+        )
         
         records_data = [{
             'id': record.id,
-            'user_name': record.user.fullname,
-            'book_title': record.book.title,
+            'user_name': user_name,
+            'book_title': book_title,
             'borrow_date': record.borrow_date.isoformat(),
             'due_date': record.due_date.isoformat(),
             'return_date': record.return_date.isoformat() if record.return_date else None,
             'fine': float(record.fine) if record.fine else 0
-        } for record in records]
+        } for record, user_name, book_title in records]
         
-        return jsonify({
+        response = {
             'success': True,
-            'records': records_data
-        })
+            'records': records_data,
+            'next_cursor': next_cursor,
+            'per_page': per_page
+        }
+        if _wants_total():
+            response['total'] = read_counters()['total_loans']
+        return jsonify(response)
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @admin_bp.route('/fines', methods=['GET'])
+@query_budget(3)
 def get_all_fines():
-    """Get all fines"""
+    """Get fines, newest first, with keyset pagination"""
     try:
         if 'user_id' not in session:
             return jsonify({'error': 'Unauthorized'}), 401
@@ -477,27 +578,65 @@ def get_all_fines():
         if not user or user.role != 'admin':
             return jsonify({'error': 'Access denied'}), 403
         
-        fines = Fees.query.join(User).all()
+        per_page = clamp_page_size(request.args.get('per_page', type=int))
+        
+        query = db.session.query(
+            Fees, User.fullname
+        ).join(
+            User, Fees.user_id == User.id
+        )
+        fines, next_cursor = keyset_page(
+            query, Fees.id, request.args.get('cursor'), per_page,
+            descending=True, key=lambda row: row[0].id
+        )
         
         fines_data = [{
             'id': fine.id,
-            'user_name': fine.user.fullname,
+            'user_name': user_name,
             'amount': float(fine.amount),
             'reason': fine.reason,
             'date': fine.date.isoformat()
-        } for fine in fines]
+        } for fine, user_name in fines]
         
-        return jsonify({
+        response = {
             'success': True,
-            'fines': fines_data
-        })
+            'fines': fines_data,
+            'next_cursor': next_cursor,
+            'per_page': per_page
+        }
+        if _wants_total():
+            response['total'] = read_counters()['total_fine_count']
+        return jsonify(response)
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _fines_report(start, end):
+    summary = circulation_summary(start, end)
+    return {
+        'fines': summary['totals']['fines'],
+        'fine_amount': summary['totals']['fine_amount'],
+        'months': [{'month': month['month'], 'fines': month['fines'], 'fine_amount': month['fine_amount']}
+                   for month in summary['months']]
+    }
+
+# Reports over a date range, served from the monthly and daily circulation partials.
+# popular_books and active_users only use them when start or end is given.
+RANGE_REPORTS = {
+    'circulation': circulation_summary,
+    'fines': _fines_report,
+    'year_over_year': year_over_year,
+    'popular_books': lambda start, end: popular_books(start, end, 10),
+    'active_users': lambda start, end: active_users(start, end, 10),
+}
+
 @admin_bp.route('/reports', methods=['GET'])
+@query_budget(3)
+@use_reporting_db
 def generate_reports():
-    """Generate admin reports"""
+    """Generate admin reports (optionally over start/end dates as YYYY-MM-DD)"""
     try:
         if 'user_id' not in session:
             return jsonify({'error': 'Unauthorized'}), 401
@@ -507,55 +646,57 @@ def generate_reports():
             return jsonify({'error': 'Access denied'}), 403
         
         report_type = request.args.get('type', 'summary')
+        days = request.args.get('days', type=int)
+        if days is not None and days not in LEADERBOARD_WINDOWS:
+            return jsonify({'error': f"days must be one of {', '.join(map(str, LEADERBOARD_WINDOWS))}"}), 400
+        
+        ranged = 'start' in request.args or 'end' in request.args
+        if report_type in RANGE_REPORTS and (ranged or report_type not in ('popular_books', 'active_users')):
+            try:
+                today = datetime.utcnow().date()
+                end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if 'end' in request.args else today
+                start = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if 'start' in request.args \
+                    else end.replace(month=1, day=1)
+            except ValueError:
+                return jsonify({'error': 'start and end must be dates in YYYY-MM-DD format'}), 400
+            if start > end:
+                return jsonify({'error': 'start must not be after end'}), 400
+            
+            return jsonify({
+                'success': True,
+                'report': RANGE_REPORTS[report_type](start, end),
+                'type': report_type,
+                'start': start.isoformat(),
+                'end': end.isoformat()
+            })
         
         if report_type == 'summary':
             # Summary report
-            total_books = Book.query.count()
-            total_users = User.query.count()
-            borrowed_books = BorrowRecord.query.filter_by(return_date=None).count()
-            total_fines = db.session.query(
-                func.coalesce(func.sum(Fees.amount), 0)
-            ).scalar()
+            stats = get_stats()
             
             report = {
-                'total_books': total_books,
-                'total_users': total_users,
-                'borrowed_books': borrowed_books,
-                'total_fines': float(total_fines),
+                'total_books': stats['total_books'],
+                'total_users': stats['total_users'],
+                'borrowed_books': stats['open_loans'],
+                'total_fines': stats['total_fines'],
                 'generated_at': datetime.utcnow().isoformat()
             }
         
         elif report_type == 'popular_books':
-            # Most popular books
-            popular_books = db.session.query(
-                Book.title,
-                Book.author,
-                func.count(BorrowRecord.id).label('borrow_count')
-            ).join(BorrowRecord).group_by(Book.id).order_by(
-                func.count(BorrowRecord.id).desc()
-            ).limit(10).all()
-            
+            # Most popular books (all time, or the last ``days`` days)
             report = [{
-                'title': book.title,
-                'author': book.author,
-                'borrow_count': book.borrow_count
-            } for book in popular_books]
+                'title': book['title'],
+                'author': book['author'],
+                'borrow_count': book['borrow_count']
+            } for book in top_books(10, days)]
         
         elif report_type == 'active_users':
-            # Most active users
-            active_users = db.session.query(
-                User.fullname,
-                User.username,
-                func.count(BorrowRecord.id).label('borrow_count')
-            ).join(BorrowRecord).group_by(User.id).order_by(
-                func.count(BorrowRecord.id).desc()
-            ).limit(10).all()
-            
+            # Most active users (all time, or the last ``days`` days)
             report = [{
-                'fullname': user.fullname,
-                'username': user.username,
-                'borrow_count': user.borrow_count
-            } for user in active_users]
+                'fullname': user['fullname'],
+                'username': user['username'],
+                'borrow_count': user['borrow_count']
+            } for user in top_users(10, days)]
         
         return jsonify({
             'success': True,
@@ -2,6 +2,7 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
+from src.sqlite_profile import configure_sqlite, install_sqlite_pragmas
 import os
 import secrets
 import sys
@@ -21,11 +22,13 @@ def create_admin_app():
     db_path = os.path.join(instance_path, 'library_db.sqlite3')
     app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{db_path}"
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    configure_sqlite(app)
     app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', secrets.token_hex(32))
 
     CORS(app, origins=['http://localhost:3000', 'http://127.0.0.1:3000'])
 
     db.init_app(app)
+    install_sqlite_pragmas(app, db)
     jwt = JWTManager(app)
 
     # Import models here to register with SQLAlchemy
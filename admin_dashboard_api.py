@@ -1,107 +1,132 @@
 from flask import Blueprint, jsonify, request, session
 from src.app_factory_minimal import db
 from src.models import User, Book, BorrowRecord, Fees
+from src.query_budget import query_budget
+from src.reporting_db import use_reporting_db
+from sqlalchemy import Integer, bindparam, text
+from sqlalchemy.orm import contains_eager, joinedload
 from datetime import datetime, timedelta
+from src.signals import fines_assessed, send_after_commit
+from src.overdue_index import check_overdue_index, due_within, oldest_overdue, overdue_count
+from src.circulation_rollup import book_circulation, category_circulation, circulation_totals, daily_circulation
+from src.stats_service import get_stats
+from src.book_search import search_books_query
+from src.search_fanout import merge_results, run_searches
 import json
 
 admin_dashboard_bp = Blueprint('admin_dashboard', __name__, url_prefix='/api/admin')
 
+# Overdue loans as a range of the partial open-loan index; left to itself SQLite
+# reads the NULL range of ix_borrow_record_return_date instead
+_OVERDUE_SQL = (
+    "SELECT id FROM borrow_record INDEXED BY ix_borrow_record_open_due "
+    "WHERE return_date IS NULL AND due_date < :now"
+)
+
+# Fines for every loan still open a whole day past due, set in the same range
+# of open loans; the in-memory index can be stale for loans other workers returned
+_ASSESS_FINES_SQL = (
+    "UPDATE borrow_record INDEXED BY ix_borrow_record_open_due "
+    "SET fine = CASE WHEN julianday(:now) - julianday(due_date) >= 1 "
+    "THEN CAST(julianday(:now) - julianday(due_date) AS INTEGER) * :fine_per_day ELSE fine END "
+    "WHERE return_date IS NULL AND due_date < :now "
+    "RETURNING CASE WHEN julianday(:now) - julianday(due_date) >= 1 THEN fine ELSE 0 END"
+)
+
 @admin_dashboard_bp.route('/dashboard-stats')
+@query_budget(1)
 def dashboard_stats():
     """Get comprehensive dashboard statistics"""
     try:
-        # Book statistics
-        total_books = Book.query.count()
-        borrowed_books = BorrowRecord.query.filter(BorrowRecord.return_date.is_(None)).count()
-        available_books = total_books - borrowed_books
-        
-        # User statistics
-        total_users = User.query.count()
-        
-        # Fine statistics
-        total_fines = db.session.query(db.func.sum(Fees.amount)).scalar() or 0
-        
-        # Overdue books
-        overdue_books = BorrowRecord.query.filter(
-            BorrowRecord.return_date.is_(None),
-            BorrowRecord.due_date < datetime.now()
-        ).count()
+        stats = get_stats()
         
         return jsonify({
-            'totalBooks': total_books,
-            'totalUsers': total_users,
-            'borrowedBooks': borrowed_books,
-            'totalFines': float(total_fines),
-            'overdueBooks': overdue_books,
-            'availableBooks': available_books
+            'totalBooks': stats['total_books'],
+            'totalUsers': stats['total_users'],
+            'borrowedBooks': stats['open_loans'],
+            'totalFines': stats['total_fines'],
+            'overdueBooks': stats['overdue_loans'],
+            'availableBooks': stats['total_books'] - stats['open_loans']
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _search_books(query):
+    return [{
+        'type': 'book',
+        'id': book.id,
+        'title': book.title,
+        'author': book.author,
+        'isbn': book.isbn,
+        'copies': book.copies
+    } for book in search_books_query(query).limit(10).all()]
+
+def _search_users(query):
+    users = User.query.filter(
+        User.fullname.contains(query) | 
+        User.username.contains(query) | 
+        User.email.contains(query)
+    ).limit(10).all()
+    
+    return [{
+        'type': 'user',
+        'id': user.id,
+        'name': user.fullname,
+        'username': user.username,
+        'email': user.email,
+        'role': user.role
+    } for user in users]
+
+def _search_borrowed(query):
+    borrowed = BorrowRecord.query.join(BorrowRecord.user).join(BorrowRecord.book).options(
+        contains_eager(BorrowRecord.user),
+        contains_eager(BorrowRecord.book)
+    ).filter(
+        User.fullname.contains(query) | 
+        Book.title.contains(query)
+    ).limit(10).all()
+    
+    return [{
+        'type': 'borrowed',
+        'id': record.id,
+        'user': record.user.fullname,
+        'book': record.book.title,
+        'borrow_date': record.borrow_date.isoformat(),
+        'due_date': record.due_date.isoformat(),
+        'fine': record.fine
+    } for record in borrowed]
+
+GLOBAL_SEARCHES = {
+    'books': _search_books,
+    'users': _search_users,
+    'borrowed': _search_borrowed,
+}
+
+GLOBAL_SEARCH_FIELDS = {
+    'books': ('title', 'author', 'isbn'),
+    'users': ('name', 'username', 'email'),
+    'borrowed': ('user', 'book'),
+}
+
 @admin_dashboard_bp.route('/search')
+@query_budget(3)
 def global_search():
-    """Global search across books, users, and borrowed records"""
+    """Global search across books, users, and borrowed records, merged by relevance"""
     query = request.args.get('q', '')
     search_type = request.args.get('type', 'all')
     
     if not query:
         return jsonify([])
     
-    results = []
-    
     try:
-        if search_type in ['all', 'books']:
-            books = Book.query.filter(
-                Book.title.contains(query) | 
-                Book.author.contains(query) | 
-                Book.isbn.contains(query)
-            ).limit(10).all()
-            
-            for book in books:
-                results.append({
-                    'type': 'book',
-                    'id': book.id,
-                    'title': book.title,
-                    'author': book.author,
-                    'isbn': book.isbn,
-                    'copies': book.copies
-                })
-        
-        if search_type in ['all', 'users']:
-            users = User.query.filter(
-                User.fullname.contains(query) | 
-                User.username.contains(query) | 
-                User.email.contains(query)
-            ).limit(10).all()
-            
-            for user in users:
-                results.append({
-                    'type': 'user',
-                    'id': user.id,
-                    'name': user.fullname,
-                    'username': user.username,
-                    'email': user.email,
-                    'role': user.role
-                })
-        
-        if search_type in ['all', 'borrowed']:
-            borrowed = BorrowRecord.query.join(User).join(Book).filter(
-                User.fullname.contains(query) | 
-                Book.title.contains(query)
-            ).limit(10).all()
-            
-            for record in borrowed:
-                results.append({
-                    'type': 'borrowed',
-                    'id': record.id,
-                    'user': record.user.fullname,
-                    'book': record.book.title,
-                    'borrow_date': record.borrow_date.isoformat(),
-                    'due_date': record.due_date.isoformat(),
-                    'fine': record.fine
-                })
-        
-        return jsonify(results)
+        searches = {name: search for name, search in GLOBAL_SEARCHES.items() if search_type in ('all', name)}
+        # Concurrent, each type against its own deadline; late types are named in a header
+        found, timed_out = run_searches(searches, query)
+        
+        response = jsonify(merge_results(query, found, GLOBAL_SEARCH_FIELDS))
+        if timed_out:
+            response.headers['X-Search-Timed-Out'] = ', '.join(timed_out)
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -109,41 +134,57 @@ def global_search():
 def calculate_fines():
     """Calculate fines for overdue books"""
     try:
-        overdue_records = BorrowRecord.query.filter(
-            BorrowRecord.return_date.is_(None),
-            BorrowRecord.due_date < datetime.now()
-        ).all()
+        if 'user_id' not in session:
+            return jsonify({'error': 'Unauthorized'}), 401
         
-        fine_per_day = 1.0  # $1 per day
-        total_fines = 0
+        user = User.query.get(session['user_id'])
+        if not user or user.role != 'admin':
+            return jsonify({'error': 'Access denied'}), 403
         
-        for record in overdue_records:
-            days_overdue = (datetime.now() - record.due_date).days
-            if days_overdue > 0:
-                record.fine = days_overdue * fine_per_day
-                total_fines += record.fine
+        fine_per_day = 1.0  # $1 per day
+        # One set-based UPDATE; each overdue loan returns the fine it was assessed
+        fines = db.session.execute(
+            text(_ASSESS_FINES_SQL).bindparams(bindparam('now', type_=db.DateTime)),
+            {'now': datetime.utcnow(), 'fine_per_day': fine_per_day}
+        ).scalars().all()
+        total_fines = sum(fines, 0.0)
         
+        send_after_commit(fines_assessed, loans=len(fines), total=total_fines)
         db.session.commit()
         
         return jsonify({
-            'message': f'Fines calculated for {len(overdue_records)} overdue books',
+            'message': f'Fines calculated for {len(fines)} overdue books',
             'totalFines': total_fines
         })
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @admin_dashboard_bp.route('/overdue-books')
+@query_budget(2)
 def get_overdue_books():
     """Get list of overdue books"""
     try:
-        overdue = BorrowRecord.query.filter(
-            BorrowRecord.return_date.is_(None),
-            BorrowRecord.due_date < datetime.now()
-        ).all()
+        if 'user_id' not in session:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        user = User.query.get(session['user_id'])
+        if not user or user.role != 'admin':
+            return jsonify({'error': 'Access denied'}), 403
+        
+        now = datetime.utcnow()
+        # Most overdue first, in one statement however many loans are overdue
+        overdue_ids = text(_OVERDUE_SQL).bindparams(now=now).columns(id=Integer).subquery('overdue_ids')
+        overdue = BorrowRecord.query.join(
+            overdue_ids, overdue_ids.c.id == BorrowRecord.id
+        ).options(
+            joinedload(BorrowRecord.user),
+            joinedload(BorrowRecord.book)
+        ).order_by(BorrowRecord.due_date, BorrowRecord.id).all()
         
         result = []
         for record in overdue:
-            days_overdue = (datetime.now() - record.due_date).days
+            days_overdue = (now - record.due_date).days
             result.append({
                 'id': record.id,
                 'user': record.user.fullname,
@@ -157,41 +198,169 @@ def get_overdue_books():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@admin_dashboard_bp.route('/overdue-summary')
+@query_budget(1)
+def overdue_summary():
+    """Overdue count, loans due in the next ``days`` days and the most overdue loan"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        user = User.query.get(session['user_id'])
+        if not user or user.role != 'admin':
+            return jsonify({'error': 'Access denied'}), 403
+        
+        days = request.args.get('days', 3, type=int)
+        now = datetime.utcnow()
+        oldest = oldest_overdue(now)
+        
+        return jsonify({
+            'overdueCount': overdue_count(now),
+            'dueSoonDays': days,
+            'dueSoonCount': len(due_within(days, now)),
+            'oldestOverdue': {
+                'id': oldest.record_id,
+                'userId': oldest.user_id,
+                'bookId': oldest.book_id,
+                'due_date': oldest.due_date.isoformat(),
+                'days_overdue': (now - oldest.due_date).days
+            } if oldest else None
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_dashboard_bp.route('/overdue-index/check', methods=['GET'])
+def check_overdue_index_consistency():
+    """Compare the in-memory overdue index with the database"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        user = User.query.get(session['user_id'])
+        if not user or user.role != 'admin':
+            return jsonify({'error': 'Access denied'}), 403
+        
+        drift = check_overdue_index()
+        
+        return jsonify({
+            'consistent': not any(drift.values()),
+            **drift
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_dashboard_bp.route('/overdue-index/reload', methods=['POST'])
+def reload_overdue_index():
+    """Compare the in-memory overdue index with the database and reload it if they disagree"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        user = User.query.get(session['user_id'])
+        if not user or user.role != 'admin':
+            return jsonify({'error': 'Access denied'}), 403
+        
+        drift = check_overdue_index(fix=True)
+        consistent = not any(drift.values())
+        
+        return jsonify({
+            'consistent': consistent,
+            'reloaded': not consistent,
+            **drift
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @admin_dashboard_bp.route('/borrow-history')
+@query_budget(1)
+@use_reporting_db
 def borrow_history():
     """Get complete borrow history"""
     try:
-        history = BorrowRecord.query.join(User).join(Book).all()
+        # Plain joined columns: one statement, no ORM identity map for every loan
+        history = db.session.query(
+            BorrowRecord.id, User.fullname, Book.title, BorrowRecord.borrow_date,
+            BorrowRecord.due_date, BorrowRecord.return_date, BorrowRecord.fine
+        ).join(User, BorrowRecord.user_id == User.id
+        ).join(Book, BorrowRecord.book_id == Book.id).all()
         
         result = []
-        for record in history:
+        for record_id, fullname, title, borrow_date, due_date, return_date, fine in history:
             result.append({
-                'id': record.id,
-                'user': record.user.fullname,
-                'book': record.book.title,
-                'borrow_date': record.borrow_date.isoformat(),
-                'due_date': record.due_date.isoformat(),
-                'return_date': record.return_date.isoformat() if record.return_date else None,
-                'fine': record.fine or 0
+                'id': record_id,
+                'user': fullname,
+                'book': title,
+                'borrow_date': borrow_date.isoformat(),
+                'due_date': due_date.isoformat(),
+                'return_date': return_date.isoformat() if return_date else None,
+                'fine': fine or 0
             })
         
         return jsonify(result)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+CIRCULATION_GROUPS = {
+    'total': circulation_totals,
+    'day': daily_circulation,
+    'book': book_circulation,
+    'category': category_circulation,
+}
+MAX_CIRCULATION_DAYS = 3660
+
+@admin_dashboard_bp.route('/circulation')
+@query_budget(2)
+def circulation_report():
+    """Circulation totals for a date range (start/end as YYYY-MM-DD, default last 30 days)"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    user = User.query.get(session['user_id'])
+    if not user or user.role != 'admin':
+        return jsonify({'error': 'Access denied'}), 403
+    
+    group = request.args.get('group', 'day')
+    if group not in CIRCULATION_GROUPS:
+        return jsonify({'error': f"group must be one of: {', '.join(CIRCULATION_GROUPS)}"}), 400
+    try:
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if 'end' in request.args \
+            else datetime.utcnow().date()
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if 'start' in request.args \
+            else end - timedelta(days=29)
+    except ValueError:
+        return jsonify({'error': 'start and end must be dates in YYYY-MM-DD format'}), 400
+    if start > end or (end - start).days >= MAX_CIRCULATION_DAYS:
+        return jsonify({'error': f'start must not be after end and the range at most {MAX_CIRCULATION_DAYS} days'}), 400
+    
+    try:
+        return jsonify({
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'group': group,
+            'data': CIRCULATION_GROUPS[group](start, end)
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @admin_dashboard_bp.route('/export-inventory')
+@query_budget(1)
+@use_reporting_db
 def export_inventory():
     """Export book inventory as CSV"""
     try:
-        books = Book.query.all()
+        open_loans = db.session.query(
+            BorrowRecord.book_id,
+            db.func.count(BorrowRecord.id).label('borrowed_count')
+        ).filter(
+            BorrowRecord.return_date.is_(None)
+        ).group_by(BorrowRecord.book_id).subquery()
+        
+        books = db.session.query(
+            Book, db.func.coalesce(open_loans.c.borrowed_count, 0)
+        ).outerjoin(open_loans, open_loans.c.book_id == Book.id).all()
         
         inventory = []
-        for book in books:
-            borrowed_count = BorrowRecord.query.filter(
-                BorrowRecord.book_id == book.id,
-                BorrowRecord.return_date.is_(None)
-            ).count()
-            
+        for book, borrowed_count in books:
             inventory.append({
                 'id': book.id,
                 'title': book.title,
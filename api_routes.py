@@ -1,53 +1,40 @@
 from flask import Blueprint, jsonify, request
 from src.models import db, Book, Student, Issue
-from datetime import datetime, timedelta
+from src.query_budget import query_budget
+from src.catalog_etag import catalog_etag
+from src.catalog_facets import get_category_facets
+from src.book_search import isbn_books, normalize_isbn, search_books_query
+from src.book_suggest import suggest_books
+from src.search_cache import cached_search
+from sqlalchemy.orm import joinedload
+from datetime import datetime
+from src.stats_service import get_stats
+from src.leaderboards import top_books
 import random
 
 # Create a new blueprint for additional API routes
 api_bp = Blueprint('api_routes', __name__)
 
 @api_bp.route('/api/stats', methods=['GET'])
+@query_budget(2)
 def get_library_stats():
     """Get comprehensive library statistics"""
     try:
-        total_books = Book.query.count()
-        total_students = Student.query.count()
-        
-        # Books currently issued
-        books_issued = Issue.query.filter(
-            Issue.return_date.is_(None)
-        ).count()
-        
-        # Available books
-        available_books = total_books - books_issued
-        
-        # Recent activity (last 7 days)
-        seven_days_ago = datetime.utcnow() - timedelta(days=7)
-        recent_issues = Issue.query.filter(
-            Issue.issue_date >= seven_days_ago
-        ).count()
-        
-        # Popular books (most issued)
-        popular_books = db.session.query(
-            Book.title,
-            db.func.count(Issue.id).label('issue_count')
-        ).join(Issue).group_by(Book.id).order_by(
-            db.func.count(Issue.id).desc()
-        ).limit(5).all()
+        stats = get_stats()
         
         popular_books_list = [
-            {'title': book.title, 'issue_count': book.issue_count}
-            for book in popular_books
+            {'title': book['title'], 'issue_count': book['borrow_count']}
+            for book in top_books(5)
         ]
         
         return jsonify({
             'success': True,
             'data': {
-                'total_books': total_books,
-                'total_students': total_students,
-                'books_issued': books_issued,
-                'available_books': available_books,
-                'recent_issues': recent_issues,
+                'total_books': stats['total_books'],
+                'total_students': stats['total_users'],
+                'books_issued': stats['open_loans'],
+                'available_books': stats['total_books'] - stats['open_loans'],
+                'recent_issues': stats['issued_recently'],
                 'popular_books': popular_books_list
             }
         })
@@ -59,37 +46,25 @@ def get_library_stats():
 
 @api_bp.route('/api/books/search', methods=['GET'])
 def search_books():
-    """Search books by title, author, or category"""
+    """Search books by title, author, or category (best matches first)"""
     try:
         query = request.args.get('q', '')
         category = request.args.get('category', '')
         author = request.args.get('author', '')
         
-        books_query = Book.query
-        
-        if query:
-            books_query = books_query.filter(
-                Book.title.ilike(f'%{query}%') | 
-                Book.author.ilike(f'%{query}%')
-            )
-        
-        if category:
-            books_query = books_query.filter(Book.category.ilike(f'%{category}%'))
-            
-        if author:
-            books_query = books_query.filter(Book.author.ilike(f'%{author}%'))
+        def search():
+            books = search_books_query(query, category=category, author=author).limit(20).all()
+            return [{
+                'id': book.id,
+                'title': book.title,
+                'author': book.author,
+                'category': book.category,
+                'total_quantity': book.total_quantity,
+                'available_quantity': book.available_quantity,
+                'isbn': book.isbn
+            } for book in books]
         
-        books = books_query.limit(20).all()
-        
-        books_list = [{
-            'id': book.id,
-            'title': book.title,
-            'author': book.author,
-            'category': book.category,
-            'total_quantity': book.total_quantity,
-            'available_quantity': book.available_quantity,
-            'isbn': book.isbn
-        } for book in books]
+        books_list = cached_search('api.search_books', query, {'category': category, 'author': author}, search)
         
         return jsonify({
             'success': True,
@@ -102,6 +77,56 @@ def search_books():
             'error': str(e)
         }), 500
 
+@api_bp.route('/api/books/isbn/<isbn>', methods=['GET'])
+@query_budget(1)
+def get_book_by_isbn(isbn):
+    """Look up a book by ISBN-10 or ISBN-13, with or without hyphens (e.g. a scanned barcode)"""
+    try:
+        isbn13 = normalize_isbn(isbn)
+        if isbn13 is None:
+            return jsonify({'success': False, 'error': f"'{isbn}' is not a valid ISBN"}), 400
+        
+        book = isbn_books(isbn13).first()
+        if book is None:
+            return jsonify({'success': False, 'error': f"No book with ISBN {isbn13}"}), 404
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'id': book.id,
+                'title': book.title,
+                'author': book.author,
+                'category': book.category,
+                'isbn': book.isbn,
+                'isbn13': isbn13,
+                'total_quantity': book.total_quantity,
+                'available_quantity': book.available_quantity
+            }
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@api_bp.route('/api/books/suggest', methods=['GET'])
+@query_budget(0)
+def suggest_books_route():
+    """Autocomplete: the most borrowed books whose title, author or ISBN starts with q"""
+    try:
+        limit = max(request.args.get('limit', 10, type=int), 1)
+        suggestions = suggest_books(request.args.get('q', ''), limit)
+        return jsonify({
+            'success': True,
+            'data': suggestions,
+            'count': len(suggestions)
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @api_bp.route('/api/books/recommendations', methods=['GET'])
 def get_recommendations():
     """Get book recommendations for students"""
@@ -166,11 +191,12 @@ def health_check():
     })
 
 @api_bp.route('/api/categories', methods=['GET'])
+@query_budget(2)
+@catalog_etag()
 def get_categories():
     """Get all book categories"""
     try:
-        categories = db.session.query(Book.category).distinct().all()
-        category_list = [cat[0] for cat in categories if cat[0]]
+        category_list = [facet['category'] for facet in get_category_facets()]
         
         return jsonify({
             'success': True,
@@ -182,16 +208,39 @@ def get_categories():
             'error': str(e)
         }), 500
 
+@api_bp.route('/api/categories/facets', methods=['GET'])
+@query_budget(2)
+@catalog_etag()
+def get_category_facet_counts():
+    """Get every category with its title, availability and open loan counts"""
+    try:
+        facets = get_category_facets()
+        
+        return jsonify({
+            'success': True,
+            'data': facets,
+            'count': len(facets)
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @api_bp.route('/api/books/<int:book_id>', methods=['GET'])
+@query_budget(3)
+@catalog_etag()
 def get_book_details(book_id):
     """Get detailed information about a specific book"""
     try:
         book = Book.query.get_or_404(book_id)
         
         # Get issue history
-        issues = Issue.query.filter_by(book_id=book_id).all()
+        issues = Issue.query.options(
+            joinedload(Issue.student)
+        ).filter_by(book_id=book_id).all()
         issue_history = [{
-            'student_name': issue.student.name,
+            'student_name': issue.student.fullname,
             'issue_date': issue.issue_date.isoformat(),
             'return_date': issue.return_date.isoformat() if issue.return_date else None,
             'status': 'Returned' if issue.return_date else 'Issued'
@@ -222,39 +271,21 @@ def get_book_details(book_id):
 
 # Additional utility endpoints
 @api_bp.route('/api/dashboard/summary', methods=['GET'])
+@query_budget(1)
 def get_dashboard_summary():
     """Get dashboard summary data for admin"""
     try:
-        # Basic counts
-        total_books = Book.query.count()
-        total_students = Student.query.count()
-        active_issues = Issue.query.filter(Issue.return_date.is_(None)).count()
-        
-        # Overdue books
-        overdue_books = Issue.query.filter(
-            Issue.return_date.is_(None),
-            Issue.due_date < datetime.utcnow()
-        ).count()
-        
-        # Recent activity
-        today = datetime.utcnow().date()
-        today_issues = Issue.query.filter(
-            db.func.date(Issue.issue_date) == today
-        ).count()
-        
-        today_returns = Issue.query.filter(
-            db.func.date(Issue.return_date) == today
-        ).count()
+        stats = get_stats()
         
         return jsonify({
             'success': True,
             'data': {
-                'total_books': total_books,
-                'total_students': total_students,
-                'active_issues': active_issues,
-                'overdue_books': overdue_books,
-                'today_issues': today_issues,
-                'today_returns': today_returns
+                'total_books': stats['total_books'],
+                'total_students': stats['total_users'],
+                'active_issues': stats['open_loans'],
+                'overdue_books': stats['overdue_loans'],
+                'today_issues': stats['issued_today'],
+                'today_returns': stats['returned_today']
             }
         })
     except Exception as e:
@@ -2,12 +2,16 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
+from src.sqlite_profile import configure_sqlite, install_sqlite_pragmas
+from src.query_budget import init_query_budget
+from src.sql_metrics import init_sql_metrics
+from src.reporting_db import RoutingSession, init_reporting_db
 import os
 import secrets
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
-def create_app():
+def create_app(config=None):
     import os
     base_dir = os.path.abspath(os.path.dirname(__file__))
     instance_path = os.path.abspath(os.path.join(base_dir, '..'))
@@ -20,12 +24,20 @@ def create_app():
     db_path = os.path.join(instance_path, 'library_db.sqlite3')
     app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{db_path}"
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if config:
+        # Overrides, e.g. a throwaway SQLALCHEMY_DATABASE_URI for tests/benchmarks
+        app.config.update(config)
+    configure_sqlite(app)
     app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', secrets.token_hex(32))
     
     # Enable CORS for all routes
     CORS(app, origins=['http://localhost:3000', 'http://127.0.0.1:3000'])
 
     db.init_app(app)
+    install_sqlite_pragmas(app, db)
+    init_query_budget(app, db)
+    init_sql_metrics(app, db)
+    init_reporting_db(app, db)
     jwt = JWTManager(app)
 
     # Import models here to register with SQLAlchemy
@@ -52,6 +64,8 @@ def create_app():
     from src.features.student_ui.api import student_ui_bp
     # from src.features.ml_api import ml_bp  # Temporarily disabled
     from src.api_routes import api_bp
+    from src.sql_metrics import metrics_bp
+    from src.live_events import live_events_bp
 
     app.register_blueprint(book_recommendation_bp, url_prefix='/api/book_recommendation')
     app.register_blueprint(book_management_bp, url_prefix='/api/book_management')
@@ -70,12 +84,21 @@ def create_app():
     app.register_blueprint(manage_users_bp, url_prefix='/api/manage_users')
     app.register_blueprint(student_bp, url_prefix='/api/student')
     app.register_blueprint(student_ui_bp, url_prefix='/api/student_ui')
+    app.register_blueprint(api_bp)
+    app.register_blueprint(metrics_bp, url_prefix='/api')
+    app.register_blueprint(live_events_bp, url_prefix='/api')
     # app.register_blueprint(ml_bp, url_prefix='/api/ml_api')  # Temporarily disabled
 
     # Initialize and start the scheduler for automated fine calculation
     from src.features.automated_fine_calculation.scheduler import start_scheduler
     start_scheduler(app)
 
+    # Build the search-box autocomplete index before the first keystroke
+    # (off for benchmarks, which fill their database after creating the app)
+    if app.config.get('SUGGEST_WARM_AT_STARTUP', True):
+        from src.book_suggest import warm_suggest_index
+        warm_suggest_index(app)
+
     from flask import redirect
 
     @app.route('/api/admin_login/admin')
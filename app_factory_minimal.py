@@ -1,12 +1,16 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
+from src.sqlite_profile import configure_sqlite, install_sqlite_pragmas
+from src.query_budget import init_query_budget
+from src.sql_metrics import init_sql_metrics
+from src.reporting_db import RoutingSession, init_reporting_db
 import os
 import secrets
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
-def create_app():
+def create_app(config=None):
     import os
     base_dir = os.path.abspath(os.path.dirname(__file__))
     instance_path = os.path.abspath(os.path.join(base_dir, '..'))
@@ -19,11 +23,19 @@ def create_app():
     db_path = os.path.join(instance_path, 'library_db.sqlite3')
     app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{db_path}"
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if config:
+        # Overrides, e.g. a throwaway SQLALCHEMY_DATABASE_URI for tests/benchmarks
+        app.config.update(config)
+    configure_sqlite(app)
     
     # Enable CORS for all routes
     CORS(app, origins=['http://localhost:3000', 'http://127.0.0.1:3000'])
 
     db.init_app(app)
+    install_sqlite_pragmas(app, db)
+    init_query_budget(app, db)
+    init_sql_metrics(app, db)
+    init_reporting_db(app, db)
 
     # Import models here to register with SQLAlchemy
     from src.models import User, Book, BorrowRecord, Fees
@@ -34,12 +46,24 @@ def create_app():
     from src.features.student_api import student_bp
     from src.features.admin_api import admin_bp
     from src.features.admin_dashboard_api import admin_dashboard_bp
+    from src.api_routes import api_bp
+    from src.sql_metrics import metrics_bp
+    from src.live_events import live_events_bp
     
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(ml_bp, url_prefix='/api/ml_api')
     app.register_blueprint(student_bp, url_prefix='/api/student')
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
     app.register_blueprint(admin_dashboard_bp, url_prefix='/api/admin')
+    app.register_blueprint(api_bp)
+    app.register_blueprint(metrics_bp, url_prefix='/api')
+    app.register_blueprint(live_events_bp, url_prefix='/api')
+
+    # Build the search-box autocomplete index before the first keystroke
+    # (off for benchmarks, which fill their database after creating the app)
+    if app.config.get('SUGGEST_WARM_AT_STARTUP', True):
+        from src.book_suggest import warm_suggest_index
+        warm_suggest_index(app)
 
     # Serve static files
     @app.route('/')
@@ -1,13 +1,98 @@
-from app import db
-from sqlalchemy import text
+"""Versioned SQL migration runner.
 
-def apply_sql_file(filename):
-    with open(filename, 'r') as file:
-        sql = file.read()
-    with db.engine.connect() as connection:
-        connection.execute(text(sql))
-        # No commit needed for DDL statements in SQLAlchemy 1.4+
+Migrations live in ``migrations/`` as ``NNN_description.sql`` files and are
+applied in version order. Applied versions are recorded in the
+``schema_migrations`` table so each file runs exactly once per database.
+"""
+import os
+import re
+import sqlite3
+import sys
+from datetime import datetime
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+_MIGRATION_FILE_RE = re.compile(r'^(\d+)_(\w+)\.sql$')
+
+def discover_migrations(directory=MIGRATIONS_DIR):
+    """Return ``(version, name, path)`` tuples sorted by version."""
+    migrations = []
+    for filename in os.listdir(directory):
+        match = _MIGRATION_FILE_RE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    migrations.sort()
+
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Duplicate migration version in {directory}")
+    return migrations
+
+def split_statements(sql):
+    """Split a SQL script into complete statements (trigger bodies stay intact)."""
+    statements = []
+    buffer = ''
+    for line in sql.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            statement = buffer.strip()
+            if statement.rstrip(';').strip() and not _is_comment_only(statement):
+                statements.append(statement)
+            buffer = ''
+    if buffer.strip() and not _is_comment_only(buffer):
+        statements.append(buffer.strip())
+    return statements
+
+def _is_comment_only(sql):
+    return all(not line.strip() or line.strip().startswith('--') for line in sql.splitlines())
+
+def _ensure_version_table(connection):
+    connection.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "name VARCHAR(255) NOT NULL, "
+        "applied_at TIMESTAMP NOT NULL)"
+    )
+
+def applied_versions(engine):
+    """Return the set of migration versions already applied to ``engine``."""
+    with engine.begin() as connection:
+        _ensure_version_table(connection)
+        rows = connection.exec_driver_sql("SELECT version FROM schema_migrations").fetchall()
+    return {row[0] for row in rows}
+
+def apply_migrations(engine, directory=MIGRATIONS_DIR, target=None):
+    """Apply pending migrations up to ``target`` (inclusive); return applied versions.
+
+    Each migration runs in its own transaction together with its
+    ``schema_migrations`` row, so a failing file leaves no partial state.
+    """
+    done = applied_versions(engine)
+    applied = []
+    for version, name, path in discover_migrations(directory):
+        if version in done or (target is not None and version > target):
+            continue
+        with open(path, 'r') as file:
+            statements = split_statements(file.read())
+        with engine.begin() as connection:
+            for statement in statements:
+                connection.exec_driver_sql(statement)
+            connection.exec_driver_sql(
+                "INSERT INTO schema_migrations (version, name, applied_at) VALUES (?, ?, ?)"
+                if engine.dialect.paramstyle == 'qmark' else
+                "INSERT INTO schema_migrations (version, name, applied_at) VALUES (%s, %s, %s)",
+                (version, name, datetime.utcnow()),
+            )
+        applied.append(version)
+    return applied
 
 if __name__ == '__main__':
-    apply_sql_file('migrations/002_create_borrow_records_table_if_not_exists.sql')
-    print("Migration applied successfully.")
+    from app import app, db
+
+    target = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    with app.app_context():
+        applied = apply_migrations(db.engine, target=target)
+    if applied:
+        print(f"Applied migrations: {', '.join(str(v) for v in applied)}")
+    else:
+        print("Database is up to date.")
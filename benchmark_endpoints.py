@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""Endpoint benchmark suite at multiple data scales.
+
+For each scale a throwaway SQLite database is filled by generate_dataset.py,
+then every hot route in api_routes, admin_api, student_api and
+admin_dashboard_api is driven through the Flask test client. p50/p99
+latency and SQL statements per request (from the Server-Timing header) are
+written to a JSON file; ``--baseline`` compares against a previous run and
+exits non-zero on p99 regressions.
+
+Query budgets (``@query_budget``) are enforced throughout: every request
+over its route's budget is reported, and the run exits non-zero.
+
+    python benchmark_endpoints.py --scales 1k 100k 1m --output benchmark_results.json
+    python benchmark_endpoints.py --scales 1k --baseline benchmark_results.json
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from src.app_factory_minimal import create_app, db
+from src.apply_migration import apply_migrations
+from src.generate_dataset import generate, isbn13
+from src.keyset_pagination import encode_cursor
+from src.query_budget import QueryBudgetExceeded
+from src.library_counters import reconcile_counters
+from src.circulation_rollup import rebuild_circulation_rollup
+
+SCALES = {
+    '1k': {'books': 200, 'users': 100, 'loans': 1000},
+    '100k': {'books': 10000, 'users': 5000, 'loans': 100000},
+    '1m': {'books': 100000, 'users': 50000, 'loans': 1000000},
+}
+
+ADMIN_ID = 1
+STUDENT_ID = 2
+
+# (name, method, path, role, heavy). Heavy routes scan whole tables and run
+# a tenth of the iterations. {deep_cursor} points at the last admin books page,
+# {isbn} is the ISBN of book 1 with hyphens, as printed.
+ROUTES = [
+    # api_routes
+    ('stats', 'GET', '/api/stats', 'admin', False),
+    ('books_search', 'GET', '/api/books/search?q=Python', 'student', False),
+    ('books_isbn', 'GET', '/api/books/isbn/{isbn}', 'student', False),
+    ('books_suggest', 'GET', '/api/books/suggest?q=pyth', 'student', False),
+    ('categories', 'GET', '/api/categories', 'student', False),
+    ('category_facets', 'GET', '/api/categories/facets', 'student', False),
+    ('book_details', 'GET', '/api/books/1', 'student', False),
+    ('dashboard_summary', 'GET', '/api/dashboard/summary', 'admin', False),
+    ('recommendations', 'GET', f'/api/books/recommendations?student_id={STUDENT_ID}', 'student', False),
+    # admin_api
+    ('admin_dashboard', 'GET', '/api/admin/dashboard', 'admin', False),
+    ('admin_activity', 'GET', '/api/admin/activity', 'admin', False),
+    ('admin_search_books', 'GET', '/api/admin/search?q=Python&type=books', 'admin', False),
+    ('admin_search_users', 'GET', '/api/admin/search?q=Smith&type=users', 'admin', False),
+    ('admin_search_borrowed', 'GET', '/api/admin/search?q=Smith&type=borrowed', 'admin', False),
+    ('admin_search_fines', 'GET', '/api/admin/search?q=Smith&type=fines', 'admin', False),
+    ('admin_search_all', 'GET', '/api/admin/search?q=Smith&type=all', 'admin', False),
+    ('admin_books_first_page', 'GET', '/api/admin/books', 'admin', False),
+    ('admin_books_deep_page', 'GET', '/api/admin/books?cursor={deep_cursor}', 'admin', False),
+    ('admin_users', 'GET', '/api/admin/users', 'admin', False),
+    ('admin_borrowing_records', 'GET', '/api/admin/borrowing-records', 'admin', False),
+    ('admin_fines', 'GET', '/api/admin/fines', 'admin', False),
+    ('report_summary', 'GET', '/api/admin/reports?type=summary', 'admin', False),
+    ('report_popular_books', 'GET', '/api/admin/reports?type=popular_books', 'admin', False),
+    ('report_popular_books_7d', 'GET', '/api/admin/reports?type=popular_books&days=7', 'admin', False),
+    ('report_active_users', 'GET', '/api/admin/reports?type=active_users', 'admin', False),
+    ('report_active_users_30d', 'GET', '/api/admin/reports?type=active_users&days=30', 'admin', False),
+    ('report_circulation_year', 'GET', '/api/admin/reports?type=circulation', 'admin', False),
+    ('report_year_over_year', 'GET', '/api/admin/reports?type=year_over_year', 'admin', False),
+    ('report_popular_books_range', 'GET', '/api/admin/reports?type=popular_books&start=2024-01-15&end=2025-06-30',
+     'admin', False),
+    # admin_dashboard_api
+    ('dashboard_stats', 'GET', '/api/admin/dashboard-stats', 'admin', False),
+    ('overdue_books', 'GET', '/api/admin/overdue-books', 'admin', True),
+    ('overdue_summary', 'GET', '/api/admin/overdue-summary', 'admin', False),
+    ('borrow_history', 'GET', '/api/admin/borrow-history', 'admin', True),
+    ('export_inventory', 'GET', '/api/admin/export-inventory', 'admin', True),
+    ('circulation_daily', 'GET', '/api/admin/circulation?group=day', 'admin', False),
+    ('circulation_books', 'GET', '/api/admin/circulation?group=book', 'admin', False),
+    # student_api
+    ('student_dashboard', 'GET', f'/api/student/dashboard/{STUDENT_ID}', 'student', False),
+    ('student_activity', 'GET', f'/api/student/activity/{STUDENT_ID}', 'student', False),
+    ('student_borrowed', 'GET', f'/api/student/books/borrowed/{STUDENT_ID}', 'student', False),
+    ('student_available', 'GET', '/api/student/books/available', 'student', False),
+    ('student_available_titles', 'GET', '/api/student/books/available?fields=title,author&per_page=100', 'student', False),
+    ('student_available_stream', 'GET', '/api/student/books/available?format=ndjson', 'student', True),
+    ('student_search', 'GET', '/api/student/books/search?q=Python', 'student', False),
+    ('student_profile', 'GET', f'/api/student/profile/{STUDENT_ID}', 'student', False),
+]
+
+_QUERY_COUNT_RE = re.compile(r'desc="(\d+) queries"')
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def _client(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+    return client
+
+def _measure(client, method, path, iterations, json_body=None):
+    latencies, queries, statuses, over_budget = [], [], {}, []
+    for i in range(iterations):
+        body = json_body(i) if callable(json_body) else json_body
+        started = time.perf_counter()
+        try:
+            response = client.open(path, method=method, json=body)
+            # Streamed bodies are only produced as they are read
+            response.get_data()
+        except QueryBudgetExceeded as e:
+            latencies.append((time.perf_counter() - started) * 1000)
+            over_budget.append(str(e))
+            continue
+        latencies.append((time.perf_counter() - started) * 1000)
+        match = _QUERY_COUNT_RE.search(response.headers.get('Server-Timing', ''))
+        queries.append(int(match.group(1)) if match else 0)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    return {
+        'iterations': iterations,
+        'p50_ms': round(_percentile(latencies, 50), 3),
+        'p99_ms': round(_percentile(latencies, 99), 3),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'queries_per_request': round(statistics.fmean(queries), 2) if queries else None,
+        'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+        'over_budget': sorted(set(over_budget)),
+    }
+
+def run_scale(name, iterations, warmup, log=print):
+    sizes = SCALES[name]
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'bench.sqlite3')}",
+            'QUERY_BUDGET_ENFORCE': True,
+            # Raise QueryBudgetExceeded out of the test client instead of answering 500
+            'PROPAGATE_EXCEPTIONS': True,
+            # The catalog is generated after the app is created
+            'SUGGEST_WARM_AT_STARTUP': False,
+        })
+
+        with app.app_context():
+            db.create_all()
+            apply_migrations(db.engine)
+            log(f"[{name}] generating {sizes}")
+            dataset = generate(db.engine, log=lambda message: None, **sizes)
+            reconcile_counters(fix=True)
+            rebuild_circulation_rollup()
+            from src.models import Book
+            circulation_ids = [book_id for (book_id,) in db.session.query(Book.id).filter(
+                Book.available_quantity > 0).order_by(Book.id).limit(iterations).all()]
+
+        clients = {'admin': _client(app, ADMIN_ID), 'student': _client(app, STUDENT_ID)}
+        deep_cursor = encode_cursor(max(1, sizes['books'] - 20))
+        isbn = isbn13(1)
+        isbn = f'{isbn[:3]}-{isbn[3]}-{isbn[4:7]}-{isbn[7:12]}-{isbn[12]}'
+
+        results = {}
+        for route, method, path, role, heavy in ROUTES:
+            path = path.format(deep_cursor=deep_cursor, isbn=isbn)
+            count = max(1, iterations // 10) if heavy else iterations
+            warm = _measure(clients[role], method, path, 1 if heavy else warmup)
+            results[route] = _measure(clients[role], method, path, count)
+            # A first request (cold caches and indexes) must fit the budget too
+            results[route]['over_budget'] = sorted(set(warm['over_budget'] + results[route]['over_budget']))
+            log(f"[{name}] {route}: p50 {results[route]['p50_ms']} ms, p99 {results[route]['p99_ms']} ms, "
+                f"{results[route]['queries_per_request']} queries")
+            for message in results[route]['over_budget']:
+                log(f"[{name}] {route}: OVER BUDGET {message}")
+
+        # Circulation writes: borrow N distinct books, then return them.
+        count = len(circulation_ids)
+        results['borrow_book'] = _measure(clients['student'], 'POST', '/api/student/books/borrow', count,
+                                          lambda i: {'book_id': circulation_ids[i]})
+        results['return_book'] = _measure(clients['student'], 'POST', '/api/student/books/return', count,
+                                          lambda i: {'book_id': circulation_ids[i]})
+        for route in ('borrow_book', 'return_book'):
+            log(f"[{name}] {route}: p50 {results[route]['p50_ms']} ms, p99 {results[route]['p99_ms']} ms")
+            for message in results[route]['over_budget']:
+                log(f"[{name}] {route}: OVER BUDGET {message}")
+
+        with app.app_context():
+            db.engine.dispose()
+
+    return {'dataset': dataset, 'routes': results}
+
+def over_budget(results):
+    """Return ``(scale, route, message)`` for every route that went over its query budget."""
+    return [(scale, route, message)
+            for scale, scale_results in results['scales'].items()
+            for route, stats in scale_results['routes'].items()
+            for message in stats.get('over_budget', ())]
+
+def compare(results, baseline, max_regression):
+    """Return ``(scale, route, old_p99, new_p99)`` for every p99 regression."""
+    regressions = []
+    for scale, scale_results in results['scales'].items():
+        old_routes = baseline.get('scales', {}).get(scale, {}).get('routes', {})
+        for route, stats in scale_results['routes'].items():
+            old = old_routes.get(route)
+            if old and stats['p99_ms'] > old['p99_ms'] * (1 + max_regression):
+                regressions.append((scale, route, old['p99_ms'], stats['p99_ms']))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', nargs='+', choices=sorted(SCALES), default=['1k', '100k'])
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help='previous results JSON to compare p99 latencies against')
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                        help='allowed relative p99 increase before failing (default 0.25)')
+    args = parser.parse_args()
+
+    results = {
+        'generated_at': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'iterations': args.iterations,
+        'scales': {name: run_scale(name, args.iterations, args.warmup) for name in args.scales},
+    }
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {args.output}")
+
+    failed = False
+    for scale, route, message in over_budget(results):
+        print(f"OVER BUDGET [{scale}] {route}: {message}")
+        failed = True
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.max_regression)
+        for scale, route, old, new in regressions:
+            print(f"REGRESSION [{scale}] {route}: p99 {old} ms -> {new} ms")
+        failed = failed or bool(regressions)
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Conditional GET benchmark for the catalog endpoints.
+
+For each scale a throwaway SQLite database is filled by generate_dataset.py
+and every ETag-enabled catalog route is requested repeatedly, first
+unconditionally and then with the ETag from the previous response in
+``If-None-Match``. Reports response bytes, latency, process CPU time and SQL
+statements per request for both, and fails if a conditional request is not
+answered ``304`` or saves no SQL, bytes or CPU.
+
+    python benchmark_etag.py --scales 1k 100k --iterations 50
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from src.app_factory_minimal import create_app, db
+from src.apply_migration import apply_migrations
+from src.benchmark_endpoints import ADMIN_ID, SCALES, STUDENT_ID, _client, _percentile, _QUERY_COUNT_RE
+from src.generate_dataset import generate
+from src.library_counters import reconcile_counters
+
+# (name, path, role)
+ROUTES = [
+    ('categories', '/api/categories', 'student'),
+    ('book_details', '/api/books/1', 'student'),
+    ('student_available', '/api/student/books/available', 'student'),
+    ('admin_books', '/api/admin/books?per_page=100', 'admin'),
+]
+
+def _run(client, path, iterations, etag=None):
+    headers = {'If-None-Match': etag} if etag else {}
+    latencies, cpu, sizes, queries, statuses = [], [], [], [], set()
+    for _ in range(iterations):
+        cpu_started, started = time.process_time(), time.perf_counter()
+        response = client.get(path, headers=headers)
+        latencies.append((time.perf_counter() - started) * 1000)
+        cpu.append((time.process_time() - cpu_started) * 1000)
+        sizes.append(len(response.get_data()))
+        match = _QUERY_COUNT_RE.search(response.headers.get('Server-Timing', ''))
+        queries.append(int(match.group(1)) if match else 0)
+        statuses.add(response.status_code)
+    return {
+        'status_codes': sorted(statuses),
+        'bytes_per_request': round(statistics.fmean(sizes)),
+        'p50_ms': round(_percentile(latencies, 50), 3),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'cpu_ms_per_request': round(statistics.fmean(cpu), 3),
+        'queries_per_request': round(statistics.fmean(queries), 2),
+    }
+
+def run_scale(name, iterations, log=print):
+    sizes = SCALES[name]
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'bench.sqlite3')}",
+            'QUERY_BUDGET_ENFORCE': False,
+            # The catalog is generated after the app is created
+            'SUGGEST_WARM_AT_STARTUP': False,
+        })
+
+        with app.app_context():
+            db.create_all()
+            apply_migrations(db.engine)
+            log(f"[{name}] generating {sizes}")
+            generate(db.engine, log=lambda message: None, **sizes)
+            reconcile_counters(fix=True)
+
+        clients = {'admin': _client(app, ADMIN_ID), 'student': _client(app, STUDENT_ID)}
+        results = {}
+        for route, path, role in ROUTES:
+            client = clients[role]
+            etag = client.get(path).headers.get('ETag')
+            full = _run(client, path, iterations)
+            conditional = _run(client, path, iterations, etag)
+            results[route] = {
+                'etag': etag,
+                'full': full,
+                'conditional': conditional,
+                'bytes_saved': full['bytes_per_request'] - conditional['bytes_per_request'],
+                'cpu_ratio': round(conditional['cpu_ms_per_request'] / max(full['cpu_ms_per_request'], 1e-6), 3),
+            }
+            log(f"[{name}] {route}: {full['bytes_per_request']} B, {full['cpu_ms_per_request']} ms CPU, "
+                f"{full['queries_per_request']} queries -> 304: {conditional['bytes_per_request']} B, "
+                f"{conditional['cpu_ms_per_request']} ms CPU, {conditional['queries_per_request']} queries")
+
+        with app.app_context():
+            db.engine.dispose()
+    return results
+
+def check(results):
+    """Return a description of every route where the conditional GET saved nothing."""
+    failures = []
+    for scale, routes in results.items():
+        for route, result in routes.items():
+            conditional = result['conditional']
+            if conditional['status_codes'] != [304]:
+                failures.append(f"[{scale}] {route}: conditional GET returned {conditional['status_codes']}")
+            elif conditional['queries_per_request'] >= result['full']['queries_per_request']:
+                failures.append(f"[{scale}] {route}: conditional GET still issued "
+                                f"{conditional['queries_per_request']} queries per request")
+            elif result['bytes_saved'] <= 0 or result['cpu_ratio'] >= 1:
+                failures.append(f"[{scale}] {route}: no savings ({result['bytes_saved']} B, "
+                                f"CPU ratio {result['cpu_ratio']})")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', nargs='+', choices=sorted(SCALES), default=['1k', '100k'])
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args()
+
+    results = {name: run_scale(name, args.iterations) for name in args.scales}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f"Results written to {args.output}")
+
+    failures = check(results)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
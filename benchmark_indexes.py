@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""Before/after benchmark for the circulation indexes (migration 003).
+
+Builds a throwaway SQLite database with synthetic loans, runs the hot
+dashboard/circulation queries without the indexes, applies the migrations
+with the versioned runner and runs them again, printing query plans and
+median latencies for both.
+
+    python benchmark_indexes.py --loans 300000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+
+from apply_migration import apply_migrations
+
+SCHEMA = """
+CREATE TABLE user (
+    id INTEGER PRIMARY KEY, fullname VARCHAR(150) NOT NULL, email VARCHAR(150) NOT NULL UNIQUE,
+    username VARCHAR(150) NOT NULL UNIQUE, password VARCHAR(200) NOT NULL, role VARCHAR(50) NOT NULL
+);
+CREATE TABLE book (
+    id INTEGER PRIMARY KEY, title VARCHAR(200) NOT NULL, author VARCHAR(150) NOT NULL,
+    isbn VARCHAR(50) NOT NULL UNIQUE, copies INTEGER NOT NULL, category VARCHAR(100),
+    total_quantity INTEGER NOT NULL, available_quantity INTEGER NOT NULL, description TEXT
+);
+CREATE TABLE borrow_record (
+    id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES user (id),
+    book_id INTEGER NOT NULL REFERENCES book (id), borrow_date DATETIME NOT NULL,
+    due_date DATETIME NOT NULL, return_date DATETIME, fine FLOAT
+);
+CREATE TABLE fees (
+    id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES user (id),
+    date DATETIME NOT NULL, amount FLOAT NOT NULL, reason VARCHAR(255) NOT NULL
+);
+"""
+
+NOW = datetime(2024, 6, 1)
+
+QUERIES = [
+    ('open loans',
+     "SELECT count(*) FROM borrow_record WHERE return_date IS NULL", ()),
+    ('overdue loans',
+     "SELECT count(*) FROM borrow_record WHERE return_date IS NULL AND due_date < ?", (str(NOW),)),
+    ('user open loans',
+     "SELECT count(*) FROM borrow_record WHERE user_id = ? AND return_date IS NULL", (42,)),
+    ('book open loans',
+     "SELECT count(*) FROM borrow_record WHERE book_id = ? AND return_date IS NULL", (7,)),
+    ('user fine total',
+     "SELECT coalesce(sum(amount), 0) FROM fees WHERE user_id = ?", (42,)),
+    ('available books',
+     "SELECT count(*) FROM book WHERE available_quantity > 0", ()),
+    ('recent borrows',
+     "SELECT id FROM borrow_record ORDER BY borrow_date DESC LIMIT 5", ()),
+]
+
+def _fmt(dt):
+    return dt.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+def populate(path, books, users, loans, seed=0):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.executemany(
+        "INSERT INTO user VALUES (?, ?, ?, ?, ?, ?)",
+        ((i, f'User {i}', f'user{i}@lms.test', f'user{i}', 'x', 'student') for i in range(1, users + 1)),
+    )
+    conn.executemany(
+        "INSERT INTO book VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        ((i, f'Book {i}', f'Author {i % 997}', f'isbn-{i}', 3, 'General', 3, rng.randint(0, 3), None)
+         for i in range(1, books + 1)),
+    )
+
+    def loan_rows():
+        for i in range(1, loans + 1):
+            borrowed = NOW - timedelta(days=rng.uniform(0, 730))
+            due = borrowed + timedelta(days=14)
+            # ~3% of loans still open, a third of those overdue
+            returned = None if rng.random() < 0.03 else borrowed + timedelta(days=rng.uniform(1, 20))
+            yield (i, rng.randint(1, users), rng.randint(1, books), _fmt(borrowed), _fmt(due),
+                   _fmt(returned) if returned else None, 0.0)
+
+    conn.executemany("INSERT INTO borrow_record VALUES (?, ?, ?, ?, ?, ?, ?)", loan_rows())
+    conn.executemany(
+        "INSERT INTO fees VALUES (?, ?, ?, ?, ?)",
+        ((i, rng.randint(1, users), _fmt(NOW - timedelta(days=rng.uniform(0, 730))), 1.0, 'Late return')
+         for i in range(1, loans // 10 + 1)),
+    )
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+def run_queries(path, repeat):
+    conn = sqlite3.connect(path)
+    results = {}
+    for label, sql, params in QUERIES:
+        plan = ' | '.join(row[-1] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params))
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+        results[label] = (plan, statistics.median(timings))
+    conn.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--books', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--loans', type=int, default=300000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.sqlite3')
+        print(f"Populating {args.books} books, {args.users} users, {args.loans} loans...")
+        populate(path, args.books, args.users, args.loans)
+
+        before = run_queries(path, args.repeat)
+        engine = create_engine(f'sqlite:///{path}')
+        applied = apply_migrations(engine)
+        engine.dispose()
+        with sqlite3.connect(path) as conn:
+            conn.execute("ANALYZE")
+        after = run_queries(path, args.repeat)
+
+    print(f"Applied migrations: {applied}\n")
+    for label, _, _ in QUERIES:
+        plan_before, ms_before = before[label]
+        plan_after, ms_after = after[label]
+        print(f"{label}: {ms_before:.2f} ms -> {ms_after:.2f} ms ({ms_before / max(ms_after, 1e-6):.0f}x)")
+        print(f"    before: {plan_before}")
+        print(f"    after:  {plan_after}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""Book search benchmark: FTS5 index against the old LIKE scans.
+
+For each catalog size a throwaway SQLite database is filled by
+generate_dataset.py, and a set of search texts is run both through the
+``LIKE '%q%'`` filter the search endpoints used to apply (title, author or
+ISBN, first 20 rows) and through ``book_search.search_books_query`` (first
+20 rows by BM25, or the ISBN lookup for a whole ISBN). Reports p50/p99 latency and the number of matching books
+for each, plus ``/api/books/search`` end to end: the first request, which
+misses ``search_cache``, and the repeats, served from it. Fails if the index is
+slower than the scan for a selective search (at most
+``SELECTIVE_MATCHES`` LIKE matches), where a scan reads the whole table.
+For common words the scan stops after its first 20 (unranked) rows and can
+beat the ranked index; those are reported but not checked.
+
+Misspelled searches are then sent to ``/api/student/books/search``, which
+falls back to ``fuzzy_search``; the run fails if one finds nothing or its
+p99 exceeds ``FUZZY_BUDGET_MS``.
+
+Finally, search-box prefixes are completed by ``book_suggest.suggest_books``
+from its in-process index, timed both directly (failing over
+``SUGGEST_BUDGET_MS`` at p99) and through ``/api/books/suggest``.
+
+    python benchmark_search.py --sizes 10k 100k --iterations 30
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import func, or_
+from src.app_factory_minimal import create_app, db
+from src.apply_migration import apply_migrations
+from src.benchmark_endpoints import STUDENT_ID, _client, _percentile, _QUERY_COUNT_RE
+from src.book_search import search_books_query
+from src.book_suggest import suggest_books
+from src.fuzzy_search import FUZZY_LIMIT
+from src.generate_dataset import generate
+from src.models import Book
+
+SIZES = {'10k': 10000, '100k': 100000, '250k': 250000}
+SELECTIVE_MATCHES = 100
+LIMIT = 20
+
+# Search texts against the generated catalog: common words, rarer names,
+# multi-word titles, an ISBN prefix, a whole ISBN as scanned (ISBN-13, and the
+# same book's ISBN-10 with hyphens, which LIKE cannot find) and a miss
+SEARCHES = ['python', 'vol', 'knuth', 'okafor', 'thermodynamics', 'quantum kingdoms',
+            'silent detectives vol. 7', '978000000123', '9780000543219', '0-00-054321-7', 'emma nguyen', 'zebra']
+
+# Misspellings of catalog words: swapped, missing, extra and wrong letters
+FUZZY_SEARCHES = ['pyhton', 'tolkein', 'thermodinamics', 'quantim kingdms', 'okafr', 'emma nguyn']
+FUZZY_BUDGET_MS = 50.0
+
+# Keystrokes into the search box: one letter up to most of a title, an ISBN prefix and a miss
+SUGGEST_PREFIXES = ['p', 'py', 'pyth', 'the', 'quantum k', 'silent detectives vol', 'okafor', '978000000', 'zebra']
+SUGGEST_BUDGET_MS = 1.0
+
+def _like_query(text):
+    pattern = f'%{text}%'
+    return Book.query.filter(or_(Book.title.ilike(pattern), Book.author.ilike(pattern), Book.isbn.ilike(pattern)))
+
+def _time(run, iterations):
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        run()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return {
+        'p50_ms': round(_percentile(latencies, 50), 3),
+        'p99_ms': round(_percentile(latencies, 99), 3),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+    }
+
+def _count(query):
+    return query.order_by(None).with_entities(func.count(Book.id)).scalar()
+
+def run_size(name, iterations, log=print):
+    books = SIZES[name]
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'bench.sqlite3')}",
+            'QUERY_BUDGET_ENFORCE': False,
+            # The catalog is generated after the app is created
+            'SUGGEST_WARM_AT_STARTUP': False,
+        })
+
+        results = {}
+        with app.app_context():
+            db.create_all()
+            apply_migrations(db.engine)
+            log(f"[{name}] generating {books} books")
+            generate(db.engine, books=books, users=100, loans=1000, log=lambda message: None)
+
+            for text in SEARCHES:
+                like = _time(lambda: _like_query(text).limit(LIMIT).all(), iterations)
+                fts = _time(lambda: search_books_query(text).limit(LIMIT).all(), iterations)
+                results[text] = {
+                    'like': {**like, 'matches': _count(_like_query(text))},
+                    'fts': {**fts, 'matches': _count(search_books_query(text, rank_limit=None))},
+                    'speedup': round(like['p50_ms'] / max(fts['p50_ms'], 1e-6), 1),
+                }
+                log(f"[{name}] {text!r}: LIKE {like['p50_ms']} ms ({results[text]['like']['matches']} matches) "
+                    f"-> FTS {fts['p50_ms']} ms ({results[text]['fts']['matches']} matches)")
+
+        client = _client(app, STUDENT_ID)
+        for text in SEARCHES:
+            started = time.perf_counter()
+            client.get('/api/books/search', query_string={'q': text})
+            first_ms = (time.perf_counter() - started) * 1000
+            latencies, queries = [], []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                response = client.get('/api/books/search', query_string={'q': text})
+                latencies.append((time.perf_counter() - started) * 1000)
+                match = _QUERY_COUNT_RE.search(response.headers.get('Server-Timing', ''))
+                queries.append(int(match.group(1)) if match else 0)
+            results[text]['endpoint'] = {
+                'first_ms': round(first_ms, 3),
+                'p50_ms': round(_percentile(latencies, 50), 3),
+                'p99_ms': round(_percentile(latencies, 99), 3),
+                'queries_per_request': round(statistics.fmean(queries), 2),
+            }
+            endpoint = results[text]['endpoint']
+            log(f"[{name}] endpoint {text!r}: first {endpoint['first_ms']} ms, then {endpoint['p50_ms']} ms p50 "
+                f"({endpoint['queries_per_request']} queries)")
+
+        # The fuzzy timings are for the search itself, not for repeats served by the cache
+        app.config['SEARCH_CACHE'] = 'off'
+        app.extensions.pop('search_cache', None)
+        # Build the fuzzy word index outside the timings
+        client.get('/api/student/books/search', query_string={'q': FUZZY_SEARCHES[0]})
+        fuzzy = results['fuzzy'] = {}
+        for text in FUZZY_SEARCHES:
+            latencies = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                response = client.get('/api/student/books/search', query_string={'q': text})
+                latencies.append((time.perf_counter() - started) * 1000)
+            body = response.get_json()
+            fuzzy[text] = {
+                'p50_ms': round(_percentile(latencies, 50), 3),
+                'p99_ms': round(_percentile(latencies, 99), 3),
+                'books': len(body['books']),
+                'corrections': body['corrections'],
+            }
+            log(f"[{name}] fuzzy {text!r}: {fuzzy[text]['p50_ms']} ms p50, {fuzzy[text]['p99_ms']} ms p99, "
+                f"{fuzzy[text]['books']}/{FUZZY_LIMIT} books, corrections {body['corrections']}")
+
+        # Build the suggest index outside the timings
+        client.get('/api/books/suggest', query_string={'q': SUGGEST_PREFIXES[0]})
+        suggest = results['suggest'] = {}
+        with app.test_request_context():
+            for text in SUGGEST_PREFIXES:
+                suggest[text] = {**_time(lambda: suggest_books(text), iterations), 'books': len(suggest_books(text))}
+        for text in SUGGEST_PREFIXES:
+            latencies = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                client.get('/api/books/suggest', query_string={'q': text})
+                latencies.append((time.perf_counter() - started) * 1000)
+            suggest[text]['endpoint'] = {
+                'p50_ms': round(_percentile(latencies, 50), 3),
+                'p99_ms': round(_percentile(latencies, 99), 3),
+            }
+            log(f"[{name}] suggest {text!r}: {suggest[text]['p50_ms']} ms p50, {suggest[text]['p99_ms']} ms p99, "
+                f"{suggest[text]['books']} books; endpoint {suggest[text]['endpoint']['p50_ms']} ms p50")
+
+        with app.app_context():
+            db.engine.dispose()
+    return results
+
+def check(results):
+    """Return a description of every selective search where the index lost to the scan,
+    of every fuzzy search that found nothing or ran over budget, and of every
+    suggestion over budget."""
+    failures = []
+    for size, searches in results.items():
+        for text, result in searches.get('suggest', {}).items():
+            if result['p99_ms'] > SUGGEST_BUDGET_MS:
+                failures.append(f"[{size}] suggest {text!r}: p99 {result['p99_ms']} ms over {SUGGEST_BUDGET_MS} ms")
+        for text, result in searches.get('fuzzy', {}).items():
+            if not result['books']:
+                failures.append(f"[{size}] fuzzy {text!r}: no books found")
+            elif result['p99_ms'] > FUZZY_BUDGET_MS:
+                failures.append(f"[{size}] fuzzy {text!r}: p99 {result['p99_ms']} ms over {FUZZY_BUDGET_MS} ms")
+        for text, result in searches.items():
+            if text in ('fuzzy', 'suggest'):
+                continue
+            if result['like']['matches'] <= SELECTIVE_MATCHES and result['fts']['p50_ms'] > result['like']['p50_ms']:
+                failures.append(f"[{size}] {text!r}: FTS p50 {result['fts']['p50_ms']} ms, "
+                                f"LIKE p50 {result['like']['p50_ms']} ms")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', choices=sorted(SIZES), default=['10k', '100k'])
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args()
+
+    results = {name: run_size(name, args.iterations) for name in args.sizes}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f"Results written to {args.output}")
+
+    failures = check(results)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Concurrency benchmark for the SQLite engine profiles in sqlite_profile.py.
+
+Runs borrow/return-style writer threads alongside dashboard-style reader
+threads against a fresh database for each profile, and reports committed
+writes/s, reads/s and "database is locked" failures.
+
+    python benchmark_sqlite_profile.py --writers 4 --readers 8 --seconds 5
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from apply_migration import apply_migrations
+from benchmark_indexes import populate
+from sqlite_profile import SQLITE_PROFILES, install_pragmas, resolve_pragmas, sqlite_engine_options
+
+BORROW_SQL = text(
+    "INSERT INTO borrow_record (user_id, book_id, borrow_date, due_date, return_date, fine) "
+    "VALUES (:user_id, :book_id, :now, :due, NULL, 0.0)"
+)
+DECREMENT_SQL = text("UPDATE book SET available_quantity = available_quantity - 1 WHERE id = :book_id")
+RETURN_SQL = text(
+    "UPDATE borrow_record SET return_date = :now "
+    "WHERE id = (SELECT id FROM borrow_record WHERE book_id = :book_id AND return_date IS NULL LIMIT 1)"
+)
+INCREMENT_SQL = text("UPDATE book SET available_quantity = available_quantity + 1 WHERE id = :book_id")
+READ_SQLS = [
+    text("SELECT count(*) FROM borrow_record WHERE return_date IS NULL"),
+    text("SELECT count(*) FROM book WHERE available_quantity > 0"),
+    text("SELECT coalesce(sum(amount), 0) FROM fees WHERE user_id = :user_id"),
+]
+
+def run_profile(profile, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.sqlite3')
+        populate(path, args.books, args.users, args.loans)
+        setup_engine = create_engine(f'sqlite:///{path}')
+        apply_migrations(setup_engine)
+        setup_engine.dispose()
+
+        pragmas = resolve_pragmas(profile)
+        options = sqlite_engine_options(pragmas, {'pool_size': args.writers + args.readers})
+        engine = create_engine(f'sqlite:///{path}', **options)
+        install_pragmas(engine, pragmas)
+
+        stop = threading.Event()
+        lock = threading.Lock()
+        totals = {'writes': 0, 'reads': 0, 'locked': 0}
+
+        def count(key):
+            with lock:
+                totals[key] += 1
+
+        def writer(seed):
+            rng = random.Random(seed)
+            while not stop.is_set():
+                book_id = rng.randint(1, args.books)
+                now = datetime.utcnow()
+                try:
+                    with engine.begin() as conn:
+                        if rng.random() < 0.5:
+                            conn.execute(BORROW_SQL, {'user_id': rng.randint(1, args.users), 'book_id': book_id,
+                                                      'now': now, 'due': now + timedelta(days=14)})
+                            conn.execute(DECREMENT_SQL, {'book_id': book_id})
+                        else:
+                            conn.execute(RETURN_SQL, {'book_id': book_id, 'now': now})
+                            conn.execute(INCREMENT_SQL, {'book_id': book_id})
+                    count('writes')
+                except OperationalError:
+                    count('locked')
+
+        def reader(seed):
+            rng = random.Random(seed)
+            while not stop.is_set():
+                try:
+                    with engine.connect() as conn:
+                        for sql in READ_SQLS:
+                            conn.execute(sql, {'user_id': rng.randint(1, args.users)}).scalar()
+                    count('reads')
+                except OperationalError:
+                    count('locked')
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+        threads += [threading.Thread(target=reader, args=(1000 + i,)) for i in range(args.readers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+
+    return {
+        'writes_per_s': totals['writes'] / args.seconds,
+        'reads_per_s': totals['reads'] / args.seconds,
+        'locked': totals['locked'],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--books', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--loans', type=int, default=50000)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--profiles', nargs='+', default=sorted(SQLITE_PROFILES))
+    args = parser.parse_args()
+
+    results = {profile: run_profile(profile, args) for profile in args.profiles}
+    for profile, result in results.items():
+        print(f"{profile:>12}: {result['writes_per_s']:8.1f} writes/s  "
+              f"{result['reads_per_s']:8.1f} reads/s  {result['locked']} locked errors")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Ranked full-text book search on SQLite FTS5.
+
+``book_fts`` (see ``BOOK_FTS_DDL`` in models.py and migration 008) indexes
+each book's title, author, category, description and ISBN, and triggers on
+the book table keep it in step with every insert, delete and edit, inside
+the same transaction. ``search_books_query`` turns the search box text into
+an FTS5 expression and returns a ``Book`` query ordered by BM25 relevance,
+which the search endpoints filter and limit as before.
+
+Every word of the text must match the start of a word in some indexed
+column, so "data sci" finds "Data Science" and an ISBN can be typed with or
+without hyphens; unlike the ``LIKE '%q%'`` scans this replaces, a fragment
+from the middle of a word does not match. Title and ISBN hits weigh most.
+
+Scoring costs about a microsecond per matching book, so a search for a word
+in half the catalog would spend most of its time ranking books nobody pages
+to. By default only the first ``SEARCH_RANK_LIMIT`` matches (in id order)
+are ranked; callers that return every match pass ``rank_limit=None``.
+
+Text that is a whole ISBN (``normalize_isbn``: 10 or 13 characters with a
+valid check digit, hyphens and spaces allowed), as a barcode scanner types
+it, skips the text index: ``isbn_books`` probes the index of ``book_isbn13``,
+which triggers fill with the canonical ISBN-13 of each stored ISBN (see
+``BOOK_ISBN13_DDL`` in models.py and migration 009), so "0-306-40615-2" and
+"9780306406157" find the same book.
+"""
+import re
+import unicodedata
+from sqlalchemy import Float, Integer, false, text
+from src.models import Book
+
+# bm25() weights, in BOOK_FTS_DDL column order
+BM25_WEIGHTS = {'title': 10.0, 'author': 5.0, 'category': 2.0, 'description': 1.0, 'isbn': 10.0}
+
+SEARCH_RANK_LIMIT = 2000
+
+_WORD_RE = re.compile(r'\w+')
+_ISBN_SEPARATORS_RE = re.compile(r'[\s-]')
+_ISBN10_RE = re.compile(r'[0-9]{9}[0-9X]')
+_ISBN13_RE = re.compile(r'[0-9]{13}')
+
+_ISBN13_SQL = "SELECT book_id FROM book_isbn13 WHERE isbn13 = :isbn13"
+
+# Restricts a book query to books matching an FTS5 expression, one index probe per book
+_MATCHES_BOOK_SQL = "EXISTS (SELECT 1 FROM book_fts WHERE book_fts MATCH :match AND rowid = book.id)"
+
+_MATCH_SQL = (
+    "SELECT rowid AS book_id, bm25(book_fts, {weights}) AS score FROM book_fts WHERE book_fts MATCH :match"
+).format(weights=', '.join(str(weight) for weight in BM25_WEIGHTS.values()))
+
+def search_words(text):
+    """The words of ``text`` as the index stores them: lower case, without diacritics."""
+    text = text or ''
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(char for char in text if not unicodedata.combining(char))
+    return _WORD_RE.findall(text.casefold())
+
+def _isbn13_check_digit(first12):
+    total = sum(int(digit) * (3 if position % 2 else 1) for position, digit in enumerate(first12))
+    return str((10 - total % 10) % 10)
+
+def normalize_isbn(text):
+    """The ISBN-13 for ``text`` if it is a valid ISBN-10 or ISBN-13, else ``None``.
+
+    Hyphens and spaces are ignored; an ISBN-10 gains the 978 prefix and a new check digit.
+    """
+    isbn = _ISBN_SEPARATORS_RE.sub('', text or '').upper()
+    if _ISBN13_RE.fullmatch(isbn):
+        return isbn if isbn[12] == _isbn13_check_digit(isbn[:12]) else None
+    if _ISBN10_RE.fullmatch(isbn):
+        total = sum((10 - position) * (10 if char == 'X' else int(char)) for position, char in enumerate(isbn))
+        return '978' + isbn[:9] + _isbn13_check_digit('978' + isbn[:9]) if total % 11 == 0 else None
+    return None
+
+def isbn_books(isbn13):
+    """``Book`` query for the books with ISBN-13 ``isbn13`` (see ``normalize_isbn``), in id order."""
+    matches = text(_ISBN13_SQL).bindparams(isbn13=isbn13).columns(book_id=Integer).subquery('isbn_matches')
+    return Book.query.join(matches, matches.c.book_id == Book.id).order_by(Book.id)
+
+def match_expression(query, column=None):
+    """FTS5 expression requiring every word of ``query`` as a prefix, or ``None`` if it has no words.
+
+    ``column`` restricts the match to one indexed column.
+    """
+    words = search_words(query)
+    if not words:
+        return None
+    expression = ' '.join(f'"{word}"*' for word in words)
+    if column is not None:
+        if column not in BM25_WEIGHTS:
+            raise ValueError(f"{column} is not an indexed book column")
+        expression = f'{column} : ({expression})'
+    return expression
+
+def matching_books(expression, rank_limit=None):
+    """Subquery of ``(book_id, score)`` for an FTS5 expression; lower scores are better.
+
+    With ``rank_limit`` only that many matches are returned (and scored).
+    """
+    if rank_limit is None:
+        statement = text(_MATCH_SQL).bindparams(match=expression)
+    else:
+        statement = text(_MATCH_SQL + " LIMIT :rank_limit").bindparams(match=expression, rank_limit=rank_limit)
+    return statement.columns(book_id=Integer, score=Float).subquery('book_matches')
+
+def search_books_query(query='', rank_limit=SEARCH_RANK_LIMIT, **columns):
+    """``Book`` query for the search text ``query``, best matches first.
+
+    Keyword arguments name indexed columns to match as well, e.g.
+    ``category='science'``; empty values are ignored. Without any text the
+    query is ``Book.query`` unchanged, and text without words matches nothing.
+    An ISBN as ``query`` is looked up with ``isbn_books`` instead, and
+    matches nothing else.
+    """
+    isbn = normalize_isbn(query)
+    terms = [] if isbn else [(query, None)]
+    terms += [(value, column) for column, value in columns.items()]
+    terms = [(value, column) for value, column in terms if value and value.strip()]
+    if not terms:
+        return isbn_books(isbn) if isbn else Book.query
+    expressions = [match_expression(value, column) for value, column in terms]
+    if None in expressions:
+        return Book.query.filter(false())
+    expression = ' AND '.join(f'({expression})' for expression in expressions)
+    if isbn:
+        # The ISBN finds the book; the index only has to confirm the other terms
+        return isbn_books(isbn).filter(text(_MATCHES_BOOK_SQL).bindparams(match=expression))
+    return books_matching(expression, rank_limit)
+
+def books_matching(expression, rank_limit=SEARCH_RANK_LIMIT):
+    """``Book`` query for a raw FTS5 expression, best matches first."""
+    matches = matching_books(expression, rank_limit)
+    return Book.query.join(matches, matches.c.book_id == Book.id).order_by(matches.c.score, Book.id)
@@ -0,0 +1,275 @@
+"""In-process prefix index for search-box autocomplete.
+
+Each process keeps, per app, a sorted list of ``(key, book_id)`` entries.
+The keys are the normalized title and author of every book (lower case,
+without diacritics or punctuation, see ``book_search.search_words``), also
+starting at each later word so "kingdoms" finds "Lost Kingdoms", plus the
+ISBN digits. The books whose keys start with a prefix are a contiguous
+slice found by bisection. ``suggest_books`` returns the most borrowed of
+them: small slices are ranked on the spot, while the top ``SUGGEST_MAX_LIMIT``
+of every prefix matching more than ``SUGGEST_SCAN_LIMIT`` entries (the first
+few letters typed) are computed with the index and kept exact as books are
+added and borrowed, since either can only move that one book up. Removing a
+book drops the cached lists it was in; they are recomputed on next use.
+
+The index is built from the database on first use (both ``create_app``
+factories start it at startup unless ``SUGGEST_WARM_AT_STARTUP`` is off) and
+rebuilt every ``SUGGEST_RESYNC_SECONDS`` in the background, which picks up
+books and loans handled by other worker processes. Builds run
+on their own thread and app context, so they never count against a
+request's query budget. The ``book_changed`` and ``book_borrowed`` signals
+apply this process's edits and loans as they commit.
+"""
+import bisect
+import heapq
+import logging
+import re
+import threading
+import time
+from flask import current_app
+from sqlalchemy import func, select
+from src.models import db, Book, BorrowRecord
+from src.book_search import search_words
+from src.signals import book_borrowed, book_changed
+
+logger = logging.getLogger(__name__)
+
+SUGGEST_MAX_LIMIT = 20
+SUGGEST_SCAN_LIMIT = 500
+SUGGEST_RESYNC_SECONDS = 300.0
+
+_ISBN_RE = re.compile(r'[\dXx][\dXx\s-]*')
+
+def _isbn_key(isbn):
+    return re.sub(r'[^0-9x]', '', (isbn or '').lower())
+
+def normalize_prefix(text):
+    """The key prefix to look up for search-box text."""
+    if _ISBN_RE.fullmatch(text.strip()) and any(char.isdigit() for char in text):
+        return _isbn_key(text)
+    normalized = ' '.join(search_words(text))
+    # "lost " should not also match "lostwithiel"
+    return normalized + ' ' if normalized and text[-1:].isspace() else normalized
+
+def book_keys(title, author, isbn):
+    """Every key a book is found under."""
+    keys = set()
+    for text in (title, author):
+        words = search_words(text)
+        keys.update(' '.join(words[start:]) for start in range(len(words)))
+    if isbn:
+        keys.add(_isbn_key(isbn))
+    keys.discard('')
+    return sorted(keys)
+
+class SuggestIndex:
+    """Sorted prefix keys with each book's details and loan count."""
+
+    def __init__(self, books=(), counts=None, last_record_id=0):
+        self.books = {}
+        self.keys = {}
+        self.counts = dict(counts or {})
+        # The loaded counts include every loan up to this BorrowRecord id
+        self.last_record_id = last_record_id
+        self.top = {}
+        entries = []
+        for book_id, title, author, isbn in books:
+            self.books[book_id] = (title, author, isbn)
+            self.keys[book_id] = book_keys(title, author, isbn)
+            entries.extend((key, book_id) for key in self.keys[book_id])
+        entries.sort()
+        self.entries = entries
+
+    def _rank(self, book_id):
+        return (self.counts.get(book_id, 0), -book_id)
+
+    def _range(self, prefix, start=0, end=None):
+        start = bisect.bisect_left(self.entries, (prefix,), start, end)
+        return start, bisect.bisect_left(self.entries, (prefix + '\U0010ffff',), start, end)
+
+    def _cached_tops(self, book_id):
+        prefixes = {key[:end] for key in self.keys.get(book_id, ()) for end in range(1, len(key) + 1)}
+        return [(prefix, self.top[prefix]) for prefix in prefixes if prefix in self.top]
+
+    def _promote(self, book_id):
+        for _, top in self._cached_tops(book_id):
+            if book_id in top:
+                top.sort(key=self._rank, reverse=True)
+            elif len(top) < SUGGEST_MAX_LIMIT or self._rank(book_id) > self._rank(top[-1]):
+                top.append(book_id)
+                top.sort(key=self._rank, reverse=True)
+                del top[SUGGEST_MAX_LIMIT:]
+
+    def cache_heavy_prefixes(self, prefix='', start=0, end=None):
+        """Compute the top list of every prefix too long to scan, each from those one letter longer."""
+        end = len(self.entries) if end is None else end
+        ids = set()
+        position = start
+        while position < end:
+            key, book_id = self.entries[position]
+            if len(key) == len(prefix):
+                ids.add(book_id)
+                position += 1
+                continue
+            child = key[:len(prefix) + 1]
+            child_start, child_end = self._range(child, position, end)
+            if child_end - child_start > SUGGEST_SCAN_LIMIT:
+                # A book in this prefix's top list is in its child's
+                self.cache_heavy_prefixes(child, child_start, child_end)
+                ids.update(self.top[child])
+            else:
+                ids.update(book_id for _, book_id in self.entries[child_start:child_end])
+            position = child_end
+        if prefix:
+            self.top[prefix] = heapq.nlargest(SUGGEST_MAX_LIMIT, ids, key=self._rank)
+
+    def add(self, book_id, title, author, isbn):
+        self.remove(book_id)
+        self.books[book_id] = (title, author, isbn)
+        self.keys[book_id] = book_keys(title, author, isbn)
+        for key in self.keys[book_id]:
+            bisect.insort(self.entries, (key, book_id))
+        self._promote(book_id)
+
+    def remove(self, book_id):
+        for prefix in [prefix for prefix, top in self._cached_tops(book_id) if book_id in top]:
+            del self.top[prefix]
+        keys = self.keys.pop(book_id, None)
+        if keys is None:
+            return
+        for key in keys:
+            position = bisect.bisect_left(self.entries, (key, book_id))
+            if position < len(self.entries) and self.entries[position] == (key, book_id):
+                del self.entries[position]
+        del self.books[book_id]
+
+    def borrowed(self, record_id, book_id):
+        """Count loan ``record_id`` of ``book_id`` and move the book up the cached top lists."""
+        if record_id <= self.last_record_id:
+            return
+        self.counts[book_id] = self.counts.get(book_id, 0) + 1
+        self._promote(book_id)
+
+    def suggest(self, prefix, limit):
+        """Ids of the ``limit`` most borrowed books with a key starting with ``prefix``."""
+        if not prefix:
+            return []
+        start, end = self._range(prefix)
+        if end - start <= SUGGEST_SCAN_LIMIT:
+            ids = {book_id for _, book_id in self.entries[start:end]}
+            return heapq.nlargest(limit, ids, key=self._rank)
+        top = self.top.get(prefix)
+        if top is None:
+            ids = {book_id for _, book_id in self.entries[start:end]}
+            top = self.top[prefix] = heapq.nlargest(SUGGEST_MAX_LIMIT, ids, key=self._rank)
+        return top[:limit]
+
+    def __len__(self):
+        return len(self.books)
+
+class _State:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index = None
+        self.built_at = 0.0
+        self.building = None
+        self.replay = []
+
+def _state(app=None):
+    app = app or current_app
+    return app.extensions.setdefault('book_suggest', _State())
+
+def load_suggest_index():
+    """A fresh index of every book and its loan count."""
+    primary = {'bind': db.engine}
+    # Pin the counts to a known set of loans, so replayed loans are counted exactly once
+    last_id = db.session.execute(select(func.max(BorrowRecord.id)), bind_arguments=primary).scalar() or 0
+    counts = db.session.execute(
+        select(BorrowRecord.book_id, func.count(BorrowRecord.id))
+        .where(BorrowRecord.id <= last_id).group_by(BorrowRecord.book_id),
+        bind_arguments=primary).all()
+    books = db.session.execute(select(Book.id, Book.title, Book.author, Book.isbn), bind_arguments=primary).all()
+    index = SuggestIndex(books, dict(counts), last_id)
+    index.cache_heavy_prefixes()
+    return index
+
+def _apply(index, event, payload):
+    if event == 'borrowed':
+        index.borrowed(*payload)
+    elif event == 'deleted':
+        index.remove(payload)
+    else:
+        index.add(*payload)
+
+def _build(app, state):
+    try:
+        with app.app_context():
+            index = load_suggest_index()
+        with state.lock:
+            # Edits and loans that committed while we read; both are idempotent
+            for event, payload in state.replay:
+                _apply(index, event, payload)
+            state.index, state.built_at = index, time.monotonic()
+    except Exception:
+        logger.exception("Book suggest index build failed")
+    finally:
+        with state.lock:
+            state.building, state.replay = None, []
+
+def _start_build(app, state):
+    state.building = threading.Thread(target=_build, args=(app, state), daemon=True, name='book-suggest-build')
+    state.building.start()
+    return state.building
+
+def warm_suggest_index(app):
+    """Start building ``app``'s index in the background, e.g. at startup."""
+    state = _state(app)
+    with state.lock:
+        if state.index is None and state.building is None:
+            _start_build(app, state)
+
+def suggest_books(text, limit=10):
+    """Autocomplete for search-box ``text``: the most borrowed matching books, as
+    ``{'id', 'title', 'author', 'isbn', 'borrow_count'}`` dicts."""
+    app = current_app._get_current_object()
+    state = _state(app)
+    resync = app.config.get('SUGGEST_RESYNC_SECONDS', SUGGEST_RESYNC_SECONDS)
+    with state.lock:
+        if state.building is None and (state.index is None or time.monotonic() - state.built_at >= resync):
+            _start_build(app, state)
+        thread = state.building if state.index is None else None
+    if thread is not None:
+        # Nothing to serve yet: wait for the first build
+        thread.join()
+    prefix = normalize_prefix(text)
+    with state.lock:
+        index = state.index
+        if index is None:
+            raise RuntimeError("Book suggest index is not available")
+        return [{
+            'id': book_id,
+            'title': index.books[book_id][0],
+            'author': index.books[book_id][1],
+            'isbn': index.books[book_id][2],
+            'borrow_count': index.counts.get(book_id, 0),
+        } for book_id in index.suggest(prefix, min(limit, SUGGEST_MAX_LIMIT))]
+
+def _record(sender, event, payload):
+    state = _state(sender)
+    with state.lock:
+        if state.building is not None:
+            state.replay.append((event, payload))
+        if state.index is not None:
+            _apply(state.index, event, payload)
+
+def _on_book_changed(sender, book_id, action, title, author, isbn, **data):
+    if action == 'deleted':
+        _record(sender, 'deleted', book_id)
+    else:
+        _record(sender, 'updated', (book_id, title, author, isbn))
+
+def _on_book_borrowed(sender, record_id, book_id, **data):
+    _record(sender, 'borrowed', (record_id, book_id))
+
+book_changed.connect(_on_book_changed, weak=False)
+book_borrowed.connect(_on_book_borrowed, weak=False)
@@ -0,0 +1,141 @@
+"""Conditional GET for read-heavy catalog endpoints.
+
+Every flush that adds, changes or deletes a ``Book`` bumps the
+``catalog_version`` row of ``library_counters`` in the same transaction, so
+all worker processes share one version that moves exactly when catalog data
+(including availability) can have changed. The committed value is also kept
+in memory per app and re-read from the database at most every
+``CATALOG_VERSION_TTL`` seconds, which bounds how long a write handled by
+another worker process can go unnoticed here.
+
+Views decorated with ``@catalog_etag()`` (placed under ``@bp.route`` and
+``@query_budget``, whose budget must allow one extra statement for the
+periodic version read) get a strong ETag built from the version and the
+request path, and a request whose ``If-None-Match`` matches is answered
+``304 Not Modified`` before the view runs: no SQL while the version is
+cached, and no serialization.
+``@catalog_etag(private=True)`` also keys the tag on the session user and
+only short-circuits requests that carry one; the view still performs its
+own authorization whenever it runs.
+
+Catalog writes that bypass the ORM unit of work (bulk ``UPDATE`` statements,
+raw SQL) must bump the version themselves with ``bump_catalog_version``.
+"""
+import hashlib
+import threading
+import time
+from functools import wraps
+from flask import current_app, has_app_context, make_response, request, session
+from sqlalchemy import event, select, text
+from sqlalchemy.orm import Session
+from src.models import db, Book, LibraryCounter
+
+CATALOG_VERSION_TTL = 5.0
+CATALOG_VERSION_KEY = 'catalog_version'
+
+_BUMP_SQL = text(
+    "INSERT INTO library_counters (name, value) VALUES ('catalog_version', 1) "
+    "ON CONFLICT (name) DO UPDATE SET value = library_counters.value + 1 "
+    "RETURNING value"
+)
+_PENDING_KEY = 'pending_catalog_version'
+
+class CatalogVersion:
+    """Thread-safe in-memory copy of the committed catalog version."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = None
+        self._loaded_at = 0.0
+        self._generation = 0
+
+    def get(self, ttl, load):
+        with self._lock:
+            if self._value is not None and time.monotonic() - self._loaded_at < ttl:
+                return self._value
+            generation = self._generation
+        value = load()
+        with self._lock:
+            # A commit while we loaded already installed a newer version
+            if generation == self._generation:
+                self._value, self._loaded_at = value, time.monotonic()
+            return self._value if self._value is not None else value
+
+    def committed(self, value):
+        """Record a version committed by this process."""
+        with self._lock:
+            self._generation += 1
+            if self._value is None or value > self._value:
+                self._value = value
+
+def _version_cache(app=None):
+    app = app or current_app
+    return app.extensions.setdefault('catalog_version', CatalogVersion())
+
+def load_catalog_version():
+    """Read the committed catalog version from the primary database."""
+    value = db.session.execute(
+        select(LibraryCounter.value).where(LibraryCounter.name == CATALOG_VERSION_KEY),
+        bind_arguments={'bind': db.engine},
+    ).scalar()
+    return int(value or 0)
+
+def get_catalog_version():
+    """The app's cached catalog version; see ``CATALOG_VERSION_TTL``."""
+    ttl = current_app.config.get('CATALOG_VERSION_TTL', CATALOG_VERSION_TTL)
+    return _version_cache().get(ttl, load_catalog_version)
+
+def bump_catalog_version():
+    """Bump the catalog version in the current ``db.session`` transaction."""
+    session = db.session()
+    version = session.execute(_BUMP_SQL, bind_arguments={'bind': db.engine}).scalar()
+    session.info[_PENDING_KEY] = version
+    return version
+
+def _changes_catalog(session):
+    if any(isinstance(obj, Book) for obj in session.new) or any(isinstance(obj, Book) for obj in session.deleted):
+        return True
+    return any(isinstance(obj, Book) and session.is_modified(obj) for obj in session.dirty)
+
+@event.listens_for(Session, 'after_flush')
+def _bump_on_book_flush(session, flush_context):
+    # new/dirty/deleted still describe what this flush wrote
+    if _changes_catalog(session):
+        session.info[_PENDING_KEY] = session.connection().execute(_BUMP_SQL).scalar()
+
+@event.listens_for(Session, 'after_commit')
+def _publish_catalog_version(session):
+    version = session.info.pop(_PENDING_KEY, None)
+    if version is not None and has_app_context():
+        _version_cache().committed(int(version))
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_catalog_version(session, previous_transaction):
+    if not session.in_transaction():
+        session.info.pop(_PENDING_KEY, None)
+
+def catalog_etag(private=False):
+    """Serve the view with a catalog-version ETag and answer matching requests with 304."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if private and 'user_id' not in session:
+                return view(*args, **kwargs)
+            variant = request.full_path
+            if private:
+                variant = f"{session['user_id']}:{variant}"
+            digest = hashlib.sha1(variant.encode('utf-8')).hexdigest()[:16]
+            etag = f'{get_catalog_version()}-{digest}'
+            cache_control = 'private, no-cache' if private else 'no-cache'
+
+            if request.if_none_match.contains(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = cache_control
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,64 @@
+"""Category facets for catalog filters.
+
+``get_category_facets()`` returns every category with its number of titles,
+titles with a copy on the shelf and open loans, computed by one grouped
+query. The result is cached per app together with the catalog version (see
+``catalog_etag``) it was computed at and recomputed once the version moves,
+which happens whenever a book is added, changed, deleted, borrowed or
+returned. Writes from other worker processes are noticed once this process
+re-reads the version.
+"""
+import threading
+from flask import current_app
+from sqlalchemy import case, func, select
+from src.models import db, Book, BorrowRecord
+from src.catalog_etag import get_catalog_version
+
+class FacetCache:
+    """The last computed facets and the catalog version they belong to."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._value = None
+
+    def get(self, version, compute):
+        with self._lock:
+            if self._version == version:
+                return self._value
+        value = compute()
+        with self._lock:
+            if self._version is None or version >= self._version:
+                self._version, self._value = version, value
+        return value
+
+def _cache(app=None):
+    app = app or current_app
+    return app.extensions.setdefault('category_facets', FacetCache())
+
+def compute_category_facets():
+    """Facets for every non-empty category, in one statement (bypassing the cache)."""
+    open_loans = select(
+        BorrowRecord.book_id, func.count(BorrowRecord.id).label('open_loans')
+    ).where(BorrowRecord.return_date.is_(None)).group_by(BorrowRecord.book_id).subquery()
+
+    rows = db.session.execute(
+        select(
+            Book.category,
+            func.count(Book.id),
+            func.sum(case((Book.available_quantity > 0, 1), else_=0)),
+            func.coalesce(func.sum(open_loans.c.open_loans), 0),
+        ).outerjoin(open_loans, open_loans.c.book_id == Book.id)
+        .where(Book.category.isnot(None), Book.category != '')
+        .group_by(Book.category).order_by(Book.category)
+    ).all()
+    return [{
+        'category': category,
+        'total_titles': int(total_titles),
+        'available_titles': int(available_titles or 0),
+        'open_loans': int(open_loan_count),
+    } for category, total_titles, available_titles, open_loan_count in rows]
+
+def get_category_facets():
+    """Cached category facets; see ``compute_category_facets``."""
+    return _cache().get(get_catalog_version(), compute_category_facets)
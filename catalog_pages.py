@@ -0,0 +1,67 @@
+"""Sparse fieldsets, ranked pages and NDJSON streams for the student catalog.
+
+``fields=title,author`` (any of ``BOOK_FIELDS``) limits each book in a
+response to those keys, always with ``id``, and the query to those columns
+through ``load_only``, so a listing never reads or ships descriptions nobody
+asked for. Unknown names raise ``InvalidFields`` (answered 400).
+
+Responses are pages by default: keyset pages (see ``keyset_pagination``) for
+listings in id order, and position cursors (``position_cursor``) for ranked
+search results, where every page ranks all matches anyway. ``format=ndjson``
+instead streams every matching book as one JSON object per line, read with
+``yield_per`` ``STREAM_BATCH_SIZE`` rows at a time, so the server holds one
+batch whatever the size of the catalog.
+"""
+import json
+from flask import Response, request, stream_with_context
+from sqlalchemy.orm import load_only
+from src.models import Book
+from src.keyset_pagination import InvalidCursor, decode_cursor, encode_cursor
+
+BOOK_FIELDS = ('id', 'title', 'author', 'isbn', 'category', 'available_quantity', 'total_quantity', 'description')
+STREAM_BATCH_SIZE = 500
+
+class InvalidFields(ValueError):
+    """Raised when ``fields=`` names a field that does not exist."""
+
+def parse_fields(raw, default=BOOK_FIELDS):
+    """The fields a client asked for with ``fields=``, in ``BOOK_FIELDS`` order."""
+    if not raw:
+        return list(default)
+    names = {name.strip() for name in raw.split(',') if name.strip()}
+    unknown = sorted(names - set(BOOK_FIELDS))
+    if unknown:
+        raise InvalidFields(f"Unknown field(s): {', '.join(unknown)}; choose from {', '.join(BOOK_FIELDS)}")
+    return [name for name in BOOK_FIELDS if name in names or name == 'id']
+
+def only_fields(query, fields):
+    """``query`` loading only the ``Book`` columns behind ``fields``."""
+    return query.options(load_only(*(getattr(Book, name) for name in fields)))
+
+def book_dict(book, fields):
+    return {name: getattr(book, name) for name in fields}
+
+def wants_stream():
+    """Whether the client asked for NDJSON with ``format=ndjson``."""
+    return request.args.get('format', '').lower() == 'ndjson'
+
+def stream_books(query, fields):
+    """NDJSON response with every book of ``query``, fetched ``STREAM_BATCH_SIZE`` rows at a time."""
+    def stream():
+        for book in query.yield_per(STREAM_BATCH_SIZE):
+            yield json.dumps(book_dict(book, fields), separators=(',', ':')) + '\n'
+    return Response(stream_with_context(stream()), mimetype='application/x-ndjson')
+
+def position_cursor(offset, fuzzy=False):
+    """Continuation token for position ``offset`` of a ranked result list."""
+    return encode_cursor({'offset': offset, 'fuzzy': fuzzy})
+
+def read_position(token):
+    """``(offset, fuzzy)`` from a ``position_cursor`` token, ``(0, False)`` without one."""
+    if not token:
+        return 0, False
+    position = decode_cursor(token)
+    if (not isinstance(position, dict) or not isinstance(position.get('offset'), int)
+            or position['offset'] < 0 or not isinstance(position.get('fuzzy'), bool)):
+        raise InvalidCursor(f"Invalid cursor: {token!r}")
+    return position['offset'], position['fuzzy']
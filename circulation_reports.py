@@ -0,0 +1,221 @@
+"""Date-range circulation reports served from daily and monthly partials.
+
+Every report (``circulation_summary``, ``popular_books``, ``active_users``,
+``year_over_year``) splits its ``start``..``end`` range (inclusive UTC days)
+into whole months, read from the ``circulation_monthly*`` tables, and the
+remaining days, read from the ``circulation_daily*`` rollups of
+``circulation_rollup``. The daily rollups are written with every loan, so
+the current month, and any day in it, is always live; a year-over-year
+comparison reads a few dozen monthly rows plus the edge days instead of
+scanning ``borrow_record`` and ``fees``.
+
+A month is materialized into the monthly tables from its daily rows the
+first time a report covers it after it has closed (a day of grace after its
+last day, so a loan committing around midnight is never missed); until the
+rows are visible to the report's session, which may be a reporting snapshot,
+that month is read from the daily rollups. Closed months never change
+afterwards, except through ``rebuild_circulation_rollup``, which drops the
+monthly tables. Materialization runs in the background on its own thread and
+app context, so it never counts against a request's query budget, and ``ON
+CONFLICT DO NOTHING`` makes concurrent materializations by several processes
+harmless.
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, select, text, true, union_all
+from src.models import (
+    db, Book, User,
+    CirculationDaily, CirculationDailyBook, CirculationDailyUser,
+    CirculationMonthly, CirculationMonthlyBook, CirculationMonthlyUser,
+)
+
+logger = logging.getLogger(__name__)
+
+MONTH_GRACE_DAYS = 1
+
+_MATERIALIZE_SQL = [text(sql) for sql in (
+    "INSERT INTO circulation_monthly (month, issues, returns, fines, fine_amount) "
+    "SELECT :month, SUM(issues), SUM(returns), SUM(fines), SUM(fine_amount) FROM circulation_daily "
+    "WHERE day >= :month AND day < :next_month GROUP BY 1 ON CONFLICT DO NOTHING",
+    "INSERT INTO circulation_monthly_book (month, book_id, issues, returns) "
+    "SELECT :month, book_id, SUM(issues), SUM(returns) FROM circulation_daily_book "
+    "WHERE day >= :month AND day < :next_month GROUP BY book_id ON CONFLICT DO NOTHING",
+    "INSERT INTO circulation_monthly_user (month, user_id, issues) "
+    "SELECT :month, user_id, SUM(issues) FROM circulation_daily_user "
+    "WHERE day >= :month AND day < :next_month GROUP BY user_id ON CONFLICT DO NOTHING",
+    # Marks the month as materialized even when it had no activity
+    "INSERT INTO circulation_monthly (month, issues, returns, fines, fine_amount) "
+    "VALUES (:month, 0, 0, 0, 0) ON CONFLICT DO NOTHING",
+)]
+
+def _next_month(month):
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def _months(start, end):
+    """First days of the months lying entirely inside ``start``..``end``."""
+    month = start if start.day == 1 else _next_month(start)
+    months = []
+    while _next_month(month) - timedelta(days=1) <= end:
+        months.append(month)
+        month = _next_month(month)
+    return months
+
+def _closed(month, today):
+    return _next_month(month) + timedelta(days=MONTH_GRACE_DAYS) <= today
+
+class _Pending:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.months = set()
+
+def _pending(app):
+    return app.extensions.setdefault('circulation_months', _Pending())
+
+def _materialize(app, months):
+    pending = _pending(app)
+    try:
+        with app.app_context():
+            for month in months:
+                params = {'month': month.isoformat(), 'next_month': _next_month(month).isoformat()}
+                for statement in _MATERIALIZE_SQL:
+                    db.session.execute(statement, params, bind_arguments={'bind': db.engine})
+                db.session.commit()
+    except Exception:
+        logger.exception("Materializing circulation months failed")
+    finally:
+        with pending.lock:
+            pending.months.difference_update(months)
+
+def _start_materialize(months):
+    app = current_app._get_current_object()
+    pending = _pending(app)
+    with pending.lock:
+        months = sorted(set(months) - pending.months)
+        pending.months.update(months)
+    if months:
+        threading.Thread(target=_materialize, args=(app, months), daemon=True, name='circulation-months').start()
+
+def _plan(ranges, today):
+    """Split each ``(start, end)`` into monthly-partial months and daily gaps.
+
+    Returns one ``(months, gaps)`` pair per range: ``months`` read from the
+    monthly tables, ``gaps`` as ``(first_day, last_day)`` ranges of the daily
+    ones. Closed months not materialized yet fall into the gaps and are
+    materialized in the background for later reports.
+    """
+    candidates = {month for start, end in ranges for month in _months(start, end) if _closed(month, today)}
+    materialized = set()
+    if candidates:
+        materialized = set(db.session.execute(
+            select(CirculationMonthly.month).where(CirculationMonthly.month.in_(sorted(candidates)))
+        ).scalars())
+        if candidates - materialized:
+            _start_materialize(candidates - materialized)
+
+    plans = []
+    for start, end in ranges:
+        months = [month for month in _months(start, end) if month in materialized]
+        gaps, day = [], start
+        for month in months:
+            if day < month:
+                gaps.append((day, month - timedelta(days=1)))
+            day = _next_month(month)
+        if day <= end:
+            gaps.append((day, end))
+        plans.append((months, gaps))
+    return plans
+
+def _partials(plan, monthly, daily, columns, with_month=False):
+    """Union of monthly and daily rows covering one (non-empty) plan, as ``(month?, *columns)``."""
+    months, gaps = plan
+    selects = []
+    if months:
+        month = [monthly.month.label('month')] if with_month else []
+        selects.append(select(*month, *[getattr(monthly, name).label(name) for name in columns])
+                       .where(monthly.month.in_(months)))
+    for first, last in gaps:
+        month = [func.strftime('%Y-%m-01', daily.day).label('month')] if with_month else []
+        selects.append(select(*month, *[getattr(daily, name).label(name) for name in columns])
+                       .where(daily.day.between(first, last)))
+    return union_all(*selects).subquery()
+
+_TOTAL_COLUMNS = ('issues', 'returns', 'fines', 'fine_amount')
+
+def _totals_columns(rows, suffix=''):
+    return [func.coalesce(func.sum(rows.c[name]), 0).label(name + suffix) for name in _TOTAL_COLUMNS]
+
+def _totals(row, suffix=''):
+    return {
+        'issues': int(row[f'issues{suffix}']),
+        'returns': int(row[f'returns{suffix}']),
+        'fines': int(row[f'fines{suffix}']),
+        'fine_amount': float(row[f'fine_amount{suffix}']),
+    }
+
+def _today():
+    return datetime.utcnow().date()
+
+def circulation_summary(start, end):
+    """Loans, returns and fines over ``start``..``end``: totals plus one entry per month."""
+    plan, = _plan([(start, end)], _today())
+    rows = _partials(plan, CirculationMonthly, CirculationDaily, _TOTAL_COLUMNS, with_month=True)
+    result = db.session.execute(
+        select(rows.c.month, *_totals_columns(rows)).group_by(rows.c.month).order_by(rows.c.month)
+    ).all()
+    months = [{'month': str(row.month)[:7], **_totals(row._mapping)} for row in result]
+    totals = {name: sum(month[name] for month in months) for name in _TOTAL_COLUMNS}
+    return {'start': start.isoformat(), 'end': end.isoformat(), 'totals': totals, 'months': months}
+
+def _ranked(plan, monthly, daily, key, columns, model, limit):
+    rows = _partials(plan, monthly, daily, (key, 'issues'))
+    counts = select(rows.c[key], func.sum(rows.c.issues).label('borrow_count')).group_by(rows.c[key]).subquery()
+    return db.session.execute(
+        select(model.id, *columns, counts.c.borrow_count).join(counts, counts.c[key] == model.id)
+        .where(counts.c.borrow_count > 0)
+        .order_by(counts.c.borrow_count.desc(), model.id).limit(limit)
+    ).all()
+
+def popular_books(start, end, limit=10):
+    """Most borrowed books over ``start``..``end`` as ``{'id', 'title', 'author', 'borrow_count'}`` dicts."""
+    plan, = _plan([(start, end)], _today())
+    rows = _ranked(plan, CirculationMonthlyBook, CirculationDailyBook, 'book_id',
+                   (Book.title, Book.author), Book, limit)
+    return [{'id': book_id, 'title': title, 'author': author, 'borrow_count': int(count)}
+            for book_id, title, author, count in rows]
+
+def active_users(start, end, limit=10):
+    """Most active borrowers over ``start``..``end`` as ``{'id', 'fullname', 'username', 'borrow_count'}`` dicts."""
+    plan, = _plan([(start, end)], _today())
+    rows = _ranked(plan, CirculationMonthlyUser, CirculationDailyUser, 'user_id',
+                   (User.fullname, User.username), User, limit)
+    return [{'id': user_id, 'fullname': fullname, 'username': username, 'borrow_count': int(count)}
+            for user_id, fullname, username, count in rows]
+
+def _year_earlier(day):
+    try:
+        return day.replace(year=day.year - 1)
+    except ValueError:
+        # 29 February
+        return day.replace(year=day.year - 1, day=28)
+
+def year_over_year(start, end):
+    """Totals over ``start``..``end`` next to the same dates a year earlier, with relative change."""
+    previous = (_year_earlier(start), _year_earlier(end))
+    current_plan, previous_plan = _plan([(start, end), previous], _today())
+    current_rows = _partials(current_plan, CirculationMonthly, CirculationDaily, _TOTAL_COLUMNS)
+    previous_rows = _partials(previous_plan, CirculationMonthly, CirculationDaily, _TOTAL_COLUMNS)
+    # Two one-row aggregates side by side: a single statement
+    current_totals = select(*_totals_columns(current_rows, '_current')).subquery()
+    previous_totals = select(*_totals_columns(previous_rows, '_previous')).subquery()
+    row = db.session.execute(
+        select(current_totals, previous_totals).select_from(current_totals.join(previous_totals, true()))
+    ).one()._mapping
+    current, earlier = _totals(row, '_current'), _totals(row, '_previous')
+    return {
+        'current': {'start': start.isoformat(), 'end': end.isoformat(), **current},
+        'previous': {'start': previous[0].isoformat(), 'end': previous[1].isoformat(), **earlier},
+        'change': {name: round((current[name] - earlier[name]) / earlier[name] * 100, 1) if earlier[name] else None
+                   for name in _TOTAL_COLUMNS},
+    }
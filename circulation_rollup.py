@@ -0,0 +1,226 @@
+"""Daily circulation rollups for date-bucketed metrics.
+
+Four small tables hold loan activity per UTC day: ``circulation_daily``
+(issues, returns and fines), ``circulation_daily_book`` (issues and returns
+per book), ``circulation_daily_category`` (the same per book category,
+``''`` for uncategorized books) and ``circulation_daily_user`` (loans per
+borrower). The borrow and return routes call
+``record_circulation`` inside their own transaction, next to
+``increment_counters``, so the rollup commits together with the loan.
+
+Date-range questions (``circulation_totals``, ``daily_circulation``,
+``book_circulation``, ``category_circulation``) then read at most one row
+per day (per book or category) instead of scanning ``borrow_record``: a
+year-long trend chart is 365 primary-key rows.
+
+A loan is counted under the category its book had when it was borrowed or
+returned; ``rebuild_circulation_rollup`` recomputes everything from the
+source tables with the books' current categories, and drops the monthly
+partials of ``circulation_reports`` so they are materialized again.
+
+Run ``python circulation_rollup.py`` to report drift against the source
+tables, or ``python circulation_rollup.py --fix`` to rebuild the rollups.
+"""
+import sys
+from datetime import datetime, timedelta
+from sqlalchemy import Date, bindparam, delete, func, insert, literal, select, text, union_all
+from src.models import (
+    db, Book, BorrowRecord, Fees,
+    CirculationDaily, CirculationDailyBook, CirculationDailyCategory, CirculationDailyUser,
+    CirculationMonthly, CirculationMonthlyBook, CirculationMonthlyUser,
+)
+
+_DAY = bindparam('day', type_=Date)
+
+_DAILY_SQL = text(
+    "INSERT INTO circulation_daily (day, issues, returns, fines, fine_amount) "
+    "VALUES (:day, :issues, :returns, :fines, :fine_amount) "
+    "ON CONFLICT (day) DO UPDATE SET "
+    "issues = circulation_daily.issues + excluded.issues, "
+    "returns = circulation_daily.returns + excluded.returns, "
+    "fines = circulation_daily.fines + excluded.fines, "
+    "fine_amount = circulation_daily.fine_amount + excluded.fine_amount"
+).bindparams(_DAY)
+
+_BOOK_SQL = text(
+    "INSERT INTO circulation_daily_book (day, book_id, issues, returns) "
+    "VALUES (:day, :book_id, :issues, :returns) "
+    "ON CONFLICT (day, book_id) DO UPDATE SET "
+    "issues = circulation_daily_book.issues + excluded.issues, "
+    "returns = circulation_daily_book.returns + excluded.returns"
+).bindparams(_DAY)
+
+_USER_SQL = text(
+    "INSERT INTO circulation_daily_user (day, user_id, issues) "
+    "VALUES (:day, :user_id, :issues) "
+    "ON CONFLICT (day, user_id) DO UPDATE SET "
+    "issues = circulation_daily_user.issues + excluded.issues"
+).bindparams(_DAY)
+
+_CATEGORY_SQL = text(
+    "INSERT INTO circulation_daily_category (day, category, issues, returns) "
+    "VALUES (:day, :category, :issues, :returns) "
+    "ON CONFLICT (day, category) DO UPDATE SET "
+    "issues = circulation_daily_category.issues + excluded.issues, "
+    "returns = circulation_daily_category.returns + excluded.returns"
+).bindparams(_DAY)
+
+def record_circulation(book, user_id, issues=0, returns=0, fine=0.0, day=None):
+    """Add one day's loan activity for ``book`` and borrower ``user_id`` in the current session's transaction."""
+    day = day or datetime.utcnow().date()
+    counts = {'day': day, 'issues': issues, 'returns': returns}
+    db.session.execute(_DAILY_SQL, {**counts, 'fines': 1 if fine else 0, 'fine_amount': fine or 0.0})
+    db.session.execute(_BOOK_SQL, {**counts, 'book_id': book.id})
+    db.session.execute(_CATEGORY_SQL, {**counts, 'category': book.category or ''})
+    if issues:
+        db.session.execute(_USER_SQL, {'day': day, 'user_id': user_id, 'issues': issues})
+
+def _loan_events(*keys, join_book=False):
+    """``(day, *keys, issues, returns)`` grouped over every borrow and return."""
+    def events(day_column, issues, returns, *criteria):
+        query = select(func.date(day_column).label('day'), *keys,
+                       literal(issues).label('issues'), literal(returns).label('returns'))
+        if join_book:
+            query = query.join(Book, Book.id == BorrowRecord.book_id)
+        return query.where(*criteria)
+
+    loans = union_all(
+        events(BorrowRecord.borrow_date, 1, 0),
+        events(BorrowRecord.return_date, 0, 1, BorrowRecord.return_date.isnot(None)),
+    ).subquery()
+    group = [loans.c.day] + [loans.c[key.name] for key in keys]
+    return select(*group, func.sum(loans.c.issues), func.sum(loans.c.returns)).group_by(*group)
+
+def _source_statements():
+    """Set-based definition of each rollup table over the source tables."""
+    loans = union_all(
+        select(func.date(BorrowRecord.borrow_date).label('day'), literal(1).label('issues'),
+               literal(0).label('returns'), literal(0).label('fines'), literal(0.0).label('fine_amount')),
+        select(func.date(BorrowRecord.return_date), literal(0), literal(1), literal(0), literal(0.0))
+            .where(BorrowRecord.return_date.isnot(None)),
+        select(func.date(Fees.date), literal(0), literal(0), literal(1), Fees.amount),
+    ).subquery()
+    daily = select(loans.c.day, func.sum(loans.c.issues), func.sum(loans.c.returns),
+                   func.sum(loans.c.fines), func.sum(loans.c.fine_amount)).group_by(loans.c.day)
+    return {
+        CirculationDaily: (('day', 'issues', 'returns', 'fines', 'fine_amount'), daily),
+        CirculationDailyBook: (('day', 'book_id', 'issues', 'returns'),
+                               _loan_events(BorrowRecord.book_id.label('book_id'))),
+        CirculationDailyCategory: (('day', 'category', 'issues', 'returns'),
+                                   _loan_events(func.coalesce(Book.category, '').label('category'),
+                                                join_book=True)),
+        CirculationDailyUser: (('day', 'user_id', 'issues'),
+                               select(func.date(BorrowRecord.borrow_date), BorrowRecord.user_id,
+                                      func.count(BorrowRecord.id))
+                               .group_by(func.date(BorrowRecord.borrow_date), BorrowRecord.user_id)),
+    }
+
+def rebuild_circulation_rollup():
+    """Recompute every rollup table from ``borrow_record`` and ``fees`` and commit."""
+    for model, (columns, statement) in _source_statements().items():
+        db.session.execute(delete(model))
+        db.session.execute(insert(model).from_select(list(columns), statement))
+    for model in (CirculationMonthly, CirculationMonthlyBook, CirculationMonthlyUser):
+        db.session.execute(delete(model))
+    db.session.commit()
+
+def reconcile_circulation_rollup(fix=False):
+    """Compare stored rollups with a recount and return the drift.
+
+    Returns ``{table: {key: {'stored', 'actual'}}}`` for every row that
+    disagrees (``None`` for a missing row). With ``fix=True`` the rollups
+    are rebuilt and committed.
+    """
+    drift = {}
+    for model, (columns, statement) in _source_statements().items():
+        width = len(model.__table__.primary_key.columns)
+        actual = {}
+        for row in db.session.execute(statement):
+            actual[(str(row[0]),) + tuple(row[1:width])] = tuple(row[width:])
+        stored = {}
+        for row in db.session.execute(select(*[model.__table__.c[name] for name in columns])):
+            stored[(row[0].isoformat(),) + tuple(row[1:width])] = tuple(row[width:])
+
+        table_drift = {}
+        for key in actual.keys() | stored.keys():
+            values = [stored.get(key), actual.get(key)]
+            if values[0] is None or values[1] is None or any(
+                    abs((a or 0) - (b or 0)) > 1e-9 for a, b in zip(*values)):
+                table_drift[key] = {'stored': values[0], 'actual': values[1]}
+        if table_drift:
+            drift[model.__tablename__] = table_drift
+
+    if fix and drift:
+        rebuild_circulation_rollup()
+    return drift
+
+def _day_range(start, end):
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+def circulation_totals(start, end):
+    """Issues, returns, fines and fine amount summed over ``start``..``end`` (inclusive)."""
+    row = db.session.execute(select(
+        func.coalesce(func.sum(CirculationDaily.issues), 0),
+        func.coalesce(func.sum(CirculationDaily.returns), 0),
+        func.coalesce(func.sum(CirculationDaily.fines), 0),
+        func.coalesce(func.sum(CirculationDaily.fine_amount), 0),
+    ).where(CirculationDaily.day.between(start, end))).one()
+    return {'issues': int(row[0]), 'returns': int(row[1]), 'fines': int(row[2]), 'fine_amount': float(row[3])}
+
+def daily_circulation(start, end):
+    """One entry per day in ``start``..``end`` (inclusive), zero-filled."""
+    rows = db.session.query(CirculationDaily).filter(CirculationDaily.day.between(start, end)).all()
+    by_day = {row.day: row for row in rows}
+    result = []
+    for day in _day_range(start, end):
+        row = by_day.get(day)
+        result.append({
+            'date': day.isoformat(),
+            'issues': row.issues if row else 0,
+            'returns': row.returns if row else 0,
+            'fines': row.fines if row else 0,
+            'fine_amount': float(row.fine_amount) if row else 0.0,
+        })
+    return result
+
+def book_circulation(start, end, limit=20):
+    """Most issued books over ``start``..``end`` as ``{'book_id', 'title', 'issues', 'returns'}`` dicts."""
+    issues = func.sum(CirculationDailyBook.issues).label('issues')
+    totals = select(
+        CirculationDailyBook.book_id, issues, func.sum(CirculationDailyBook.returns).label('returns'),
+    ).where(CirculationDailyBook.day.between(start, end)).group_by(
+        CirculationDailyBook.book_id).order_by(issues.desc(), CirculationDailyBook.book_id).limit(limit).subquery()
+    rows = db.session.execute(
+        select(totals.c.book_id, Book.title, totals.c.issues, totals.c.returns)
+        .outerjoin(Book, Book.id == totals.c.book_id)
+        .order_by(totals.c.issues.desc(), totals.c.book_id)
+    ).all()
+    return [{'book_id': book_id, 'title': title, 'issues': int(issues), 'returns': int(returns)}
+            for book_id, title, issues, returns in rows]
+
+def category_circulation(start, end):
+    """Issues and returns per category over ``start``..``end``, most issued first."""
+    issues = func.sum(CirculationDailyCategory.issues).label('issues')
+    rows = db.session.execute(select(
+        CirculationDailyCategory.category, issues, func.sum(CirculationDailyCategory.returns),
+    ).where(CirculationDailyCategory.day.between(start, end)).group_by(
+        CirculationDailyCategory.category).order_by(issues.desc(), CirculationDailyCategory.category)).all()
+    return [{'category': category or None, 'issues': int(issues), 'returns': int(returns)}
+            for category, issues, returns in rows]
+
+if __name__ == '__main__':
+    from app import app
+
+    fix = '--fix' in sys.argv[1:]
+    with app.app_context():
+        drift = reconcile_circulation_rollup(fix=fix)
+    if not drift:
+        print("Circulation rollups are consistent.")
+    for table, rows in sorted(drift.items()):
+        print(f"{table}: {len(rows)} row(s) differ")
+        for key, report in sorted(rows.items(), key=lambda item: str(item[0]))[:20]:
+            print(f"  {key}: stored={report['stored']} actual={report['actual']}")
+    if drift and fix:
+        print(f"Rebuilt {len(drift)} rollup table(s).")
+    elif drift:
+        sys.exit(1)
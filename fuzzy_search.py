@@ -0,0 +1,206 @@
+"""Typo-tolerant book search over a trigram index of catalog words.
+
+A misspelled search ("Tolkein") matches nothing in ``book_fts``. Instead of
+comparing the text with every title, ``fuzzy_search_books`` looks each word
+up in a small in-process index of the distinct words in titles and authors
+(read from the FTS5 vocabulary): every word is split into trigrams, padded
+like ``"  tolkien "``, and an inverted map from trigram to words yields the
+words sharing the most trigrams with the misspelling: those whose trigram
+sets overlap by at least ``FUZZY_MIN_SIMILARITY`` (Jaccard index). The
+``FUZZY_RERANK`` best are scored by edit distance, which unlike trigrams
+forgives swapped letters, and the ``FUZZY_MAX_CORRECTIONS`` closest stand in
+for the search word in an FTS5 query. That query returns at most
+``FUZZY_CANDIDATES`` books, ordered by the summed similarity of the words
+they contain, then BM25.
+Work per search grows with the number of distinct words sharing a trigram,
+never with the number of books.
+
+The word index is built per app on first use, on its own thread and app
+context (so it never counts against a request's query budget), and rebuilt
+in the background once the catalog version (see ``catalog_etag``) moves.
+"""
+import heapq
+import logging
+import threading
+from collections import Counter
+from flask import current_app
+from src.models import db
+from src.book_search import books_matching, match_expression, search_words
+from src.catalog_etag import get_catalog_version
+
+logger = logging.getLogger(__name__)
+
+# Low enough for one swapped pair of letters in a six-letter word ("pyhton")
+FUZZY_MIN_SIMILARITY = 0.25
+FUZZY_MAX_CORRECTIONS = 3
+FUZZY_RERANK = 20
+FUZZY_CANDIDATES = 200
+FUZZY_LIMIT = 50
+# Shorter words and numbers have too few trigrams to correct; they match as prefixes
+FUZZY_MIN_WORD_LENGTH = 4
+
+_VOCABULARY_DDL = "CREATE VIRTUAL TABLE IF NOT EXISTS temp.book_fts_vocab USING fts5vocab(main, book_fts, col)"
+_VOCABULARY_SQL = ("SELECT term, SUM(doc) FROM temp.book_fts_vocab "
+                   "WHERE col IN ('title', 'author') GROUP BY term")
+
+def trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def edit_distance(a, b):
+    """Insertions, deletions, substitutions and adjacent transpositions turning ``a`` into ``b``."""
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+    return current[len(b)]
+
+class TrigramIndex:
+    """Words with their document counts, looked up by trigram similarity."""
+
+    def __init__(self, words):
+        self.words = list(words)
+        self.documents = [words[word] for word in self.words]
+        self.sizes = []
+        self.postings = {}
+        for position, word in enumerate(self.words):
+            grams = trigrams(word)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(position)
+
+    def similar(self, word, limit=FUZZY_MAX_CORRECTIONS, min_similarity=FUZZY_MIN_SIMILARITY):
+        """Up to ``limit`` ``(word, similarity)`` pairs, closest (then most common) first.
+
+        ``similarity`` is one minus the edit distance over the longer length.
+        """
+        grams = trigrams(word)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        # Short words share the padded leading trigrams with everything; skip lengths too far off
+        slack = max(2, len(word) // 3)
+        scored = []
+        for position, count in shared.items():
+            similarity = count / (len(grams) + self.sizes[position] - count)
+            if similarity >= min_similarity and abs(len(self.words[position]) - len(word)) <= slack:
+                scored.append((-similarity, -self.documents[position], self.words[position]))
+        closest = []
+        for _, _, match in heapq.nsmallest(FUZZY_RERANK, scored):
+            closest.append((match, 1 - edit_distance(word, match) / max(len(word), len(match))))
+        # Stable: equally close words stay in trigram order
+        closest.sort(key=lambda entry: -entry[1])
+        return closest[:limit]
+
+    def __len__(self):
+        return len(self.words)
+
+class _State:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index = None
+        self.version = None
+        self.building = None
+
+def _state(app=None):
+    app = app or current_app
+    return app.extensions.setdefault('fuzzy_search', _State())
+
+def load_vocabulary():
+    """``{word: documents}`` for every word in an indexed title or author."""
+    with db.engine.connect() as connection:
+        connection.exec_driver_sql(_VOCABULARY_DDL)
+        return dict(connection.exec_driver_sql(_VOCABULARY_SQL).all())
+
+def _build(app, state, version):
+    try:
+        with app.app_context():
+            index = TrigramIndex(load_vocabulary())
+        with state.lock:
+            state.index, state.version = index, version
+    except Exception:
+        logger.exception("Fuzzy search index build failed")
+    finally:
+        with state.lock:
+            state.building = None
+
+def _word_index():
+    app = current_app._get_current_object()
+    state = _state(app)
+    version = get_catalog_version()
+    with state.lock:
+        if state.building is None and state.version != version:
+            state.building = threading.Thread(target=_build, args=(app, state, version), daemon=True,
+                                              name='fuzzy-search-build')
+            state.building.start()
+        thread = state.building if state.index is None else None
+    if thread is not None:
+        # Nothing to serve yet: wait for the first build
+        thread.join()
+    with state.lock:
+        if state.index is None:
+            raise RuntimeError("Fuzzy search index is not available")
+        return state.index
+
+def _correctable(word):
+    return len(word) >= FUZZY_MIN_WORD_LENGTH and not word.isdigit()
+
+def word_alternatives(query):
+    """``[(word, [(alternative, similarity), ...]), ...]`` for each word of ``query``.
+
+    Short words and numbers stand for themselves; a word with no similar
+    catalog word has no alternatives.
+    """
+    index = None
+    alternatives = []
+    for word in search_words(query):
+        if not _correctable(word):
+            alternatives.append((word, [(word, 1.0)]))
+            continue
+        if index is None:
+            index = _word_index()
+        alternatives.append((word, index.similar(word)))
+    return alternatives
+
+def fuzzy_search_books(query, *criteria, limit=FUZZY_LIMIT, **columns):
+    """Books matching ``query`` despite typos, as ``(books, corrections)``.
+
+    ``criteria`` are extra filters for the ``Book`` query and ``columns``
+    name indexed columns to match exactly, as in ``search_books_query``.
+    ``corrections`` maps each search word that was replaced to the catalog
+    word that matched best.
+    """
+    alternatives = word_alternatives(query)
+    if not alternatives or any(not options for _, options in alternatives):
+        return [], {}
+
+    expressions = []
+    for word, options in alternatives:
+        if not _correctable(word):
+            expressions.append(f'{{title author}} : "{word}"*')
+        else:
+            expressions.append('{title author} : (' + ' OR '.join(f'"{option}"' for option, _ in options) + ')')
+    for column, value in columns.items():
+        if value and value.strip():
+            expression = match_expression(value, column)
+            if expression is None:
+                return [], {}
+            expressions.append(expression)
+
+    books = books_matching(' AND '.join(f'({expression})' for expression in expressions), FUZZY_CANDIDATES)
+    books = books.filter(*criteria).all()
+    if not books:
+        return [], {}
+
+    def score(book):
+        words = search_words(f'{book.title} {book.author}')
+        return sum(max((similarity for option, similarity in options
+                        if any(found.startswith(option) for found in words)), default=0.0)
+                   for _, options in alternatives)
+    # sorted() is stable, so equal scores keep the BM25 order
+    books = sorted(books, key=score, reverse=True)[:limit]
+    corrections = {word: options[0][0] for word, options in alternatives if options[0][0] != word}
+    return books, corrections
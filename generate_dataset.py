@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""Deterministic synthetic dataset generator for the library database.
+
+Replaces the old insert_test_data*.py scripts. Rows are generated from a
+seeded RNG and bulk-loaded with chunked ``executemany`` calls, so production
+sized datasets (100k books, 50k users, 10M loans) load in minutes:
+
+    python generate_dataset.py --books 100000 --users 50000 --loans 10000000 --seed 42
+
+Book popularity follows a Zipf (power-law) distribution, open loans never
+exceed a book's copies, late returns produce fees and recent open loans
+past their due date are overdue. The demo accounts from the README
+(admin/admin123, student1 and student2/student123) are always created.
+Existing rows are deleted first.
+"""
+import argparse
+import bisect
+import hashlib
+import itertools
+import random
+import time
+from datetime import datetime, timedelta
+
+CHUNK_SIZE = 20000
+LOAN_DAYS = 14
+FINE_PER_DAY = 1.0
+LATE_RETURN_RATE = 0.12
+
+CATEGORIES = [
+    'Computer Science', 'Mathematics', 'Physics', 'Chemistry', 'Biology', 'History',
+    'Literature', 'Philosophy', 'Economics', 'Engineering', 'Psychology', 'Art',
+    'Fantasy', 'Science Fiction', 'Mystery', 'Biography',
+]
+TITLE_ADJECTIVES = [
+    'Advanced', 'Practical', 'Modern', 'Introductory', 'Applied', 'Complete', 'Essential',
+    'Hidden', 'Silent', 'Lost', 'Quantum', 'Digital', 'Ancient', 'Elementary', 'Concise',
+]
+TITLE_NOUNS = [
+    'Python Programming', 'Data Structures', 'Machine Learning', 'Algorithms', 'Calculus',
+    'Linear Algebra', 'Thermodynamics', 'Organic Chemistry', 'Genetics', 'World History',
+    'Poetry', 'Ethics', 'Microeconomics', 'Circuits', 'Cognition', 'Painting', 'Kingdoms',
+    'Starships', 'Detectives', 'Lives', 'Databases', 'Networks', 'Statistics', 'Rings',
+]
+FIRST_NAMES = [
+    'James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'David',
+    'Elizabeth', 'Wei', 'Priya', 'Carlos', 'Aisha', 'Kenji', 'Fatima', 'Olga', 'Liam', 'Noah',
+    'Emma', 'Arjun', 'Sofia', 'Mateo', 'Yuki', 'Amara', 'Ravi', 'Chen', 'Ivan', 'Zara', 'Omar',
+]
+LAST_NAMES = [
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Martinez',
+    'Tolkien', 'Knuth', 'Kumar', 'Chen', 'Nguyen', 'Okafor', 'Ivanova', 'Sato', 'Rossi',
+    'Muller', 'Silva', 'Haddad', 'Kowalski', 'Andersson', 'Patel', 'Kim', 'Lee', 'Singh',
+]
+
+def hash_password(password):
+    """Password hash used by the seed accounts (matches the old test data scripts)."""
+    return hashlib.sha256(password.encode()).hexdigest()
+
+def isbn13(number):
+    """Deterministic, checksum-valid ISBN-13 for ``number``."""
+    digits = f'978{number % 10 ** 9:09d}'
+    total = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(digits))
+    return digits + str((10 - total % 10) % 10)
+
+def zipf_cumulative_weights(n, exponent):
+    """Cumulative Zipf weights for ranks 1..n (rank 1 is the most popular)."""
+    return list(itertools.accumulate(1.0 / rank ** exponent for rank in range(1, n + 1)))
+
+class _BulkWriter:
+    """Chunked ``executemany`` into one table on a single connection."""
+
+    def __init__(self, connection, table, columns, chunk_size=CHUNK_SIZE):
+        dialect = connection.dialect
+        quote = dialect.identifier_preparer.quote
+        placeholder = '?' if dialect.paramstyle == 'qmark' else '%s'
+        self.sql = (
+            f"INSERT INTO {quote(table)} ({', '.join(quote(c) for c in columns)}) "
+            f"VALUES ({', '.join([placeholder] * len(columns))})"
+        )
+        self.connection = connection
+        self.chunk_size = chunk_size
+        self.rows = []
+        self.count = 0
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.connection.exec_driver_sql(self.sql, self.rows)
+            self.count += len(self.rows)
+            self.rows = []
+
+def clear_tables(connection):
+    quote = connection.dialect.identifier_preparer.quote
+    for table in ('fees', 'borrow_record', 'book', 'user',
+                  'circulation_daily', 'circulation_daily_book', 'circulation_daily_category',
+                  'circulation_daily_user', 'circulation_monthly', 'circulation_monthly_book',
+                  'circulation_monthly_user'):
+        connection.exec_driver_sql(f"DELETE FROM {quote(table)}")
+    # Keep the catalog version moving forward so ETags issued for the old rows stay invalid
+    connection.exec_driver_sql("DELETE FROM library_counters WHERE name <> 'catalog_version'")
+    connection.exec_driver_sql("UPDATE library_counters SET value = value + 1 WHERE name = 'catalog_version'")
+
+def generate(engine, books=1000, users=500, loans=20000, seed=42, now=None,
+             history_days=3 * 365, popularity_exponent=1.1, chunk_size=CHUNK_SIZE, log=print):
+    """Populate ``engine`` with a synthetic dataset and return row counts.
+
+    ``now`` defaults to today's midnight (UTC), so a given seed produces the
+    same rows all day while overdue loans stay relative to the real clock.
+    """
+    rng = random.Random(seed)
+    now = now or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    if engine.dialect.name == 'sqlite':
+        # Same text format SQLAlchemy's SQLite DateTime type writes and parses
+        dt = lambda value: value.strftime('%Y-%m-%d %H:%M:%S.%f')
+    else:
+        dt = lambda value: value
+    started = time.perf_counter()
+    users = max(users, 3)
+
+    with engine.begin() as connection:
+        clear_tables(connection)
+
+        # Users: demo accounts first, then generated students with a few admins.
+        user_writer = _BulkWriter(connection, 'user',
+                                  ('id', 'fullname', 'email', 'username', 'password', 'role'), chunk_size)
+        student_password = hash_password('student123')
+        user_writer.add((1, 'Admin User', 'admin@lms.com', 'admin', hash_password('admin123'), 'admin'))
+        user_writer.add((2, 'John Student', 'student1@lms.com', 'student1', student_password, 'student'))
+        user_writer.add((3, 'Jane Student', 'student2@lms.com', 'student2', student_password, 'student'))
+        for user_id in range(4, users + 1):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            role = 'admin' if user_id % 500 == 0 else 'student'
+            user_writer.add((user_id, f'{first} {last}', f'user{user_id}@lms.test', f'user{user_id}',
+                             student_password, role))
+        user_writer.flush()
+        log(f"  users: {user_writer.count}")
+
+        # Books: available_quantity is corrected after loans are generated.
+        book_writer = _BulkWriter(connection, 'book', (
+            'id', 'title', 'author', 'isbn', 'copies', 'category',
+            'total_quantity', 'available_quantity', 'description'), chunk_size)
+        titles = {}
+        copies = [0] * (books + 1)
+        for book_id in range(1, books + 1):
+            title = f'{rng.choice(TITLE_ADJECTIVES)} {rng.choice(TITLE_NOUNS)}'
+            if rng.random() < 0.6:
+                title += f' Vol. {rng.randint(1, 12)}'
+            author = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+            category = rng.choice(CATEGORIES)
+            quantity = rng.choices((1, 2, 3, 5, 8), weights=(30, 30, 20, 15, 5))[0]
+            titles[book_id] = title
+            copies[book_id] = quantity
+            book_writer.add((book_id, title, author, isbn13(book_id), quantity, category, quantity, quantity,
+                             f'A {category.lower()} title by {author}.'))
+        book_writer.flush()
+        log(f"  books: {book_writer.count}")
+
+        # Loans: Zipf-popular books over a shuffled rank order, mildly skewed users.
+        ranked_books = list(range(1, books + 1))
+        rng.shuffle(ranked_books)
+        book_weights = zipf_cumulative_weights(books, popularity_exponent)
+        user_weights = zipf_cumulative_weights(users, 0.5)
+        book_total, user_total = book_weights[-1], user_weights[-1]
+
+        open_loans = [0] * (books + 1)
+        loan_writer = _BulkWriter(connection, 'borrow_record', (
+            'id', 'user_id', 'book_id', 'borrow_date', 'due_date', 'return_date', 'fine'), chunk_size)
+        fee_writer = _BulkWriter(connection, 'fees', ('id', 'user_id', 'date', 'amount', 'reason'), chunk_size)
+        history_seconds = history_days * 86400
+        overdue = 0
+
+        for loan_id in range(1, loans + 1):
+            # Stratified offsets: oldest loans first, so ids follow borrow_date like a real table
+            offset = (loans - loan_id + rng.random()) / loans
+            book_id = ranked_books[bisect.bisect(book_weights, rng.random() * book_total)]
+            user_id = bisect.bisect(user_weights, rng.random() * user_total) + 1
+            borrowed = now - timedelta(seconds=offset * history_seconds)
+            due = borrowed + timedelta(days=LOAN_DAYS)
+            if rng.random() < LATE_RETURN_RATE:
+                returned = due + timedelta(days=rng.uniform(1, 30))
+            else:
+                returned = borrowed + timedelta(days=rng.uniform(1, LOAN_DAYS))
+
+            if returned > now:
+                # Not back yet: keep it open (overdue once past due) if a copy is free
+                if open_loans[book_id] < copies[book_id]:
+                    open_loans[book_id] += 1
+                    overdue += due < now
+                    loan_writer.add((loan_id, user_id, book_id, dt(borrowed), dt(due), None, 0.0))
+                    continue
+                returned = borrowed + (now - borrowed) * rng.random()
+
+            fine = 0.0
+            days_late = (returned - due).days
+            if days_late > 0:
+                fine = days_late * FINE_PER_DAY
+                fee_writer.add((fee_writer.count + len(fee_writer.rows) + 1, user_id, dt(returned), fine,
+                                f'Late return for book: {titles[book_id]}'))
+            loan_writer.add((loan_id, user_id, book_id, dt(borrowed), dt(due), dt(returned), fine))
+        loan_writer.flush()
+        fee_writer.flush()
+        log(f"  loans: {loan_writer.count} ({sum(open_loans)} open, {overdue} overdue), fees: {fee_writer.count}")
+
+        placeholder = '?' if connection.dialect.paramstyle == 'qmark' else '%s'
+        connection.exec_driver_sql(
+            f"UPDATE book SET available_quantity = total_quantity - {placeholder} WHERE id = {placeholder}",
+            [(count, book_id) for book_id, count in enumerate(open_loans) if count],
+        )
+
+    return {
+        'users': users,
+        'books': books,
+        'loans': loans,
+        'open_loans': sum(open_loans),
+        'overdue_loans': overdue,
+        'fees': fee_writer.count,
+        'seconds': round(time.perf_counter() - started, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--books', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--loans', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--history-days', type=int, default=3 * 365)
+    parser.add_argument('--popularity-exponent', type=float, default=1.1)
+    args = parser.parse_args()
+
+    from app import app
+    from src.app_factory_minimal import db
+    from src.apply_migration import apply_migrations
+    from src.library_counters import reconcile_counters
+    from src.circulation_rollup import rebuild_circulation_rollup
+
+    with app.app_context():
+        db.create_all()
+        apply_migrations(db.engine)
+        print(f"Generating dataset (seed {args.seed})...")
+        summary = generate(db.engine, books=args.books, users=args.users, loans=args.loans, seed=args.seed,
+                           history_days=args.history_days, popularity_exponent=args.popularity_exponent)
+        reconcile_counters(fix=True)
+        rebuild_circulation_rollup()
+    print(f"Done in {summary['seconds']}s: {summary}")
+
+if __name__ == '__main__':
+    main()
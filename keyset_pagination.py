@@ -0,0 +1,55 @@
+"""Keyset (cursor) pagination helpers for list endpoints.
+
+Instead of ``OFFSET`` + ``COUNT(*)`` a page is fetched with
+``WHERE key > :last_key ORDER BY key LIMIT n + 1`` on an indexed, unique key,
+so every page costs one index seek no matter how deep the client goes.
+The last key is handed back as an opaque continuation token.
+"""
+import base64
+import binascii
+import json
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+class InvalidCursor(ValueError):
+    """Raised when a continuation token cannot be decoded."""
+
+def encode_cursor(key):
+    """Encode a key value as an opaque, URL-safe continuation token."""
+    payload = json.dumps({'k': key}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+def decode_cursor(token):
+    """Decode a token produced by ``encode_cursor``."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))['k']
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise InvalidCursor(f"Invalid cursor: {token!r}")
+
+def clamp_page_size(requested, default=DEFAULT_PAGE_SIZE):
+    """Clamp a client-supplied page size to ``1..MAX_PAGE_SIZE``."""
+    if requested is None:
+        return default
+    return max(1, min(requested, MAX_PAGE_SIZE))
+
+def keyset_page(query, key_column, cursor=None, limit=DEFAULT_PAGE_SIZE, descending=False, key=None):
+    """Fetch one page of ``query`` ordered by the unique ``key_column``.
+
+    Returns ``(rows, next_cursor)``; ``next_cursor`` is ``None`` on the last
+    page. ``key`` extracts the key value from a result row and defaults to
+    the attribute named after ``key_column`` (pass one for tuple rows).
+    """
+    if cursor:
+        last_key = decode_cursor(cursor)
+        query = query.filter(key_column < last_key if descending else key_column > last_key)
+    query = query.order_by(key_column.desc() if descending else key_column.asc())
+
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        key = key or (lambda row: getattr(row, key_column.key))
+        next_cursor = encode_cursor(key(rows[-1]))
+    return rows, next_cursor
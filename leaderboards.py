@@ -0,0 +1,265 @@
+"""In-process top-K leaderboards of most borrowed books and most active users.
+
+Each process keeps, per app, the loan count of every book and user over all
+time and over the last ``LEADERBOARD_WINDOWS`` UTC calendar days (today
+included), plus the top ``LEADERBOARD_SIZE`` of each. A committed loan
+(``book_borrowed`` signal) bumps the counts and, since counts only grow
+between day boundaries, can only move that one id up its top-K list: an
+insertion into a short sorted list. Windowed lists are recomputed once when
+the day rolls over. Reading a leaderboard is a slice of the list plus names
+from a small cache, so it issues no SQL once warm.
+
+The boards are built from the database on first use in each process and
+rebuilt every ``LEADERBOARD_RESYNC_SECONDS`` in the background, which picks
+up loans handled by other worker processes. Builds run on their own thread
+and app context, so they never count against a request's query budget.
+Loans of deleted books or users are not ranked.
+"""
+import bisect
+import heapq
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, select
+from src.models import db, Book, BorrowRecord, User
+from src.signals import book_borrowed, book_changed, user_changed
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_SIZE = 50
+LEADERBOARD_WINDOWS = (7, 30)
+LEADERBOARD_RESYNC_SECONDS = 300.0
+
+class TopK:
+    """Highest-counted ids, kept sorted by ``(-count, id)``.
+
+    ``offer`` is exact as long as counts only increase; after any decrease
+    call ``rebuild`` with the full counts.
+    """
+
+    def __init__(self, size=LEADERBOARD_SIZE):
+        self.size = size
+        self.entries = []
+
+    def offer(self, key, count):
+        for index, (_, entry_key) in enumerate(self.entries):
+            if entry_key == key:
+                del self.entries[index]
+                break
+        entry = (-count, key)
+        if len(self.entries) < self.size or entry < self.entries[-1]:
+            bisect.insort(self.entries, entry)
+            del self.entries[self.size:]
+
+    def rebuild(self, counts):
+        self.entries = heapq.nsmallest(self.size, ((-count, key) for key, count in counts.items() if count > 0))
+
+    def top(self, limit):
+        return [(key, -count) for count, key in self.entries[:limit]]
+
+class Leaderboard:
+    """All-time and rolling-window loan counts per id, with their top-K."""
+
+    def __init__(self, today, windows=LEADERBOARD_WINDOWS, size=LEADERBOARD_SIZE):
+        self.windows = windows
+        self.today = today
+        self.counts = {None: {}, **{days: {} for days in windows}}
+        self.tops = {window: TopK(size) for window in self.counts}
+        self.days = {}  # day -> {id: loans} for the longest window
+
+    def add(self, key, day, loans=1):
+        """Count ``loans`` for ``key`` on ``day``."""
+        if day > self.today:
+            self.roll(day)
+        if day > self.today - timedelta(days=max(self.windows)):
+            bucket = self.days.setdefault(day, {})
+            bucket[key] = bucket.get(key, 0) + loans
+        for window, counts in self.counts.items():
+            if window is None or day > self.today - timedelta(days=window):
+                counts[key] = counts.get(key, 0) + loans
+                self.tops[window].offer(key, counts[key])
+
+    def roll(self, today):
+        """Move the windows forward to ``today``, dropping expired days."""
+        if today <= self.today:
+            return
+        self.today = today
+        self.days = {day: bucket for day, bucket in self.days.items()
+                     if day > today - timedelta(days=max(self.windows))}
+        for window in self.windows:
+            counts = {}
+            for day, bucket in self.days.items():
+                if day > today - timedelta(days=window):
+                    for key, loans in bucket.items():
+                        counts[key] = counts.get(key, 0) + loans
+            self.counts[window] = counts
+            self.tops[window].rebuild(counts)
+
+    def remove(self, key):
+        """Forget ``key`` (a deleted book or user)."""
+        for bucket in self.days.values():
+            bucket.pop(key, None)
+        for window, counts in self.counts.items():
+            if counts.pop(key, None) is not None:
+                self.tops[window].rebuild(counts)
+
+    def top(self, window, limit):
+        return self.tops[window].top(limit)
+
+class Leaderboards:
+    """The app's book and user leaderboards, guarded by one lock."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.boards = None
+        self.last_record_id = 0
+        self.built_at = 0.0
+        self.building = None
+        self.replay = []
+        self.names = {'books': {}, 'users': {}}
+
+def _state(app=None):
+    app = app or current_app
+    return app.extensions.setdefault('leaderboards', Leaderboards())
+
+def _utc_today():
+    return datetime.utcnow().date()
+
+def _load_boards():
+    """Build fresh boards from the database; returns ``(boards, last_record_id)``."""
+    today = _utc_today()
+    start = today - timedelta(days=max(LEADERBOARD_WINDOWS) - 1)
+    boards = {'books': Leaderboard(today), 'users': Leaderboard(today)}
+
+    # Pin every count to the same set of loans, however the reads interleave with writes
+    last_id = db.session.execute(select(func.max(BorrowRecord.id))).scalar() or 0
+    counted = BorrowRecord.id <= last_id
+    for kind, column, model in (('books', BorrowRecord.book_id, Book), ('users', BorrowRecord.user_id, User)):
+        rows = db.session.execute(
+            select(column, func.count(BorrowRecord.id)).join(model, model.id == column)
+            .where(counted).group_by(column)
+        ).all()
+        board = boards[kind]
+        board.counts[None] = dict(rows)
+        board.tops[None].rebuild(board.counts[None])
+
+    recent = db.session.execute(
+        select(func.date(BorrowRecord.borrow_date), BorrowRecord.book_id, BorrowRecord.user_id, func.count())
+        .join(Book, Book.id == BorrowRecord.book_id).join(User, User.id == BorrowRecord.user_id)
+        .where(counted, BorrowRecord.borrow_date >= datetime.combine(start, datetime.min.time()))
+        .group_by(func.date(BorrowRecord.borrow_date), BorrowRecord.book_id, BorrowRecord.user_id)
+    ).all()
+    for kind in boards:
+        boards[kind].today = start - timedelta(days=1)
+    for day, book_id, user_id, loans in recent:
+        day = date.fromisoformat(str(day))
+        for kind, key in (('books', book_id), ('users', user_id)):
+            bucket = boards[kind].days.setdefault(day, {})
+            bucket[key] = bucket.get(key, 0) + loans
+    for board in boards.values():
+        board.roll(today)
+    return boards, last_id
+
+def _build(app, state):
+    try:
+        with app.app_context():
+            boards, last_id = _load_boards()
+        with state.lock:
+            # Loans committed while we read are in state.replay; apply the ones we missed
+            for record_id, book_id, user_id, day in state.replay:
+                if record_id > last_id:
+                    boards['books'].add(book_id, day)
+                    boards['users'].add(user_id, day)
+            state.boards, state.last_record_id, state.built_at = boards, last_id, time.monotonic()
+    except Exception:
+        logger.exception("Leaderboard build failed")
+    finally:
+        with state.lock:
+            state.building, state.replay = None, []
+
+def _ensure_built(state):
+    app = current_app._get_current_object()
+    resync = app.config.get('LEADERBOARD_RESYNC_SECONDS', LEADERBOARD_RESYNC_SECONDS)
+    with state.lock:
+        stale = state.boards is None or time.monotonic() - state.built_at >= resync
+        if stale and state.building is None:
+            state.building = threading.Thread(target=_build, args=(app, state), daemon=True,
+                                              name='leaderboard-build')
+            state.building.start()
+        thread = state.building if state.boards is None else None
+    if thread is not None:
+        # Nothing to serve yet: wait for the first build
+        thread.join()
+
+def _resolve_names(state, kind, ids):
+    names = state.names[kind]
+    missing = [key for key in ids if key not in names]
+    if missing:
+        if kind == 'books':
+            rows = db.session.execute(select(Book.id, Book.title, Book.author).where(Book.id.in_(missing)))
+            found = {book_id: {'title': title, 'author': author} for book_id, title, author in rows}
+        else:
+            rows = db.session.execute(select(User.id, User.fullname, User.username).where(User.id.in_(missing)))
+            found = {user_id: {'fullname': fullname, 'username': username} for user_id, fullname, username in rows}
+        with state.lock:
+            names.update(found)
+            for key in missing:
+                if key not in found and state.boards:
+                    # Deleted while this process wasn't looking
+                    state.boards[kind].remove(key)
+    return names
+
+def _top(kind, limit, days):
+    if days is not None and days not in LEADERBOARD_WINDOWS:
+        raise ValueError(f"days must be one of {', '.join(str(window) for window in LEADERBOARD_WINDOWS)}")
+    state = _state()
+    _ensure_built(state)
+    with state.lock:
+        if state.boards is None:
+            return []
+        board = state.boards[kind]
+        board.roll(_utc_today())
+        candidates = board.top(days, LEADERBOARD_SIZE)
+    names = _resolve_names(state, kind, [key for key, _ in candidates[:limit]])
+    entries = [(key, count) for key, count in candidates if key in names]
+    if len(entries) < limit:
+        names = _resolve_names(state, kind, [key for key, _ in candidates])
+        entries = [(key, count) for key, count in candidates if key in names]
+    return [{'id': key, **names[key], 'borrow_count': count} for key, count in entries[:limit]]
+
+def top_books(limit=10, days=None):
+    """Most borrowed books as ``{'id', 'title', 'author', 'borrow_count'}`` dicts.
+
+    ``days`` (one of ``LEADERBOARD_WINDOWS``) limits the count to loans of
+    the last that many days; ``None`` counts all loans.
+    """
+    return _top('books', limit, days)
+
+def top_users(limit=10, days=None):
+    """Most active borrowers as ``{'id', 'fullname', 'username', 'borrow_count'}`` dicts."""
+    return _top('users', limit, days)
+
+def _on_book_borrowed(sender, record_id, user_id, book_id, **data):
+    state = _state(sender)
+    day = _utc_today()
+    with state.lock:
+        if state.building is not None:
+            state.replay.append((record_id, book_id, user_id, day))
+        if state.boards is not None and record_id > state.last_record_id:
+            state.boards['books'].add(book_id, day)
+            state.boards['users'].add(user_id, day)
+
+def _on_changed(kind, sender, key, action):
+    state = _state(sender)
+    with state.lock:
+        state.names[kind].pop(key, None)
+        if action == 'deleted' and state.boards is not None:
+            state.boards[kind].remove(key)
+
+book_borrowed.connect(_on_book_borrowed, weak=False)
+book_changed.connect(lambda sender, book_id, action, **data: _on_changed('books', sender, book_id, action),
+                     weak=False)
+user_changed.connect(lambda sender, user_id, action, **data: _on_changed('users', sender, user_id, action),
+                     weak=False)
@@ -0,0 +1,117 @@
+"""Denormalized live counters for headline library statistics.
+
+Circulation and catalog writes call ``increment_counters`` inside their own
+transaction, so the ``library_counters`` rows commit (or roll back) together
+with the change they describe. Dashboards read them with ``read_counters``,
+a single primary-key scan of a handful of rows.
+
+Run ``python library_counters.py`` to report drift against the source tables,
+or ``python library_counters.py --fix`` to rewrite the counters.
+"""
+import sys
+from sqlalchemy import func, select, text
+from src.models import db, User, Book, BorrowRecord, Fees, LibraryCounter
+
+# Integer-valued counters; everything else (fine totals) is returned as float.
+COUNT_COUNTERS = (
+    'total_books',
+    'available_titles',
+    'total_copies',
+    'available_copies',
+    'total_users',
+    'total_students',
+    'open_loans',
+    'total_loans',
+    'total_fine_count',
+)
+AMOUNT_COUNTERS = ('total_fines',)
+COUNTER_NAMES = COUNT_COUNTERS + AMOUNT_COUNTERS
+
+_INCREMENT_SQL = text(
+    "INSERT INTO library_counters (name, value) VALUES (:name, :delta) "
+    "ON CONFLICT (name) DO UPDATE SET value = library_counters.value + excluded.value"
+)
+
+def _source_expressions():
+    """Set-based definition of every counter over the source tables."""
+    return {
+        'total_books': select(func.count(Book.id)),
+        'available_titles': select(func.count(Book.id)).where(Book.available_quantity > 0),
+        'total_copies': select(func.coalesce(func.sum(Book.total_quantity), 0)),
+        'available_copies': select(func.coalesce(func.sum(Book.available_quantity), 0)),
+        'total_users': select(func.count(User.id)),
+        'total_students': select(func.count(User.id)).where(User.role == 'student'),
+        'open_loans': select(func.count(BorrowRecord.id)).where(BorrowRecord.return_date.is_(None)),
+        'total_loans': select(func.count(BorrowRecord.id)),
+        'total_fine_count': select(func.count(Fees.id)),
+        'total_fines': select(func.coalesce(func.sum(Fees.amount), 0)),
+    }
+
+def _coerce(name, value):
+    value = value or 0
+    return int(value) if name in COUNT_COUNTERS else float(value)
+
+def increment_counters(**deltas):
+    """Add ``deltas`` to the named counters in the current session's transaction."""
+    for name, delta in deltas.items():
+        if name not in COUNTER_NAMES:
+            raise KeyError(f"Unknown library counter '{name}'")
+        if delta:
+            db.session.execute(_INCREMENT_SQL, {'name': name, 'delta': delta})
+
+def compute_counters():
+    """Recompute every counter from the source tables in one round trip."""
+    expressions = _source_expressions()
+    row = db.session.execute(
+        select(*[expr.scalar_subquery().label(name) for name, expr in expressions.items()])
+    ).one()
+    return {name: _coerce(name, row._mapping[name]) for name in expressions}
+
+def read_counters():
+    """Return all counters as a dict, seeding the table on first use."""
+    stored = dict(db.session.query(LibraryCounter.name, LibraryCounter.value).all())
+    if not set(COUNTER_NAMES) <= set(stored):
+        # Use the recount directly: a reporting snapshot won't see the seeded rows yet
+        stored.update({name: report['actual'] for name, report in reconcile_counters(fix=True).items()})
+    return {name: _coerce(name, stored[name]) for name in COUNTER_NAMES}
+
+def reconcile_counters(fix=False):
+    """Compare stored counters with a set-based recount and return the drift.
+
+    Returns ``{name: {'stored', 'actual', 'drift'}}`` for every counter that
+    disagrees (missing rows count as drift). With ``fix=True`` the stored
+    values are overwritten with the recount and committed.
+    """
+    actual = compute_counters()
+    stored = dict(db.session.query(LibraryCounter.name, LibraryCounter.value).all())
+
+    drift = {}
+    for name, value in actual.items():
+        current = stored.get(name)
+        if current is None or abs(current - value) > 1e-9:
+            drift[name] = {
+                'stored': None if current is None else _coerce(name, current),
+                'actual': value,
+                'drift': None if current is None else _coerce(name, current) - value,
+            }
+
+    if fix and drift:
+        for name in drift:
+            db.session.merge(LibraryCounter(name=name, value=actual[name]))
+        db.session.commit()
+    return drift
+
+if __name__ == '__main__':
+    from app import app
+
+    fix = '--fix' in sys.argv[1:]
+    with app.app_context():
+        drift = reconcile_counters(fix=fix)
+    if not drift:
+        print("Library counters are consistent.")
+    for name, report in sorted(drift.items()):
+        print(f"{name}: stored={report['stored']} actual={report['actual']} drift={report['drift']}")
+    if drift and fix:
+        print(f"Fixed {len(drift)} counter(s).")
+    elif drift:
+        sys.exit(1)
@@ -0,0 +1,228 @@
+"""Server-sent events for the live admin dashboards.
+
+Each library signal is turned into events once, in the request that
+committed the write, and fanned out through the app's in-process
+``EventBroker`` to every open ``/api/admin/events`` stream:
+
+* ``delta``: counter changes (same keys as ``stats_service.get_stats()``)
+  for the client to add to the stats it holds;
+* ``activity``: an item for the recent activity list, shaped like the
+  entries of ``/api/admin/activity``;
+* ``stats``: a full snapshot from the shared stats cache, sent when a
+  stream opens, after writes that carry no delta (catalog and user
+  changes) and every ``SNAPSHOT_SECONDS``, which also corrects values
+  that change with time alone, such as overdue loans.
+
+Brokers are per process: with several worker processes a stream only
+sees deltas for writes its own worker handled until the next snapshot.
+"""
+import itertools
+import json
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from flask import Blueprint, Response, current_app, jsonify, request, session, stream_with_context
+from src.app_factory_minimal import db
+from src.signals import book_borrowed, book_changed, book_returned, fines_assessed, user_changed
+from src.stats_service import get_stats, invalidate_stats
+
+KEEPALIVE_SECONDS = 15
+SNAPSHOT_SECONDS = 60
+HISTORY_SIZE = 200
+SUBSCRIBER_QUEUE_SIZE = 256
+RETRY_MS = 5000
+
+# Broker-internal event telling streams to send a fresh stats snapshot.
+_REFRESH = 'refresh'
+
+def format_event(event, data, event_id=None):
+    """Serialize one server-sent event."""
+    lines = [] if event_id is None else [f'id: {event_id}']
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
+
+class Subscription:
+    """One stream's bounded queue of ``(event_id, event, payload)`` messages."""
+
+    def __init__(self, size=SUBSCRIBER_QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize=size)
+        self.dropped = False
+
+class EventBroker:
+    """Thread-safe in-process pub/sub with a short replay history."""
+
+    def __init__(self, history=HISTORY_SIZE):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._history = deque(maxlen=history)
+        self._ids = itertools.count(1)
+
+    def publish(self, event, data=None):
+        """Serialize the event once and queue it for every subscriber."""
+        with self._lock:
+            event_id = next(self._ids)
+            payload = None if event == _REFRESH else format_event(event, data, event_id)
+            message = (event_id, event, payload)
+            self._history.append(message)
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(message)
+            except queue.Full:
+                # Too slow to keep up: end its stream, the browser reconnects with Last-Event-ID
+                subscription.dropped = True
+                self.unsubscribe(subscription)
+        return event_id
+
+    def subscribe(self, last_event_id=None, replay=()):
+        """Register a subscriber, replaying ``replay`` events after ``last_event_id`` still in history."""
+        subscription = Subscription()
+        with self._lock:
+            if last_event_id is not None:
+                for message in self._history:
+                    if message[0] > last_event_id and message[1] in replay:
+                        subscription.queue.put_nowait(message)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+def get_broker(app=None):
+    """The app's event broker."""
+    app = app or current_app
+    return app.extensions.setdefault('live_events', EventBroker())
+
+def _activity(activity_type, title, description, **data):
+    return {'type': activity_type, 'title': title, 'description': description,
+            'date': datetime.utcnow().isoformat(), **data}
+
+def _delta(**changes):
+    return {name: change for name, change in changes.items() if change}
+
+def _on_book_borrowed(sender, title, available_quantity, record_id, user_id, book_id, **data):
+    broker = get_broker(sender)
+    broker.publish('delta', _delta(
+        open_loans=1, total_loans=1, available_copies=-1,
+        available_titles=-1 if available_quantity == 0 else 0,
+        issued_today=1, issued_recently=1,
+    ))
+    broker.publish('activity', _activity(
+        'book_borrowed', 'Book Borrowed', f"'{title}' borrowed by user #{user_id}",
+        record_id=record_id, user_id=user_id, book_id=book_id,
+    ))
+
+def _on_book_returned(sender, title, available_quantity, overdue, fine, record_id, user_id, book_id, **data):
+    broker = get_broker(sender)
+    broker.publish('delta', _delta(
+        open_loans=-1, available_copies=1,
+        available_titles=1 if available_quantity == 1 else 0,
+        overdue_loans=-1 if overdue else 0, returned_today=1,
+        total_fine_count=1 if fine else 0, total_fines=fine,
+    ))
+    broker.publish('activity', _activity(
+        'book_returned', 'Book Returned', f"'{title}' returned by user #{user_id}",
+        record_id=record_id, user_id=user_id, book_id=book_id,
+    ))
+    if fine:
+        broker.publish('activity', _activity(
+            'fine_applied', 'Fine Applied', f"${fine:.2f} late fee for '{title}' (user #{user_id})",
+            user_id=user_id, amount=fine,
+        ))
+
+def _on_book_changed(sender, book_id, action, title, **data):
+    broker = get_broker(sender)
+    broker.publish('activity', _activity(
+        f'book_{action}', f'Book {action.capitalize()}', f"'{title}' {action}", book_id=book_id,
+    ))
+    _request_snapshot(sender)
+
+def _on_user_changed(sender, user_id, action, **data):
+    broker = get_broker(sender)
+    broker.publish('activity', _activity(
+        f'user_{action}', f'User {action.capitalize()}', f"User #{user_id} {action}", user_id=user_id,
+    ))
+    _request_snapshot(sender)
+
+def _on_fines_assessed(sender, loans, total, **data):
+    get_broker(sender).publish('activity', _activity(
+        'fine_applied', 'Fines Calculated', f"Fines recalculated for {loans} overdue loans (${total:.2f})",
+    ))
+
+def _request_snapshot(app):
+    # Make sure no stream can pick up the pre-write stats from the cache
+    invalidate_stats(app)
+    get_broker(app).publish(_REFRESH)
+
+for _signal, _receiver in (
+    (book_borrowed, _on_book_borrowed),
+    (book_returned, _on_book_returned),
+    (book_changed, _on_book_changed),
+    (user_changed, _on_user_changed),
+    (fines_assessed, _on_fines_assessed),
+):
+    _signal.connect(_receiver, weak=False)
+
+live_events_bp = Blueprint('live_events', __name__)
+
+def _is_admin():
+    from src.models import User
+
+    if 'user_id' not in session:
+        return False
+    user = User.query.get(session['user_id'])
+    return bool(user and user.role == 'admin')
+
+def _stats_event():
+    event = format_event('stats', get_stats())
+    # Don't hold a pooled connection for the lifetime of the stream
+    db.session.close()
+    return event
+
+@live_events_bp.route('/admin/events', methods=['GET'])
+def admin_event_stream():
+    """Live dashboard updates as server-sent events"""
+    if not _is_admin():
+        return jsonify({'error': 'Access denied'}), 403
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID', ''))
+    except ValueError:
+        last_event_id = None
+    broker = get_broker()
+    # Deltas are not replayed: the stats snapshot a reconnected stream starts with includes them
+    subscription = broker.subscribe(last_event_id, replay=('activity',))
+
+    def stream():
+        try:
+            yield f'retry: {RETRY_MS}\n\n'
+            yield _stats_event()
+            last_snapshot = time.monotonic()
+            while not subscription.dropped:
+                try:
+                    event_id, event, payload = subscription.queue.get(timeout=KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                else:
+                    if event != _REFRESH:
+                        yield payload
+                        continue
+                    last_snapshot = 0
+                if time.monotonic() - last_snapshot >= SNAPSHOT_SECONDS:
+                    yield _stats_event()
+                    last_snapshot = time.monotonic()
+        finally:
+            broker.unsubscribe(subscription)
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
@@ -0,0 +1,24 @@
+-- Indexes for the circulation hot paths (open loans, overdue loans,
+-- per-user/per-book loan lookups, per-user fines, available books).
+-- Keep in sync with __table_args__ in models.py.
+
+CREATE INDEX IF NOT EXISTS ix_borrow_record_user_return
+    ON borrow_record (user_id, return_date);
+
+CREATE INDEX IF NOT EXISTS ix_borrow_record_book_return
+    ON borrow_record (book_id, return_date);
+
+CREATE INDEX IF NOT EXISTS ix_borrow_record_borrow_date
+    ON borrow_record (borrow_date);
+
+-- Partial index: open loans only, so "return_date IS NULL" counts and
+-- "return_date IS NULL AND due_date < now" overdue scans stay small.
+CREATE INDEX IF NOT EXISTS ix_borrow_record_open_due
+    ON borrow_record (due_date)
+    WHERE return_date IS NULL;
+
+CREATE INDEX IF NOT EXISTS ix_fees_user_date
+    ON fees (user_id, date);
+
+CREATE INDEX IF NOT EXISTS ix_book_available_quantity
+    ON book (available_quantity);
@@ -0,0 +1,7 @@
+-- Denormalized headline counters (see library_counters.py).
+-- Rows are seeded lazily on first read or by `python library_counters.py --fix`.
+
+CREATE TABLE IF NOT EXISTS library_counters (
+    name VARCHAR(64) NOT NULL PRIMARY KEY,
+    value FLOAT NOT NULL DEFAULT 0
+);
@@ -0,0 +1,5 @@
+-- Returns per day ("returned today" on the dashboards) are a range scan on
+-- return_date. Keep in sync with __table_args__ in models.py.
+
+CREATE INDEX IF NOT EXISTS ix_borrow_record_return_date
+    ON borrow_record (return_date);
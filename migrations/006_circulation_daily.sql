@@ -0,0 +1,62 @@
+-- Daily circulation rollups (see circulation_rollup.py), keyed by UTC day,
+-- by (day, book) and by (day, category). Maintained incrementally by the
+-- borrow/return routes; rebuilt here from borrow_record and fees.
+-- Keep in sync with the Circulation* models in models.py.
+
+CREATE TABLE IF NOT EXISTS circulation_daily (
+    day DATE NOT NULL PRIMARY KEY,
+    issues INTEGER NOT NULL DEFAULT 0,
+    returns INTEGER NOT NULL DEFAULT 0,
+    fines INTEGER NOT NULL DEFAULT 0,
+    fine_amount FLOAT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS circulation_daily_book (
+    day DATE NOT NULL,
+    book_id INTEGER NOT NULL,
+    issues INTEGER NOT NULL DEFAULT 0,
+    returns INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, book_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_circulation_daily_book_book_day
+    ON circulation_daily_book (book_id, day);
+
+CREATE TABLE IF NOT EXISTS circulation_daily_category (
+    day DATE NOT NULL,
+    category VARCHAR(100) NOT NULL,
+    issues INTEGER NOT NULL DEFAULT 0,
+    returns INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, category)
+);
+
+-- Backfill. The tables may already exist (db.create_all) and hold rows
+-- written since, so rebuild rather than append.
+DELETE FROM circulation_daily;
+DELETE FROM circulation_daily_book;
+DELETE FROM circulation_daily_category;
+
+INSERT INTO circulation_daily (day, issues, returns, fines, fine_amount)
+SELECT day, SUM(issues), SUM(returns), SUM(fines), SUM(fine_amount) FROM (
+    SELECT date(borrow_date) AS day, 1 AS issues, 0 AS returns, 0 AS fines, 0 AS fine_amount FROM borrow_record
+    UNION ALL
+    SELECT date(return_date), 0, 1, 0, 0 FROM borrow_record WHERE return_date IS NOT NULL
+    UNION ALL
+    SELECT date(date), 0, 0, 1, amount FROM fees
+) events GROUP BY day;
+
+INSERT INTO circulation_daily_book (day, book_id, issues, returns)
+SELECT day, book_id, SUM(issues), SUM(returns) FROM (
+    SELECT date(borrow_date) AS day, book_id, 1 AS issues, 0 AS returns FROM borrow_record
+    UNION ALL
+    SELECT date(return_date), book_id, 0, 1 FROM borrow_record WHERE return_date IS NOT NULL
+) events GROUP BY day, book_id;
+
+INSERT INTO circulation_daily_category (day, category, issues, returns)
+SELECT day, category, SUM(issues), SUM(returns) FROM (
+    SELECT date(r.borrow_date) AS day, COALESCE(b.category, '') AS category, 1 AS issues, 0 AS returns
+    FROM borrow_record r JOIN book b ON b.id = r.book_id
+    UNION ALL
+    SELECT date(r.return_date), COALESCE(b.category, ''), 0, 1
+    FROM borrow_record r JOIN book b ON b.id = r.book_id WHERE r.return_date IS NOT NULL
+) events GROUP BY day, category;
@@ -0,0 +1,45 @@
+-- Per-borrower daily rollup and closed-month partials for date-range
+-- reports (see circulation_reports.py). circulation_daily_user is
+-- maintained with the other daily rollups and backfilled here; the monthly
+-- tables are filled lazily from the daily ones once a month has closed.
+-- Keep in sync with the Circulation* models in models.py.
+
+CREATE TABLE IF NOT EXISTS circulation_daily_user (
+    day DATE NOT NULL,
+    user_id INTEGER NOT NULL,
+    issues INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_circulation_daily_user_user_day
+    ON circulation_daily_user (user_id, day);
+
+CREATE TABLE IF NOT EXISTS circulation_monthly (
+    month DATE NOT NULL PRIMARY KEY,
+    issues INTEGER NOT NULL DEFAULT 0,
+    returns INTEGER NOT NULL DEFAULT 0,
+    fines INTEGER NOT NULL DEFAULT 0,
+    fine_amount FLOAT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS circulation_monthly_book (
+    month DATE NOT NULL,
+    book_id INTEGER NOT NULL,
+    issues INTEGER NOT NULL DEFAULT 0,
+    returns INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (month, book_id)
+);
+
+CREATE TABLE IF NOT EXISTS circulation_monthly_user (
+    month DATE NOT NULL,
+    user_id INTEGER NOT NULL,
+    issues INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (month, user_id)
+);
+
+-- Backfill (the table may already exist from db.create_all).
+DELETE FROM circulation_daily_user;
+
+INSERT INTO circulation_daily_user (day, user_id, issues)
+SELECT date(borrow_date), user_id, COUNT(*) FROM borrow_record
+GROUP BY date(borrow_date), user_id;
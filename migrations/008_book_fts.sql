@@ -0,0 +1,30 @@
+-- Full-text search over the catalog (see book_search.py): an FTS5 index on
+-- the book table, kept in sync by triggers, then built from the existing
+-- rows. Keep in sync with BOOK_FTS_DDL in models.py.
+
+CREATE VIRTUAL TABLE IF NOT EXISTS book_fts USING fts5(
+    title, author, category, description, isbn,
+    content='book', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS book_fts_insert AFTER INSERT ON book BEGIN
+    INSERT INTO book_fts (rowid, title, author, category, description, isbn)
+    VALUES (new.id, new.title, new.author, new.category, new.description, new.isbn);
+END;
+
+CREATE TRIGGER IF NOT EXISTS book_fts_delete AFTER DELETE ON book BEGIN
+    INSERT INTO book_fts (book_fts, rowid, title, author, category, description, isbn)
+    VALUES ('delete', old.id, old.title, old.author, old.category, old.description, old.isbn);
+END;
+
+-- Only edits to indexed columns touch the index (not loan counters)
+CREATE TRIGGER IF NOT EXISTS book_fts_update AFTER UPDATE OF title, author, category, description, isbn
+ON book BEGIN
+    INSERT INTO book_fts (book_fts, rowid, title, author, category, description, isbn)
+    VALUES ('delete', old.id, old.title, old.author, old.category, old.description, old.isbn);
+    INSERT INTO book_fts (rowid, title, author, category, description, isbn)
+    VALUES (new.id, new.title, new.author, new.category, new.description, new.isbn);
+END;
+
+INSERT INTO book_fts (book_fts) VALUES ('rebuild');
@@ -0,0 +1,41 @@
+-- Canonical ISBN-13 of every book for exact ISBN lookups (see
+-- book_search.isbn_books): a view deriving it from the stored ISBN, an
+-- indexed table kept in sync by triggers, then filled from the existing rows.
+-- Keep in sync with BOOK_ISBN13_DDL in models.py.
+
+-- Hyphens and spaces dropped; an ISBN-10 gets the 978 prefix and a new check
+-- digit; NULL for anything that is neither
+CREATE VIEW IF NOT EXISTS book_isbn13_source AS
+SELECT id AS book_id, CASE
+    WHEN length(c) = 13 AND c NOT GLOB '*[^0-9]*' THEN c
+    WHEN length(c) = 10 AND substr(c, 1, 9) NOT GLOB '*[^0-9]*' AND substr(c, 10) GLOB '[0-9X]'
+    THEN '978' || substr(c, 1, 9) || ((10 - (38 + 3 * substr(c, 1, 1) + substr(c, 2, 1) + 3 * substr(c, 3, 1)
+        + substr(c, 4, 1) + 3 * substr(c, 5, 1) + substr(c, 6, 1) + 3 * substr(c, 7, 1) + substr(c, 8, 1)
+        + 3 * substr(c, 9, 1)) % 10) % 10)
+    END AS isbn13
+FROM (SELECT id, replace(replace(upper(isbn), '-', ''), ' ', '') AS c FROM book);
+
+CREATE TABLE IF NOT EXISTS book_isbn13 (
+    book_id INTEGER PRIMARY KEY,
+    isbn13 VARCHAR(13) NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_book_isbn13_isbn13 ON book_isbn13 (isbn13);
+
+CREATE TRIGGER IF NOT EXISTS book_isbn13_insert AFTER INSERT ON book BEGIN
+    INSERT INTO book_isbn13 (book_id, isbn13) SELECT book_id, isbn13 FROM book_isbn13_source
+    WHERE book_id = new.id AND isbn13 IS NOT NULL;
+END;
+
+CREATE TRIGGER IF NOT EXISTS book_isbn13_delete AFTER DELETE ON book BEGIN
+    DELETE FROM book_isbn13 WHERE book_id = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS book_isbn13_update AFTER UPDATE OF id, isbn ON book BEGIN
+    DELETE FROM book_isbn13 WHERE book_id = old.id;
+    INSERT INTO book_isbn13 (book_id, isbn13) SELECT book_id, isbn13 FROM book_isbn13_source
+    WHERE book_id = new.id AND isbn13 IS NOT NULL;
+END;
+
+INSERT OR REPLACE INTO book_isbn13 (book_id, isbn13)
+SELECT book_id, isbn13 FROM book_isbn13_source WHERE isbn13 IS NOT NULL;
@@ -0,0 +1,29 @@
+-- Only ISBNs with a valid check digit get a canonical ISBN-13, as in
+-- book_search.normalize_isbn: migration 009's view converted any ISBN-10
+-- shape, so a mistyped stored ISBN-10 took the ISBN-13 of another book.
+-- Replaces the view (the triggers read it by name) and refills book_isbn13.
+-- Keep in sync with BOOK_ISBN13_DDL in models.py.
+
+DROP VIEW IF EXISTS book_isbn13_source;
+
+CREATE VIEW book_isbn13_source AS
+SELECT id AS book_id, CASE
+    WHEN length(c) = 13 AND c NOT GLOB '*[^0-9]*'
+        AND (substr(c, 1, 1) + 3 * substr(c, 2, 1) + substr(c, 3, 1) + 3 * substr(c, 4, 1) + substr(c, 5, 1)
+            + 3 * substr(c, 6, 1) + substr(c, 7, 1) + 3 * substr(c, 8, 1) + substr(c, 9, 1) + 3 * substr(c, 10, 1)
+            + substr(c, 11, 1) + 3 * substr(c, 12, 1) + substr(c, 13, 1)) % 10 = 0
+    THEN c
+    WHEN length(c) = 10 AND substr(c, 1, 9) NOT GLOB '*[^0-9]*' AND substr(c, 10) GLOB '[0-9X]'
+        AND (10 * substr(c, 1, 1) + 9 * substr(c, 2, 1) + 8 * substr(c, 3, 1) + 7 * substr(c, 4, 1)
+            + 6 * substr(c, 5, 1) + 5 * substr(c, 6, 1) + 4 * substr(c, 7, 1) + 3 * substr(c, 8, 1)
+            + 2 * substr(c, 9, 1) + CASE substr(c, 10) WHEN 'X' THEN 10 ELSE substr(c, 10) END) % 11 = 0
+    THEN '978' || substr(c, 1, 9) || ((10 - (38 + 3 * substr(c, 1, 1) + substr(c, 2, 1) + 3 * substr(c, 3, 1)
+        + substr(c, 4, 1) + 3 * substr(c, 5, 1) + substr(c, 6, 1) + 3 * substr(c, 7, 1) + substr(c, 8, 1)
+        + 3 * substr(c, 9, 1)) % 10) % 10)
+    END AS isbn13
+FROM (SELECT id, replace(replace(upper(isbn), '-', ''), ' ', '') AS c FROM book);
+
+DELETE FROM book_isbn13;
+
+INSERT INTO book_isbn13 (book_id, isbn13)
+SELECT book_id, isbn13 FROM book_isbn13_source WHERE isbn13 IS NOT NULL;
@@ -1,3 +1,4 @@
+from sqlalchemy import DDL, event
 from src.app_factory_minimal import db
 
 class User(db.Model):
@@ -19,6 +20,72 @@ class Book(db.Model):
     available_quantity = db.Column(db.Integer, nullable=False, default=1)
     description = db.Column(db.Text, nullable=True)
 
+    __table_args__ = (
+        db.Index('ix_book_available_quantity', 'available_quantity'),
+    )
+
+# FTS5 index over the catalog for ranked search (see book_search.py), kept in
+# sync by triggers. Created with the book table; migration 008 adds it to
+# existing databases. Only edits to indexed columns touch the index.
+BOOK_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS book_fts USING fts5("
+    "title, author, category, description, isbn, "
+    "content='book', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS book_fts_insert AFTER INSERT ON book BEGIN "
+    "INSERT INTO book_fts (rowid, title, author, category, description, isbn) "
+    "VALUES (new.id, new.title, new.author, new.category, new.description, new.isbn); END",
+    "CREATE TRIGGER IF NOT EXISTS book_fts_delete AFTER DELETE ON book BEGIN "
+    "INSERT INTO book_fts (book_fts, rowid, title, author, category, description, isbn) "
+    "VALUES ('delete', old.id, old.title, old.author, old.category, old.description, old.isbn); END",
+    "CREATE TRIGGER IF NOT EXISTS book_fts_update AFTER UPDATE OF title, author, category, description, isbn "
+    "ON book BEGIN "
+    "INSERT INTO book_fts (book_fts, rowid, title, author, category, description, isbn) "
+    "VALUES ('delete', old.id, old.title, old.author, old.category, old.description, old.isbn); "
+    "INSERT INTO book_fts (rowid, title, author, category, description, isbn) "
+    "VALUES (new.id, new.title, new.author, new.category, new.description, new.isbn); END",
+)
+
+# Canonical ISBN-13 of every book, for exact ISBN lookups (see
+# book_search.isbn_books): book_isbn13_source derives it from the stored ISBN
+# the way book_search.normalize_isbn does (hyphens and spaces dropped, an
+# ISBN-10 given the 978 prefix and a new check digit, NULL unless it is an
+# ISBN-10 or ISBN-13 with a valid check digit), and triggers copy it into the
+# indexed book_isbn13 table (DDL() reads % as a format character: %% is
+# SQL's %). Created with the book table; migration 009 adds it to existing
+# databases and backfills it, migration 010 adds the check digit tests.
+BOOK_ISBN13_DDL = (
+    "CREATE VIEW IF NOT EXISTS book_isbn13_source AS "
+    "SELECT id AS book_id, CASE "
+    "WHEN length(c) = 13 AND c NOT GLOB '*[^0-9]*' "
+    "AND (substr(c, 1, 1) + 3 * substr(c, 2, 1) + substr(c, 3, 1) + 3 * substr(c, 4, 1) + substr(c, 5, 1) "
+    "+ 3 * substr(c, 6, 1) + substr(c, 7, 1) + 3 * substr(c, 8, 1) + substr(c, 9, 1) + 3 * substr(c, 10, 1) "
+    "+ substr(c, 11, 1) + 3 * substr(c, 12, 1) + substr(c, 13, 1)) %% 10 = 0 "
+    "THEN c "
+    "WHEN length(c) = 10 AND substr(c, 1, 9) NOT GLOB '*[^0-9]*' AND substr(c, 10) GLOB '[0-9X]' "
+    "AND (10 * substr(c, 1, 1) + 9 * substr(c, 2, 1) + 8 * substr(c, 3, 1) + 7 * substr(c, 4, 1) "
+    "+ 6 * substr(c, 5, 1) + 5 * substr(c, 6, 1) + 4 * substr(c, 7, 1) + 3 * substr(c, 8, 1) "
+    "+ 2 * substr(c, 9, 1) + CASE substr(c, 10) WHEN 'X' THEN 10 ELSE substr(c, 10) END) %% 11 = 0 "
+    "THEN '978' || substr(c, 1, 9) || ((10 - (38 + 3 * substr(c, 1, 1) + substr(c, 2, 1) + 3 * substr(c, 3, 1) "
+    "+ substr(c, 4, 1) + 3 * substr(c, 5, 1) + substr(c, 6, 1) + 3 * substr(c, 7, 1) + substr(c, 8, 1) "
+    "+ 3 * substr(c, 9, 1)) %% 10) %% 10) "
+    "END AS isbn13 "
+    "FROM (SELECT id, replace(replace(upper(isbn), '-', ''), ' ', '') AS c FROM book)",
+    "CREATE TABLE IF NOT EXISTS book_isbn13 (book_id INTEGER PRIMARY KEY, isbn13 VARCHAR(13) NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_book_isbn13_isbn13 ON book_isbn13 (isbn13)",
+    "CREATE TRIGGER IF NOT EXISTS book_isbn13_insert AFTER INSERT ON book BEGIN "
+    "INSERT INTO book_isbn13 (book_id, isbn13) SELECT book_id, isbn13 FROM book_isbn13_source "
+    "WHERE book_id = new.id AND isbn13 IS NOT NULL; END",
+    "CREATE TRIGGER IF NOT EXISTS book_isbn13_delete AFTER DELETE ON book BEGIN "
+    "DELETE FROM book_isbn13 WHERE book_id = old.id; END",
+    "CREATE TRIGGER IF NOT EXISTS book_isbn13_update AFTER UPDATE OF id, isbn ON book BEGIN "
+    "DELETE FROM book_isbn13 WHERE book_id = old.id; "
+    "INSERT INTO book_isbn13 (book_id, isbn13) SELECT book_id, isbn13 FROM book_isbn13_source "
+    "WHERE book_id = new.id AND isbn13 IS NOT NULL; END",
+)
+
+for _statement in BOOK_FTS_DDL + BOOK_ISBN13_DDL:
+    event.listen(Book.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+
 class BorrowRecord(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -28,6 +95,29 @@ class BorrowRecord(db.Model):
     return_date = db.Column(db.DateTime, nullable=True)
     fine = db.Column(db.Float, nullable=True, default=0.0)
 
+    # Many-to-one only, lazy by default; endpoints pick joinedload/selectinload
+    user = db.relationship('User', lazy='select')
+    book = db.relationship('Book', lazy='select')
+
+    # Legacy Issue attribute names
+    student = db.synonym('user')
+    student_id = db.synonym('user_id')
+    issue_date = db.synonym('borrow_date')
+
+    # Keep in sync with migrations/003_circulation_indexes.sql
+    __table_args__ = (
+        db.Index('ix_borrow_record_user_return', 'user_id', 'return_date'),
+        db.Index('ix_borrow_record_book_return', 'book_id', 'return_date'),
+        db.Index('ix_borrow_record_borrow_date', 'borrow_date'),
+        db.Index('ix_borrow_record_return_date', 'return_date'),
+        # Partial index: only open loans, ordered by due date (open + overdue counts)
+        db.Index(
+            'ix_borrow_record_open_due', 'due_date',
+            sqlite_where=db.text('return_date IS NULL'),
+            postgresql_where=db.text('return_date IS NULL'),
+        ),
+    )
+
 class Fees(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -35,6 +125,82 @@ class Fees(db.Model):
     amount = db.Column(db.Float, nullable=False)
     reason = db.Column(db.String(255), nullable=False)
 
+    user = db.relationship('User', lazy='select')
+
+    __table_args__ = (
+        db.Index('ix_fees_user_date', 'user_id', 'date'),
+    )
+
+class LibraryCounter(db.Model):
+    """Denormalized headline counter, maintained by src.library_counters."""
+    __tablename__ = 'library_counters'
+    name = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.Float, nullable=False, default=0.0)
+
+class CirculationDaily(db.Model):
+    """Loans, returns and fines per UTC day, maintained by src.circulation_rollup."""
+    __tablename__ = 'circulation_daily'
+    day = db.Column(db.Date, primary_key=True)
+    issues = db.Column(db.Integer, nullable=False, default=0)
+    returns = db.Column(db.Integer, nullable=False, default=0)
+    fines = db.Column(db.Integer, nullable=False, default=0)
+    fine_amount = db.Column(db.Float, nullable=False, default=0.0)
+
+class CirculationDailyBook(db.Model):
+    """Loans and returns per UTC day and book (no FK: history outlives deleted books)."""
+    __tablename__ = 'circulation_daily_book'
+    day = db.Column(db.Date, primary_key=True)
+    book_id = db.Column(db.Integer, primary_key=True)
+    issues = db.Column(db.Integer, nullable=False, default=0)
+    returns = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_circulation_daily_book_book_day', 'book_id', 'day'),
+    )
+
+class CirculationDailyUser(db.Model):
+    """Loans per UTC day and borrower (no FK: history outlives deleted users)."""
+    __tablename__ = 'circulation_daily_user'
+    day = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+    issues = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_circulation_daily_user_user_day', 'user_id', 'day'),
+    )
+
+class CirculationMonthly(db.Model):
+    """Closed-month totals of circulation_daily, materialized by src.circulation_reports."""
+    __tablename__ = 'circulation_monthly'
+    month = db.Column(db.Date, primary_key=True)  # first day of the month
+    issues = db.Column(db.Integer, nullable=False, default=0)
+    returns = db.Column(db.Integer, nullable=False, default=0)
+    fines = db.Column(db.Integer, nullable=False, default=0)
+    fine_amount = db.Column(db.Float, nullable=False, default=0.0)
+
+class CirculationMonthlyBook(db.Model):
+    """Closed-month totals of circulation_daily_book."""
+    __tablename__ = 'circulation_monthly_book'
+    month = db.Column(db.Date, primary_key=True)
+    book_id = db.Column(db.Integer, primary_key=True)
+    issues = db.Column(db.Integer, nullable=False, default=0)
+    returns = db.Column(db.Integer, nullable=False, default=0)
+
+class CirculationMonthlyUser(db.Model):
+    """Closed-month totals of circulation_daily_user."""
+    __tablename__ = 'circulation_monthly_user'
+    month = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+    issues = db.Column(db.Integer, nullable=False, default=0)
+
+class CirculationDailyCategory(db.Model):
+    """Loans and returns per UTC day and book category ('' for uncategorized)."""
+    __tablename__ = 'circulation_daily_category'
+    day = db.Column(db.Date, primary_key=True)
+    category = db.Column(db.String(100), primary_key=True)
+    issues = db.Column(db.Integer, nullable=False, default=0)
+    returns = db.Column(db.Integer, nullable=False, default=0)
+
 # Legacy models for compatibility - using aliases instead of inheritance
 Student = User
 Issue = BorrowRecord
@@ -0,0 +1,195 @@
+"""In-memory index of open loans ordered by due date.
+
+Each process keeps, per app, every open loan as ``(due_date, record_id)`` in
+a sorted list, with ``record_id -> OpenLoan`` alongside. "How many loans are
+overdue", "how many fall due in the next N days" and "which loan is the most
+overdue" are then bisections of that list instead of scans of
+``borrow_record``. The ``book_borrowed`` and ``book_returned`` signals add
+and remove loans as they commit; both operations are idempotent.
+
+The index is loaded from the database on first use in each process and
+reloaded every ``OVERDUE_INDEX_RESYNC_SECONDS`` in the background, which
+picks up loans handled by other worker processes. Loads run on their own
+thread and app context, so they never count against a request's query
+budget. ``check_overdue_index`` compares the index with the database.
+Due dates are naive UTC, like ``BorrowRecord.due_date``.
+"""
+import bisect
+import logging
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select
+from src.models import db, BorrowRecord
+from src.signals import book_borrowed, book_returned
+
+logger = logging.getLogger(__name__)
+
+OVERDUE_INDEX_RESYNC_SECONDS = 300.0
+
+OpenLoan = namedtuple('OpenLoan', 'record_id due_date user_id book_id')
+
+class OverdueIndex:
+    """Open loans sorted by ``(due_date, record_id)``."""
+
+    def __init__(self, loans=()):
+        self.loans = {loan.record_id: loan for loan in loans}
+        self.order = sorted((loan.due_date, loan.record_id) for loan in self.loans.values())
+
+    def add(self, loan):
+        if loan.record_id in self.loans:
+            return
+        self.loans[loan.record_id] = loan
+        bisect.insort(self.order, (loan.due_date, loan.record_id))
+
+    def remove(self, record_id):
+        loan = self.loans.pop(record_id, None)
+        if loan is not None:
+            del self.order[bisect.bisect_left(self.order, (loan.due_date, record_id))]
+
+    def count_due_before(self, moment):
+        return bisect.bisect_left(self.order, (moment,))
+
+    def due_between(self, start, end):
+        """Loans due in ``[start, end)``, earliest first."""
+        first = bisect.bisect_left(self.order, (start,))
+        last = bisect.bisect_left(self.order, (end,))
+        return [self.loans[record_id] for _, record_id in self.order[first:last]]
+
+    def __len__(self):
+        return len(self.order)
+
+class _State:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index = None
+        self.built_at = 0.0
+        self.building = None
+        self.replay = []
+
+def _state(app=None):
+    app = app or current_app
+    return app.extensions.setdefault('overdue_index', _State())
+
+def load_open_loans():
+    """Every open loan in the database as ``OpenLoan`` tuples."""
+    rows = db.session.execute(
+        select(BorrowRecord.id, BorrowRecord.due_date, BorrowRecord.user_id, BorrowRecord.book_id)
+        .where(BorrowRecord.return_date.is_(None)),
+        bind_arguments={'bind': db.engine},
+    ).all()
+    return [OpenLoan(*row) for row in rows]
+
+def _apply(index, event, payload):
+    if event == 'add':
+        index.add(payload)
+    else:
+        index.remove(payload)
+
+def _build(app, state):
+    try:
+        with app.app_context():
+            index = OverdueIndex(load_open_loans())
+        with state.lock:
+            # Borrows and returns that committed while we read; both operations are idempotent
+            for event, payload in state.replay:
+                _apply(index, event, payload)
+            state.index, state.built_at = index, time.monotonic()
+    except Exception:
+        logger.exception("Overdue index build failed")
+    finally:
+        with state.lock:
+            state.building, state.replay = None, []
+
+def _start_build(app, state):
+    state.building = threading.Thread(target=_build, args=(app, state), daemon=True, name='overdue-index-build')
+    state.building.start()
+    return state.building
+
+def _with_index(read):
+    """Run ``read(index)`` under the lock, loading the index first if needed."""
+    app = current_app._get_current_object()
+    state = _state(app)
+    resync = app.config.get('OVERDUE_INDEX_RESYNC_SECONDS', OVERDUE_INDEX_RESYNC_SECONDS)
+    with state.lock:
+        if state.building is None and (state.index is None or time.monotonic() - state.built_at >= resync):
+            _start_build(app, state)
+        thread = state.building if state.index is None else None
+    if thread is not None:
+        # Nothing to serve yet: wait for the first load
+        thread.join()
+    with state.lock:
+        if state.index is None:
+            raise RuntimeError("Overdue index is not available")
+        return read(state.index)
+
+def overdue_count(now=None):
+    """Number of open loans past their due date."""
+    now = now or datetime.utcnow()
+    return _with_index(lambda index: index.count_due_before(now))
+
+def overdue_loans(now=None):
+    """Open loans past their due date, most overdue first."""
+    now = now or datetime.utcnow()
+    return _with_index(lambda index: index.due_between(datetime.min, now))
+
+def oldest_overdue(now=None):
+    """The most overdue open loan, or ``None``."""
+    now = now or datetime.utcnow()
+
+    def read(index):
+        if index.order and index.order[0][0] < now:
+            return index.loans[index.order[0][1]]
+        return None
+    return _with_index(read)
+
+def due_within(days, now=None):
+    """Open loans not yet overdue that fall due in the next ``days`` days, earliest first."""
+    now = now or datetime.utcnow()
+    return _with_index(lambda index: index.due_between(now, now + timedelta(days=days)))
+
+def open_loan_count():
+    """Number of open loans in the index."""
+    return _with_index(len)
+
+def check_overdue_index(fix=False):
+    """Compare the index with the open loans in the database.
+
+    Returns ``{'missing', 'unexpected', 'mismatched'}`` lists of record ids:
+    open loans absent from the index, indexed loans that are not open, and
+    loans whose due date, user or book differ. With ``fix=True`` the index
+    is replaced by a fresh load when they disagree.
+    """
+    actual = {loan.record_id: loan for loan in load_open_loans()}
+    indexed = _with_index(lambda index: dict(index.loans))
+    drift = {
+        'missing': sorted(actual.keys() - indexed.keys()),
+        'unexpected': sorted(indexed.keys() - actual.keys()),
+        'mismatched': sorted(record_id for record_id in actual.keys() & indexed.keys()
+                             if actual[record_id] != indexed[record_id]),
+    }
+    if fix and any(drift.values()):
+        state = _state()
+        with state.lock:
+            thread = state.building or _start_build(current_app._get_current_object(), state)
+        thread.join()
+    return drift
+
+def _record(sender, event, payload):
+    state = _state(sender)
+    with state.lock:
+        if state.building is not None:
+            state.replay.append((event, payload))
+        if state.index is not None:
+            _apply(state.index, event, payload)
+
+def _on_book_borrowed(sender, record_id, user_id, book_id, due_date, **data):
+    _record(sender, 'add', OpenLoan(record_id, datetime.fromisoformat(due_date), user_id, book_id))
+
+def _on_book_returned(sender, record_id, **data):
+    _record(sender, 'remove', record_id)
+
+book_borrowed.connect(_on_book_borrowed, weak=False)
+book_returned.connect(_on_book_returned, weak=False)
@@ -0,0 +1,61 @@
+"""Per-endpoint SQL query budgets.
+
+Declare the most statements a view may issue per request with
+``@query_budget(n)`` (placed under the ``@bp.route`` decorator).
+``init_query_budget`` counts statements per request; a request that goes over
+its budget raises ``QueryBudgetExceeded`` when the app is under test (or
+``QUERY_BUDGET_ENFORCE`` is set), so N+1 regressions fail the test suite, and
+is logged as a warning otherwise.
+"""
+import logging
+from contextlib import contextmanager
+from flask import request
+from sqlalchemy import event
+from src.sql_metrics import install_sql_listeners, request_sql_stats
+
+logger = logging.getLogger(__name__)
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a request or block issues more SQL statements than allowed."""
+
+def query_budget(max_queries):
+    """Declare the maximum number of SQL statements a view may issue."""
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+def init_query_budget(app, db):
+    """Count statements per request on the app's engine and enforce budgets."""
+    with app.app_context():
+        install_sql_listeners(db.engine)
+
+    @app.after_request
+    def _check_query_budget(response):
+        view = app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', None)
+        count = request_sql_stats()['count']
+        if budget is not None and count > budget:
+            message = f"{request.endpoint} issued {count} SQL statements (budget {budget})"
+            if app.config.get('QUERY_BUDGET_ENFORCE', app.testing):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+@contextmanager
+def assert_max_queries(engine, max_queries):
+    """Fail if the enclosed block issues more than ``max_queries`` statements on ``engine``."""
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', _record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', _record)
+    if len(statements) > max_queries:
+        raise QueryBudgetExceeded(
+            f"{len(statements)} SQL statements (budget {max_queries}):\n" + '\n'.join(statements)
+        )
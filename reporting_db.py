@@ -0,0 +1,183 @@
+"""Read-only reporting engine for long scans.
+
+Views decorated with ``@use_reporting_db`` keep using ``db.session`` and
+``Model.query`` as usual, but ``RoutingSession.get_bind`` sends their reads
+to a second engine with its own connection pool, so reports never hold
+connections or locks that borrow/return commits are waiting on. Flushes
+always go to the primary engine. ``REPORTING_DATABASE`` (app config or
+environment) selects the engine:
+
+* ``readonly`` (default): the live SQLite file opened with ``mode=ro``.
+  Together with the ``production`` SQLite profile (WAL) readers and the
+  writer no longer block each other, and a stray write fails instead of
+  taking the write lock.
+* ``snapshot``: a copy of the database made with SQLite's online backup API,
+  refreshed once it is older than ``REPORTING_SNAPSHOT_MAX_AGE`` seconds
+  (default 300). Reports never touch the live file, even without WAL, at
+  the cost of being up to that many seconds stale.
+* ``off``: reporting views use the primary engine.
+
+``REPORTING_DATABASE_URI`` (e.g. a read replica) takes precedence over the mode.
+"""
+import functools
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine
+from src.sql_metrics import install_sql_listeners
+from src.sqlite_profile import SQLITE_POOL_OPTIONS, install_pragmas
+
+REPORTING_MODES = ('readonly', 'snapshot', 'off')
+DEFAULT_SNAPSHOT_MAX_AGE = 300
+
+# Profile PRAGMAs that still apply to a read-only connection.
+_READ_PRAGMAS = ('mmap_size', 'cache_size', 'busy_timeout', 'temp_store')
+
+_snapshot_ids = itertools.count(1)
+
+def use_reporting_db(view):
+    """Route the view's database reads to the reporting engine."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        previous = g.get('use_reporting_db', False)
+        g.use_reporting_db = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            g.use_reporting_db = previous
+    return wrapper
+
+class RoutingSession(Session):
+    """Session that reads from the reporting engine inside ``@use_reporting_db`` views."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context() and g.get('use_reporting_db'):
+            reporting = current_app.extensions.get('reporting_db')
+            engine = reporting.engine if reporting else None
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def _sqlite_path(engine):
+    database = engine.url.database
+    if engine.dialect.name != 'sqlite' or not database or database == ':memory:':
+        return None
+    return database
+
+def _readonly_url(path):
+    return f"sqlite:///{Path(path).resolve().as_uri()}?mode=ro&uri=true"
+
+class ReportingDatabase:
+    """Owns the reporting engine for one app; see the module docstring for modes."""
+
+    def __init__(self, primary, mode='readonly', uri=None, pragmas=None,
+                 snapshot_max_age=DEFAULT_SNAPSHOT_MAX_AGE, pool_options=None):
+        if mode not in REPORTING_MODES:
+            raise ValueError(f"Unknown reporting database mode '{mode}'")
+        self.primary = primary
+        self.path = _sqlite_path(primary)
+        self.mode = mode if uri or self.path else 'off'
+        self.pragmas = {name: value for name, value in (pragmas or {}).items() if name in _READ_PRAGMAS}
+        self.snapshot_max_age = snapshot_max_age
+        self.pool_options = dict(SQLITE_POOL_OPTIONS)
+        self.pool_options.update(pool_options or {})
+        self._lock = threading.Lock()
+        self._engine = None
+        self._snapshot_path = None
+        self._snapshot_taken = 0.0
+
+        if uri:
+            self._engine = self._instrument(create_engine(uri))
+        elif self.mode == 'readonly':
+            self._engine = self._sqlite_engine(self.path)
+
+    @property
+    def engine(self):
+        """Engine for reporting reads, or ``None`` to use the primary."""
+        if self.mode == 'snapshot' and (
+                self._engine is None or time.monotonic() - self._snapshot_taken > self.snapshot_max_age):
+            self.refresh_snapshot(wait=self._engine is None)
+        return self._engine
+
+    def _instrument(self, engine):
+        install_sql_listeners(engine)
+        return engine
+
+    def _sqlite_engine(self, path):
+        options = dict(self.pool_options)
+        busy_timeout = self.pragmas.get('busy_timeout')
+        if busy_timeout is not None:
+            options['connect_args'] = {'timeout': busy_timeout / 1000.0}
+        engine = create_engine(_readonly_url(path), **options)
+        install_pragmas(engine, self.pragmas)
+        return self._instrument(engine)
+
+    def refresh_snapshot(self, wait=True):
+        """Copy the live database to a new snapshot file and switch to it.
+
+        With ``wait=False`` the call returns at once if another thread is
+        already refreshing; callers keep reading the previous snapshot.
+        """
+        if not self._lock.acquire(blocking=wait):
+            return
+        try:
+            target = f"{self.path}.reporting-{os.getpid()}-{next(_snapshot_ids)}"
+            raw = self.primary.raw_connection()
+            try:
+                destination = sqlite3.connect(target)
+                try:
+                    raw.driver_connection.backup(destination)
+                    # A WAL source would make the copy WAL too; a read-only WAL file needs its -shm
+                    destination.execute("PRAGMA journal_mode=DELETE")
+                finally:
+                    destination.close()
+            finally:
+                raw.close()
+
+            previous_engine, previous_path = self._engine, self._snapshot_path
+            self._engine = self._sqlite_engine(target)
+            self._snapshot_path = target
+            self._snapshot_taken = time.monotonic()
+        finally:
+            self._lock.release()
+
+        if previous_engine is not None:
+            previous_engine.dispose()
+        if previous_path:
+            try:
+                os.remove(previous_path)
+            except OSError:
+                pass  # still open (Windows); left for the next cleanup
+
+    def close(self):
+        if self._engine is not None:
+            self._engine.dispose()
+        if self._snapshot_path:
+            try:
+                os.remove(self._snapshot_path)
+            except OSError:
+                pass
+
+def init_reporting_db(app, db):
+    """Create the app's reporting engine. Call after ``db.init_app``.
+
+    ``db`` must be created with ``session_options={'class_': RoutingSession}``
+    for ``@use_reporting_db`` to take effect.
+    """
+    mode = app.config.get('REPORTING_DATABASE') or os.environ.get('REPORTING_DATABASE', 'readonly')
+    with app.app_context():
+        reporting = ReportingDatabase(
+            db.engine,
+            mode=mode,
+            uri=app.config.get('REPORTING_DATABASE_URI'),
+            pragmas=app.config.get('SQLITE_ACTIVE_PRAGMAS'),
+            snapshot_max_age=app.config.get('REPORTING_SNAPSHOT_MAX_AGE', DEFAULT_SNAPSHOT_MAX_AGE),
+            pool_options=app.config.get('SQLITE_POOL_OPTIONS'),
+        )
+    app.extensions['reporting_db'] = reporting
+    return reporting
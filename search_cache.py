@@ -0,0 +1,313 @@
+"""Result cache for the book search endpoints.
+
+Popular searches repeat all day with identical results. ``cached_search``
+keys a search on its endpoint and on its text and filters normalized the way
+the FTS index sees them (``book_search.search_words``: "Python " and
+"python" are one entry). A text that is a whole ISBN is keyed on the
+ISBN-13 it is looked up by instead (``book_search.normalize_isbn``), so
+"0-306-40615-2" and "9780306406157" share an entry. The serialized result
+is stored together with the catalog version (see ``catalog_etag``) it was
+computed at. Every change to a ``Book`` row, availability included, moves
+that version, and the first lookup that sees the new version drops every
+older entry at once.
+
+Entries are JSON, and their size in bytes counts against
+``SEARCH_CACHE_MAX_BYTES`` next to the ``SEARCH_CACHE_MAX_ENTRIES`` count
+limit; the least recently used entries are evicted first, and a single
+result over an eighth of the byte budget is never stored. Hits, misses,
+stores, evictions and invalidations are counted per process and served with
+the SQL metrics at ``/api/metrics``.
+
+``SEARCH_CACHE`` (app config or environment) selects the backend:
+
+* ``memory`` (default): an LRU dict per worker process.
+* ``sqlite``: one table in a local SQLite file (WAL) shared by every worker
+  process on the machine, ``SEARCH_CACHE_PATH`` or the primary database file
+  name plus ``.search-cache``. Triggers keep the entry and byte totals.
+* ``off``: every search runs.
+
+A backend error never fails a search: it is logged and the search runs
+uncached.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from src.models import db
+from src.book_search import normalize_isbn, search_words
+from src.catalog_etag import get_catalog_version
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CACHE_BACKENDS = ('memory', 'sqlite', 'off')
+SEARCH_CACHE_MAX_ENTRIES = 1000
+SEARCH_CACHE_MAX_BYTES = 32 * 1024 * 1024
+# The most of the byte budget one entry may take
+SEARCH_CACHE_ENTRY_SHARE = 8
+
+_SQLITE_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS search_cache ("
+    "key TEXT PRIMARY KEY, version INTEGER NOT NULL, value BLOB NOT NULL, "
+    "size INTEGER NOT NULL, used_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_search_cache_used_at ON search_cache (used_at)",
+    "CREATE TABLE IF NOT EXISTS search_cache_totals ("
+    "id INTEGER PRIMARY KEY CHECK (id = 1), entries INTEGER NOT NULL, bytes INTEGER NOT NULL)",
+    "INSERT OR IGNORE INTO search_cache_totals (id, entries, bytes) VALUES (1, 0, 0)",
+    "CREATE TRIGGER IF NOT EXISTS search_cache_insert AFTER INSERT ON search_cache BEGIN "
+    "UPDATE search_cache_totals SET entries = entries + 1, bytes = bytes + new.size; END",
+    "CREATE TRIGGER IF NOT EXISTS search_cache_update AFTER UPDATE OF size ON search_cache BEGIN "
+    "UPDATE search_cache_totals SET bytes = bytes - old.size + new.size; END",
+    "CREATE TRIGGER IF NOT EXISTS search_cache_delete AFTER DELETE ON search_cache BEGIN "
+    "UPDATE search_cache_totals SET entries = entries - 1, bytes = bytes - old.size; END",
+)
+
+# Upsert rather than INSERT OR REPLACE: a REPLACE deletes without firing the delete trigger
+_SQLITE_PUT = (
+    "INSERT INTO search_cache (key, version, value, size, used_at) VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT (key) DO UPDATE SET version = excluded.version, value = excluded.value, "
+    "size = excluded.size, used_at = excluded.used_at"
+)
+
+class MemoryBackend:
+    """LRU dict of ``key -> (version, value)`` for one process."""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.evictions = 0
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, version, value):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(key) + len(old[1])
+            self._entries[key] = (version, value)
+            self._bytes += len(key) + len(value)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                evicted, (_, evicted_value) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted) + len(evicted_value)
+                self.evictions += 1
+
+    def invalidate(self, version):
+        """Drop every entry older than ``version``."""
+        with self._lock:
+            for key in [key for key, (entry_version, _) in self._entries.items() if entry_version < version]:
+                self._bytes -= len(key) + len(self._entries.pop(key)[1])
+
+    def totals(self):
+        with self._lock:
+            return len(self._entries), self._bytes
+
+class SqliteBackend:
+    """The same LRU in a SQLite file shared by the worker processes of one machine."""
+
+    def __init__(self, path, max_entries, max_bytes):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self.evictions = 0
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    for statement in _SQLITE_SCHEMA:
+                        connection.execute(statement)
+                    self._schema_ready = True
+            self._local.connection = connection
+        return connection
+
+    def get(self, key, version):
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT value FROM search_cache WHERE key = ? AND version = ?", (key, version)
+        ).fetchone()
+        if row is None:
+            return None
+        connection.execute("UPDATE search_cache SET used_at = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def put(self, key, version, value):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(_SQLITE_PUT, (key, version, value, len(key) + len(value), time.time()))
+            entries, size = connection.execute("SELECT entries, bytes FROM search_cache_totals").fetchone()
+            evicted = []
+            if entries > self.max_entries or size > self.max_bytes:
+                oldest = connection.execute("SELECT key, size FROM search_cache ORDER BY used_at")
+                for evicted_key, evicted_size in oldest:
+                    if entries <= self.max_entries and size <= self.max_bytes:
+                        break
+                    evicted.append((evicted_key,))
+                    entries, size = entries - 1, size - evicted_size
+                oldest.close()
+                connection.executemany("DELETE FROM search_cache WHERE key = ?", evicted)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        self.evictions += len(evicted)
+
+    def invalidate(self, version):
+        """Drop every entry older than ``version``, whichever process stored it."""
+        self._connection().execute("DELETE FROM search_cache WHERE version < ?", (version,))
+
+    def totals(self):
+        return tuple(self._connection().execute("SELECT entries, bytes FROM search_cache_totals").fetchone())
+
+class SearchCache:
+    """A backend plus this process's hit/miss counters and the newest catalog version seen."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.max_entry_bytes = backend.max_bytes // SEARCH_CACHE_ENTRY_SHARE
+        self._lock = threading.Lock()
+        self._version = None
+        self.counts = {'hits': 0, 'misses': 0, 'stores': 0, 'invalidations': 0, 'errors': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def _check_version(self, version):
+        with self._lock:
+            if self._version is not None and version <= self._version:
+                return
+            moved = self._version is not None
+            self._version = version
+        # Also on the first lookup: a shared file may hold entries from before this process started
+        self.backend.invalidate(version)
+        if moved:
+            self._count('invalidations')
+
+    def get(self, key, version):
+        try:
+            self._check_version(version)
+            value = self.backend.get(key, version)
+        except sqlite3.Error as e:
+            logger.warning("Search cache read failed: %s", e)
+            self._count('errors')
+            return None
+        self._count('misses' if value is None else 'hits')
+        return value
+
+    def put(self, key, version, value):
+        if len(key) + len(value) > self.max_entry_bytes:
+            return
+        try:
+            self.backend.put(key, version, value)
+        except sqlite3.Error as e:
+            logger.warning("Search cache write failed: %s", e)
+            self._count('errors')
+            return
+        self._count('stores')
+
+    def stats(self):
+        entries, size = self.backend.totals()
+        with self._lock:
+            counts = dict(self.counts)
+        lookups = counts['hits'] + counts['misses']
+        return {
+            **counts,
+            'evictions': self.backend.evictions,
+            'hit_rate': round(counts['hits'] / lookups, 3) if lookups else None,
+            'entries': entries,
+            'bytes': size,
+            'max_entries': self.backend.max_entries,
+            'max_bytes': self.backend.max_bytes,
+        }
+
+class _Slot:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ready = False
+        self.cache = None
+
+def _default_path():
+    database = db.engine.url.database
+    if db.engine.dialect.name != 'sqlite' or not database or database == ':memory:':
+        raise ValueError("SEARCH_CACHE=sqlite needs SEARCH_CACHE_PATH unless the database is a SQLite file")
+    return f'{database}.search-cache'
+
+def create_search_cache(app):
+    """The search cache ``app``'s config asks for, or ``None`` when it is off."""
+    backend = app.config.get('SEARCH_CACHE') or os.environ.get('SEARCH_CACHE', 'memory')
+    if backend not in SEARCH_CACHE_BACKENDS:
+        raise ValueError(f"Unknown search cache backend '{backend}'")
+    max_entries = app.config.get('SEARCH_CACHE_MAX_ENTRIES', SEARCH_CACHE_MAX_ENTRIES)
+    max_bytes = app.config.get('SEARCH_CACHE_MAX_BYTES', SEARCH_CACHE_MAX_BYTES)
+    if backend == 'memory':
+        return SearchCache(MemoryBackend(max_entries, max_bytes))
+    if backend == 'sqlite':
+        path = app.config.get('SEARCH_CACHE_PATH') or _default_path()
+        return SearchCache(SqliteBackend(path, max_entries, max_bytes))
+    return None
+
+def _search_cache():
+    app = current_app._get_current_object()
+    slot = app.extensions.setdefault('search_cache', _Slot())
+    with slot.lock:
+        if not slot.ready:
+            slot.cache, slot.ready = create_search_cache(app), True
+        return slot.cache
+
+def _normalized(text):
+    # No text at all (no filter) and text without words (matches nothing) are different searches
+    return ' '.join(search_words(text)) if text and text.strip() else None
+
+def _normalized_query(query):
+    # "978-0-306-40615-7" takes the ISBN lookup, "978.0.306.40615.7" (the same words) the text index
+    isbn = normalize_isbn(query)
+    return ['isbn', isbn] if isbn else _normalized(query)
+
+def search_cache_key(endpoint, query, page=None, **filters):
+    """Cache key of a search: equal for texts the search cannot tell apart.
+
+    ``page`` (any JSON value, e.g. offset, page size and fields) is taken as is.
+    """
+    normalized = {name: _normalized(value) for name, value in sorted(filters.items())}
+    return json.dumps([endpoint, _normalized_query(query), normalized, page],
+                      ensure_ascii=False, separators=(',', ':'))
+
+def cached_search(endpoint, query, filters, compute, page=None):
+    """``compute()``'s JSON-serializable result for this search, from the cache when it holds one
+    for the current catalog version. ``page`` tells apart pages of one search."""
+    cache = _search_cache()
+    if cache is None:
+        return compute()
+    key = search_cache_key(endpoint, query, page, **filters)
+    version = get_catalog_version()
+    value = cache.get(key, version)
+    if value is not None:
+        return json.loads(value)
+    result = compute()
+    cache.put(key, version, json.dumps(result, separators=(',', ':')).encode('utf-8'))
+    return result
+
+def search_cache_stats():
+    """This process's cache counters plus the backend's current size, or ``None`` when off."""
+    cache = _search_cache()
+    return cache.stats() if cache is not None else None
@@ -0,0 +1,136 @@
+"""Concurrent fan-out for the admin global searches.
+
+``run_searches`` starts every per-entity search (books, users, loans,
+fines) at once on a bounded per-app thread pool, so a global search takes as
+long as its slowest sub-search instead of their sum. Each sub-search runs in
+a copy of the request context, which gives it its own app context and so its
+own database session; the statements it issues are added to the request's
+SQL stats (see ``sql_metrics``), so query budgets still cover them.
+
+Every type has a deadline, in seconds from dispatch (``SEARCH_DEADLINES``,
+overridable through the ``ADMIN_SEARCH_DEADLINES`` config). A sub-search not
+finished by its deadline is abandoned: it is cancelled if still queued, and
+its SQLite statement is interrupted if running. The other types' results are
+returned, with the late types listed as timed out. ``merge_results`` ranks
+the results of several types into one list.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from flask import copy_current_request_context, current_app
+from sqlalchemy.pool import SingletonThreadPool, StaticPool
+from src.models import db
+from src.sql_metrics import merge_request_sql_stats, request_sql_stats
+
+logger = logging.getLogger(__name__)
+
+SEARCH_DEADLINES = {'books': 0.5, 'users': 0.5, 'borrowed': 1.0, 'fines': 1.0}
+DEFAULT_SEARCH_DEADLINE = 1.0
+SEARCH_WORKERS = 8
+
+class _SubSearch:
+    """One dispatched search, with the connection to interrupt while it runs."""
+
+    def __init__(self, search):
+        self.search = search
+        self.lock = threading.Lock()
+        self.connection = None
+        self.stats = None
+
+    def run(self, query):
+        with self.lock:
+            self.connection = db.session.connection().connection.driver_connection
+        try:
+            return self.search(query)
+        finally:
+            # Once cleared, the pooled connection may serve someone else: never interrupt it
+            with self.lock:
+                self.connection = None
+            self.stats = dict(request_sql_stats())
+
+    def interrupt(self):
+        with self.lock:
+            if self.connection is not None and hasattr(self.connection, 'interrupt'):
+                self.connection.interrupt()
+
+class _Pool:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executor = None
+
+def _executor(app):
+    pool = app.extensions.setdefault('search_fanout', _Pool())
+    with pool.lock:
+        if pool.executor is None:
+            pool.executor = ThreadPoolExecutor(
+                max_workers=app.config.get('ADMIN_SEARCH_WORKERS', SEARCH_WORKERS),
+                thread_name_prefix='admin-search')
+        return pool.executor
+
+def _shares_connection():
+    # In-memory SQLite: a connection per thread sees an empty database, one shared connection is not thread-safe
+    return isinstance(db.engine.pool, (SingletonThreadPool, StaticPool))
+
+def run_searches(searches, query):
+    """Run ``{type: search}`` concurrently on ``query`` and return ``(results, timed_out)``.
+
+    ``results`` maps each type that finished by its deadline to its
+    ``search(query)`` result, in the order of ``searches``; ``timed_out``
+    lists the others.
+    """
+    if _shares_connection():
+        return {search_type: search(query) for search_type, search in searches.items()}, []
+
+    app = current_app._get_current_object()
+    executor = _executor(app)
+    deadlines = {**SEARCH_DEADLINES, **app.config.get('ADMIN_SEARCH_DEADLINES', {})}
+    started = time.monotonic()
+    tasks = {}
+    for search_type, search in searches.items():
+        task = _SubSearch(search)
+        tasks[search_type] = (task, executor.submit(copy_current_request_context(task.run), query))
+
+    finished, timed_out = {}, []
+    for search_type in sorted(tasks, key=lambda name: deadlines.get(name, DEFAULT_SEARCH_DEADLINE)):
+        task, future = tasks[search_type]
+        remaining = started + deadlines.get(search_type, DEFAULT_SEARCH_DEADLINE) - time.monotonic()
+        try:
+            finished[search_type] = future.result(timeout=max(remaining, 0))
+        except TimeoutError:
+            if not future.cancel():
+                task.interrupt()
+            timed_out.append(search_type)
+            logger.warning("Admin search for %s timed out after %.2fs", search_type, time.monotonic() - started)
+            continue
+        merge_request_sql_stats(task.stats)
+    results = {search_type: finished[search_type] for search_type in searches if search_type in finished}
+    return results, [search_type for search_type in searches if search_type in timed_out]
+
+def _match_tier(needle, texts):
+    texts = [str(text or '').casefold() for text in texts]
+    if needle in texts:
+        return 0
+    if any(text.startswith(needle) for text in texts):
+        return 1
+    if any(word.startswith(needle) for text in texts for word in text.split()):
+        return 2
+    return 3
+
+def merge_results(query, results, fields):
+    """One list of the items of every type in ``results``, best matches first.
+
+    ``fields`` names, per type, the item fields matched against ``query``.
+    Items whose field equals the query come first, then those starting with
+    it, then those with a word starting with it, then the rest. Within a tier
+    the types take turns, each in its own order. Every item gains a ``type``
+    unless it has one.
+    """
+    needle = query.strip().casefold()
+    ranked = []
+    for order, (search_type, items) in enumerate(results.items()):
+        for position, item in enumerate(items):
+            tier = _match_tier(needle, [item.get(name) for name in fields[search_type]])
+            ranked.append((tier, position, order, {'type': search_type, **item}))
+    ranked.sort(key=lambda entry: entry[:3])
+    return [item for _, _, _, item in ranked]
@@ -0,0 +1,55 @@
+"""Library domain events, sent once the write that caused them has committed.
+
+Write paths call ``send_after_commit(signal, **data)`` next to the change.
+The signal is queued on the session and sent (with the Flask app as sender)
+after ``db.session.commit()``; a rollback discards it, so subscribers such
+as caches never react to state that did not land. Subscribers run after
+the transaction has ended and must not use ``db.session``.
+"""
+from blinker import Namespace
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from src.app_factory_minimal import db
+
+library_signals = Namespace()
+
+# data: book_id, action ('added', 'updated' or 'deleted'), title, author, isbn
+book_changed = library_signals.signal('book-changed')
+# data: user_id, action ('updated' or 'deleted')
+user_changed = library_signals.signal('user-changed')
+# data: record_id, user_id, book_id, title, available_quantity (after the loan), due_date
+book_borrowed = library_signals.signal('book-borrowed')
+# data: record_id, user_id, book_id, title, available_quantity (after the return), overdue, fine
+book_returned = library_signals.signal('book-returned')
+# data: loans, total (fines recalculated on open overdue loans)
+fines_assessed = library_signals.signal('fines-assessed')
+
+LIBRARY_SIGNALS = (book_changed, user_changed, book_borrowed, book_returned, fines_assessed)
+
+_PENDING_KEY = 'pending_library_signals'
+
+def send_after_commit(signal, **data):
+    """Queue ``signal`` to be sent when the current ``db.session`` transaction commits."""
+    sender = current_app._get_current_object() if has_app_context() else None
+    session = db.session()
+    if not session.in_transaction():
+        # Begin (no SQL yet) so that a rollback before any statement still discards the signal
+        session.begin()
+    session.info.setdefault(_PENDING_KEY, []).append((signal, sender, data))
+
+def connect_library_signals(receiver):
+    """Subscribe ``receiver(sender, **data)`` to every library signal (strong reference)."""
+    for signal in LIBRARY_SIGNALS:
+        signal.connect(receiver, weak=False)
+
+@event.listens_for(Session, 'after_commit')
+def _send_pending_signals(session):
+    for signal, sender, data in session.info.pop(_PENDING_KEY, ()):
+        signal.send(sender, **data)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_pending_signals(session, previous_transaction):
+    # Fires for every rollback() call, even when no SQL was issued yet
+    if not session.in_transaction():
+        session.info.pop(_PENDING_KEY, None)
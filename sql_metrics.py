@@ -0,0 +1,171 @@
+"""Per-request SQL instrumentation.
+
+``before_cursor_execute``/``after_cursor_execute`` listeners record, for each
+Flask request, the number of statements, the total time spent in the
+database and the slowest statement. Every response carries them in a
+``Server-Timing`` header, and they are aggregated per endpoint in
+``metrics_registry``, served to admins at ``/api/metrics``.
+"""
+import threading
+import time
+import weakref
+from flask import Blueprint, g, has_request_context, jsonify, request, session
+from sqlalchemy import event
+
+SLOW_STATEMENT_CHARS = 500
+# Registry key of every request no route matched (404s, scanners): one entry, not one per URL
+UNMATCHED_ENDPOINT = '<unmatched>'
+
+_instrumented_engines = weakref.WeakSet()
+
+def _empty_stats():
+    return {'count': 0, 'db_ms': 0.0, 'slowest_ms': 0.0, 'slowest_statement': None}
+
+def request_sql_stats():
+    """SQL stats recorded so far for the current request."""
+    if not has_request_context():
+        return _empty_stats()
+    if 'sql_stats' not in g:
+        g.sql_stats = _empty_stats()
+    return g.sql_stats
+
+def merge_request_sql_stats(stats):
+    """Add stats recorded elsewhere on the request's behalf (e.g. by a worker thread) to the current request's."""
+    if not has_request_context() or not stats:
+        return
+    current = request_sql_stats()
+    current['count'] += stats['count']
+    current['db_ms'] += stats['db_ms']
+    if stats['slowest_statement'] and stats['slowest_ms'] >= current['slowest_ms']:
+        current['slowest_ms'] = stats['slowest_ms']
+        current['slowest_statement'] = stats['slowest_statement']
+
+def install_sql_listeners(engine):
+    """Attach the timing listeners to ``engine`` (idempotent)."""
+    if engine in _instrumented_engines:
+        return
+    _instrumented_engines.add(engine)
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _start_timer(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._sql_metrics_start = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _record_statement(conn, cursor, statement, parameters, context, executemany):
+        if not has_request_context():
+            return
+        started = getattr(context, '_sql_metrics_start', None)
+        elapsed_ms = (time.perf_counter() - started) * 1000 if started is not None else 0.0
+        stats = request_sql_stats()
+        stats['count'] += 1
+        stats['db_ms'] += elapsed_ms
+        if elapsed_ms >= stats['slowest_ms']:
+            stats['slowest_ms'] = elapsed_ms
+            stats['slowest_statement'] = statement
+
+class SqlMetricsRegistry:
+    """Thread-safe per-endpoint aggregation of request SQL stats."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, stats, request_ms):
+        with self._lock:
+            entry = self._endpoints.setdefault(endpoint, {
+                'requests': 0, 'queries': 0, 'db_ms': 0.0, 'request_ms': 0.0,
+                'max_db_ms': 0.0, 'max_queries': 0, 'slowest_ms': 0.0, 'slowest_statement': None,
+            })
+            entry['requests'] += 1
+            entry['queries'] += stats['count']
+            entry['db_ms'] += stats['db_ms']
+            entry['request_ms'] += request_ms
+            entry['max_db_ms'] = max(entry['max_db_ms'], stats['db_ms'])
+            entry['max_queries'] = max(entry['max_queries'], stats['count'])
+            if stats['slowest_statement'] and stats['slowest_ms'] >= entry['slowest_ms']:
+                entry['slowest_ms'] = stats['slowest_ms']
+                entry['slowest_statement'] = stats['slowest_statement'][:SLOW_STATEMENT_CHARS]
+
+    def snapshot(self):
+        """Per-endpoint totals and averages, heaviest total DB time first."""
+        with self._lock:
+            entries = [(endpoint, dict(entry)) for endpoint, entry in self._endpoints.items()]
+        report = []
+        for endpoint, entry in entries:
+            requests = entry['requests']
+            report.append({
+                'endpoint': endpoint,
+                'requests': requests,
+                'total_queries': entry['queries'],
+                'avg_queries': round(entry['queries'] / requests, 2),
+                'max_queries': entry['max_queries'],
+                'total_db_ms': round(entry['db_ms'], 3),
+                'avg_db_ms': round(entry['db_ms'] / requests, 3),
+                'max_db_ms': round(entry['max_db_ms'], 3),
+                'avg_request_ms': round(entry['request_ms'] / requests, 3),
+                'slowest_ms': round(entry['slowest_ms'], 3),
+                'slowest_statement': entry['slowest_statement'],
+            })
+        report.sort(key=lambda item: item['total_db_ms'], reverse=True)
+        return report
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+metrics_registry = SqlMetricsRegistry()
+
+def init_sql_metrics(app, db):
+    """Instrument the app's engine and emit/aggregate per-request SQL stats."""
+    with app.app_context():
+        install_sql_listeners(db.engine)
+
+    @app.before_request
+    def _start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _emit_sql_metrics(response):
+        stats = request_sql_stats()
+        request_ms = (time.perf_counter() - g.get('request_started', time.perf_counter())) * 1000
+        timing = [
+            f'db;dur={stats["db_ms"]:.2f};desc="{stats["count"]} queries"',
+            f'app;dur={request_ms:.2f}',
+        ]
+        if stats['count']:
+            timing.append(f'db-slowest;dur={stats["slowest_ms"]:.2f}')
+        response.headers.add('Server-Timing', ', '.join(timing))
+        metrics_registry.record(request.endpoint or UNMATCHED_ENDPOINT, stats, request_ms)
+        return response
+
+metrics_bp = Blueprint('metrics_api', __name__)
+
+def _is_admin():
+    from src.models import User
+
+    if 'user_id' not in session:
+        return False
+    user = User.query.get(session['user_id'])
+    return bool(user and user.role == 'admin')
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Aggregated per-endpoint SQL metrics"""
+    if not _is_admin():
+        return jsonify({'error': 'Access denied'}), 403
+    from src.search_cache import search_cache_stats
+
+    return jsonify({
+        'success': True,
+        'endpoints': metrics_registry.snapshot(),
+        'search_cache': search_cache_stats()
+    })
+
+@metrics_bp.route('/metrics', methods=['DELETE'])
+def reset_metrics():
+    """Reset the aggregated SQL metrics"""
+    if not _is_admin():
+        return jsonify({'error': 'Access denied'}), 403
+    metrics_registry.reset()
+    return jsonify({'success': True})
@@ -0,0 +1,87 @@
+"""SQLite engine profile: per-connection PRAGMAs and pool settings for create_app."""
+import os
+from sqlalchemy import event
+
+# PRAGMAs applied to every new DBAPI connection, keyed by profile name.
+SQLITE_PROFILES = {
+    'default': {},
+    'production': {
+        'journal_mode': 'WAL',          # readers no longer block the writer
+        'synchronous': 'NORMAL',        # fsync on checkpoint, not on every commit (safe with WAL)
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64000,           # negative value is KiB, i.e. ~64 MB page cache
+        'busy_timeout': 5000,           # ms to wait on a locked database before failing
+        'temp_store': 'MEMORY',
+    },
+}
+
+SQLITE_POOL_OPTIONS = {
+    'pool_size': 10,
+    'max_overflow': 20,
+    'pool_timeout': 30,
+}
+
+_ALLOWED_PRAGMAS = {
+    'journal_mode', 'synchronous', 'mmap_size', 'cache_size', 'busy_timeout',
+    'temp_store', 'foreign_keys', 'wal_autocheckpoint', 'journal_size_limit',
+}
+
+def resolve_pragmas(profile='production', overrides=None):
+    """Return the PRAGMA dict for ``profile`` with ``overrides`` applied."""
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown SQLite profile '{profile}'")
+    pragmas = dict(SQLITE_PROFILES[profile])
+    pragmas.update(overrides or {})
+    unknown = set(pragmas) - _ALLOWED_PRAGMAS
+    if unknown:
+        raise ValueError(f"Unsupported SQLite PRAGMA(s): {', '.join(sorted(unknown))}")
+    return pragmas
+
+def sqlite_engine_options(pragmas, pool_options=None):
+    """Build ``create_engine`` keyword arguments for a file-backed SQLite database."""
+    options = dict(SQLITE_POOL_OPTIONS)
+    options.update(pool_options or {})
+    busy_timeout = pragmas.get('busy_timeout')
+    if busy_timeout is not None:
+        options['connect_args'] = {'timeout': busy_timeout / 1000.0}
+    return options
+
+def install_pragmas(engine, pragmas):
+    """Run ``pragmas`` on every connection ``engine`` opens."""
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+def configure_sqlite(app):
+    """Set engine options for the app's SQLite profile. Call before ``db.init_app``.
+
+    The profile comes from ``SQLITE_PROFILE`` (app config or environment,
+    default ``production``); ``SQLITE_PRAGMAS`` and ``SQLITE_POOL_OPTIONS``
+    override individual settings.
+    """
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI', '')
+    if not uri.startswith('sqlite') or ':memory:' in uri or uri.rstrip('/') == 'sqlite:':
+        app.config['SQLITE_ACTIVE_PRAGMAS'] = {}
+        return
+
+    profile = app.config.get('SQLITE_PROFILE') or os.environ.get('SQLITE_PROFILE', 'production')
+    pragmas = resolve_pragmas(profile, app.config.get('SQLITE_PRAGMAS'))
+    engine_options = sqlite_engine_options(pragmas, app.config.get('SQLITE_POOL_OPTIONS'))
+    engine_options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+
+    app.config['SQLITE_PROFILE'] = profile
+    app.config['SQLITE_ACTIVE_PRAGMAS'] = pragmas
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
+
+def install_sqlite_pragmas(app, db):
+    """Attach the profile's PRAGMA hook to the app's engine. Call after ``db.init_app``."""
+    with app.app_context():
+        install_pragmas(db.engine, app.config.get('SQLITE_ACTIVE_PRAGMAS', {}))
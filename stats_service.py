@@ -0,0 +1,99 @@
+"""Headline library statistics shared by every dashboard.
+
+``get_stats()`` returns the library counters plus overdue and recent
+circulation counts, computed by ``compute_stats()`` in a single SELECT on
+the primary engine. Recent circulation (today, the last ``RECENT_DAYS``
+calendar days) is read from the ``circulation_daily`` rollup and the
+overdue count from ``overdue_index``. Results are cached per app for
+``STATS_CACHE_TTL`` seconds and dropped as soon as a library signal reports
+a committed write.
+Rankings (most borrowed books, most active users) live in ``leaderboards``.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, select
+from src.models import db, CirculationDaily, LibraryCounter
+from src.library_counters import COUNT_COUNTERS, COUNTER_NAMES, reconcile_counters
+from src.overdue_index import overdue_count
+from src.signals import connect_library_signals
+
+STATS_CACHE_TTL = 5.0
+RECENT_DAYS = 7
+
+class StatsCache:
+    """Thread-safe TTL cache; ``invalidate`` also discards computations in flight."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._generations = {}
+
+    def get(self, key, ttl, compute):
+        with self._lock:
+            entry = self._entries.get(key)
+            generation = self._generations.get(key, 0)
+        if entry and time.monotonic() - entry[0] < ttl:
+            return entry[1]
+        value = compute()
+        with self._lock:
+            # A write that committed while we computed makes the value stale already
+            if generation == self._generations.get(key, 0):
+                self._entries[key] = (time.monotonic(), value)
+        return value
+
+    def invalidate(self, *keys):
+        """Drop ``keys`` (all entries if none are given)."""
+        with self._lock:
+            for key in keys or list(self._entries):
+                self._generations[key] = self._generations.get(key, 0) + 1
+                self._entries.pop(key, None)
+
+def _cache(app=None):
+    app = app or current_app
+    return app.extensions.setdefault('stats_cache', StatsCache())
+
+def _stats_statement(now):
+    today = now.date()
+
+    def counter(name):
+        return select(LibraryCounter.value).where(LibraryCounter.name == name).scalar_subquery()
+
+    def circulation(column, *criteria):
+        return select(func.coalesce(func.sum(column), 0)).where(*criteria).scalar_subquery()
+
+    return select(
+        *[counter(name).label(name) for name in COUNTER_NAMES],
+        circulation(CirculationDaily.issues,
+                    CirculationDaily.day > today - timedelta(days=RECENT_DAYS)).label('issued_recently'),
+        circulation(CirculationDaily.issues, CirculationDaily.day == today).label('issued_today'),
+        circulation(CirculationDaily.returns, CirculationDaily.day == today).label('returned_today'),
+    )
+
+def compute_stats():
+    """Compute the headline statistics in one statement (bypassing the cache)."""
+    now = datetime.utcnow()
+    row = db.session.execute(_stats_statement(now), bind_arguments={'bind': db.engine}).one()._mapping
+    if any(row[name] is None for name in COUNTER_NAMES):
+        # Counters not seeded yet
+        reconcile_counters(fix=True)
+        row = db.session.execute(_stats_statement(now), bind_arguments={'bind': db.engine}).one()._mapping
+
+    stats = {name: int(row[name]) if name in COUNT_COUNTERS else float(row[name]) for name in COUNTER_NAMES}
+    for name in ('issued_recently', 'issued_today', 'returned_today'):
+        stats[name] = int(row[name] or 0)
+    stats['overdue_loans'] = overdue_count(now)
+    stats['computed_at'] = now.isoformat()
+    return stats
+
+def get_stats():
+    """Cached headline statistics; see ``compute_stats``."""
+    return _cache().get('stats', current_app.config.get('STATS_CACHE_TTL', STATS_CACHE_TTL), compute_stats)
+
+def invalidate_stats(sender=None, **data):
+    """Drop the cached headline stats for ``sender`` (the app) after a committed write."""
+    if sender is not None:
+        _cache(sender).invalidate('stats')
+
+connect_library_signals(invalidate_stats)
@@ -1,11 +1,28 @@
-from flask import Blueprint, jsonify, request, session
+from flask import Blueprint, abort, jsonify, request, session
 from src.models import db, User, Book, BorrowRecord, Fees
 from datetime import datetime, timedelta
-from sqlalchemy import func, and_
+from sqlalchemy import and_
+from sqlalchemy.orm import joinedload
+from src.library_counters import increment_counters
+from src.circulation_rollup import record_circulation
+from src.signals import book_borrowed, book_returned, send_after_commit, user_changed
+from src.stats_service import get_stats
+from src.student_snapshots import get_student_snapshot
+from src.query_budget import query_budget
+from src.catalog_etag import catalog_etag
+from src.book_search import normalize_isbn, search_books_query
+from src.fuzzy_search import fuzzy_search_books
+from src.search_cache import cached_search
+from src.keyset_pagination import InvalidCursor, clamp_page_size, decode_cursor, keyset_page
+from src.catalog_pages import (
+    BOOK_FIELDS, InvalidFields, book_dict, only_fields, parse_fields, position_cursor, read_position,
+    stream_books, wants_stream,
+)
 
 student_bp = Blueprint('student_api', __name__)
 
 @student_bp.route('/dashboard/<int:user_id>', methods=['GET'])
+@query_budget(2)
 def get_dashboard_data(user_id):
     """Get comprehensive dashboard data for a student"""
     try:
@@ -13,54 +30,32 @@ def get_dashboard_data(user_id):
         if 'user_id' not in session or session['user_id'] != user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        # Get user info
-        user = User.query.get_or_404(user_id)
-        if user.role != 'student':
+        # Cached per student; the available count is shared library-wide
+        snapshot = get_student_snapshot(user_id)
+        if snapshot is None:
+            abort(404)
+        if snapshot['role'] != 'student':
             return jsonify({'error': 'Access denied'}), 403
         
-        # Count borrowed books
-        borrowed_count = BorrowRecord.query.filter_by(
-            user_id=user_id,
-            return_date=None
-        ).count()
-        
-        # Count available books
-        available_count = Book.query.filter(
-            Book.available_quantity > 0
-        ).count()
-        
-        # Count overdue books
-        overdue_count = BorrowRecord.query.filter(
-            and_(
-                BorrowRecord.user_id == user_id,
-                BorrowRecord.return_date.is_(None),
-                BorrowRecord.due_date < datetime.utcnow()
-            )
-        ).count()
-        
-        # Calculate total fines
-        total_fines = db.session.query(
-            func.coalesce(func.sum(Fees.amount), 0)
-        ).filter_by(user_id=user_id).scalar()
-        
         return jsonify({
             'success': True,
             'user': {
-                'id': user.id,
-                'fullname': user.fullname,
-                'email': user.email,
-                'username': user.username
+                'id': snapshot['id'],
+                'fullname': snapshot['fullname'],
+                'email': snapshot['email'],
+                'username': snapshot['username']
             },
-            'borrowedCount': borrowed_count,
-            'availableCount': available_count,
-            'overdueCount': overdue_count,
-            'totalFines': float(total_fines)
+            'borrowedCount': snapshot['borrowed_count'],
+            'availableCount': get_stats()['available_titles'],
+            'overdueCount': snapshot['overdue_count'],
+            'totalFines': snapshot['total_fines']
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @student_bp.route('/activity/<int:user_id>', methods=['GET'])
+@query_budget(2)
 def get_recent_activity(user_id):
     """Get recent activity for a student"""
     try:
@@ -69,7 +64,9 @@ def get_recent_activity(user_id):
             return jsonify({'error': 'Unauthorized'}), 401
         
         # Get recent borrow records
-        recent_borrows = BorrowRecord.query.filter_by(
+        recent_borrows = BorrowRecord.query.options(
+            joinedload(BorrowRecord.book)
+        ).filter_by(
             user_id=user_id
         ).order_by(
             BorrowRecord.borrow_date.desc()
@@ -86,7 +83,7 @@ def get_recent_activity(user_id):
         
         # Add borrow activities
         for record in recent_borrows:
-            book = Book.query.get(record.book_id)
+            book = record.book
             activities.append({
                 'type': 'borrow',
                 'title': 'Book Borrowed',
@@ -99,7 +96,7 @@ def get_recent_activity(user_id):
         # Add return activities (if returned)
         for record in recent_borrows:
             if record.return_date:
-                book = Book.query.get(record.book_id)
+                book = record.book
                 activities.append({
                     'type': 'return',
                     'title': 'Book Returned',
@@ -131,6 +128,7 @@ def get_recent_activity(user_id):
         return jsonify({'error': str(e)}), 500
 
 @student_bp.route('/books/borrowed/<int:user_id>', methods=['GET'])
+@query_budget(1)
 def get_borrowed_books(user_id):
     """Get all books currently borrowed by a student"""
     try:
@@ -173,71 +171,87 @@ def get_borrowed_books(user_id):
         return jsonify({'error': str(e)}), 500
 
 @student_bp.route('/books/available', methods=['GET'])
+@query_budget(2)
+@catalog_etag()
 def get_available_books():
-    """Get all available books"""
+    """Available books in id order: a page at a time, or all of them with format=ndjson"""
     try:
-        books = Book.query.filter(
-            Book.available_quantity > 0
-        ).all()
+        fields = parse_fields(request.args.get('fields'))
+        books = only_fields(Book.query.filter(Book.available_quantity > 0), fields)
         
-        books_data = [{
-            'id': book.id,
-            'title': book.title,
-            'author': book.author,
-            'isbn': book.isbn,
-            'category': book.category,
-            'available_quantity': book.available_quantity,
-            'total_quantity': book.total_quantity,
-            'description': book.description
-        } for book in books]
+        if wants_stream():
+            cursor = request.args.get('cursor')
+            if cursor:
+                books = books.filter(Book.id > decode_cursor(cursor))
+            return stream_books(books.order_by(Book.id), fields)
+        
+        per_page = clamp_page_size(request.args.get('per_page', type=int))
+        books, next_cursor = keyset_page(books, Book.id, request.args.get('cursor'), per_page)
         
         return jsonify({
             'success': True,
-            'books': books_data
+            'books': [book_dict(book, fields) for book in books],
+            'next_cursor': next_cursor,
+            'per_page': per_page
         })
         
+    except (InvalidCursor, InvalidFields) as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# total_quantity on request only
+SEARCH_FIELDS = tuple(name for name in BOOK_FIELDS if name != 'total_quantity')
+
 @student_bp.route('/books/search', methods=['GET'])
 def search_books():
-    """Search books by title, author, or category"""
+    """Search available books (best matches first, typo-tolerant), a page at a time or as NDJSON"""
     try:
         query = request.args.get('q', '')
         category = request.args.get('category', '')
+        fields = parse_fields(request.args.get('fields'), SEARCH_FIELDS)
+        matches = only_fields(
+            search_books_query(query, rank_limit=None, category=category).filter(Book.available_quantity > 0),
+            fields
+        )
         
-        books_query = Book.query.filter(Book.available_quantity > 0)
-        
-        if query:
-            books_query = books_query.filter(
-                Book.title.ilike(f'%{query}%') |
-                Book.author.ilike(f'%{query}%')
-            )
-        
-        if category:
-            books_query = books_query.filter(
-                Book.category.ilike(f'%{category}%')
-            )
-        
-        books = books_query.all()
+        if wants_stream():
+            # Every index match, best first; without the typo-tolerant fallback
+            return stream_books(matches, fields)
+        
+        per_page = clamp_page_size(request.args.get('per_page', type=int))
+        offset, fuzzy = read_position(request.args.get('cursor'))
+        
+        def search():
+            corrections, typo_tolerant = {}, fuzzy
+            if not fuzzy:
+                books = matches.offset(offset).limit(per_page + 1).all()
+                # Nothing matched as typed: retry with similar catalog words (an unknown ISBN is no typo)
+                typo_tolerant = not books and offset == 0 and bool(query.strip()) and not normalize_isbn(query)
+            if typo_tolerant:
+                books, corrections = fuzzy_search_books(query, Book.available_quantity > 0, category=category)
+                books = books[offset:offset + per_page + 1]
+            return {
+                'books': [book_dict(book, fields) for book in books[:per_page]],
+                'corrections': corrections,
+                'next_cursor': position_cursor(offset + per_page, typo_tolerant) if len(books) > per_page else None
+            }
         
-        books_data = [{
-            'id': book.id,
-            'title': book.title,
-            'author': book.author,
-            'isbn': book.isbn,
-            'category': book.category,
-            'available_quantity': book.available_quantity,
-            'description': book.description
-        } for book in books]
+        found = cached_search('student.search_books', query, {'category': category}, search,
+                              page=[offset, fuzzy, per_page, fields])
         
         return jsonify({
             'success': True,
-            'books': books_data,
+            'books': found['books'],
             'query': query,
-            'category': category
+            'category': category,
+            'corrections': found['corrections'],
+            'next_cursor': found['next_cursor'],
+            'per_page': per_page
         })
         
+    except (InvalidCursor, InvalidFields) as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -280,6 +294,17 @@ def borrow_book():
         book.available_quantity -= 1
         
         db.session.add(borrow_record)
+        db.session.flush()
+        increment_counters(
+            open_loans=1,
+            total_loans=1,
+            available_copies=-1,
+            available_titles=-1 if book.available_quantity == 0 else 0
+        )
+        record_circulation(book, user_id, issues=1)
+        send_after_commit(book_borrowed, record_id=borrow_record.id, user_id=user_id, book_id=book_id,
+                          title=book.title, available_quantity=book.available_quantity,
+                          due_date=borrow_record.due_date.isoformat())
         db.session.commit()
         
         return jsonify({
@@ -336,6 +361,17 @@ def return_book():
             )
             db.session.add(fine)
         
+        increment_counters(
+            open_loans=-1,
+            available_copies=1,
+            available_titles=1 if book.available_quantity == 1 else 0,
+            total_fine_count=1 if fine_amount > 0 else 0,
+            total_fines=fine_amount
+        )
+        record_circulation(book, user_id, returns=1, fine=fine_amount)
+        send_after_commit(book_returned, record_id=record.id, user_id=user_id, book_id=book_id,
+                          title=book.title, available_quantity=book.available_quantity,
+                          overdue=record.due_date < record.return_date, fine=fine_amount)
         db.session.commit()
         
         return jsonify({
@@ -349,36 +385,28 @@ def return_book():
         return jsonify({'error': str(e)}), 500
 
 @student_bp.route('/profile/<int:user_id>', methods=['GET'])
+@query_budget(1)
 def get_profile(user_id):
     """Get student profile information"""
     try:
         if 'user_id' not in session or session['user_id'] != user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get_or_404(user_id)
-        
-        # Get borrowing statistics
-        total_borrowed = BorrowRecord.query.filter_by(user_id=user_id).count()
-        currently_borrowed = BorrowRecord.query.filter_by(
-            user_id=user_id,
-            return_date=None
-        ).count()
-        
-        total_fines = db.session.query(
-            func.coalesce(func.sum(Fees.amount), 0)
-        ).filter_by(user_id=user_id).scalar()
+        snapshot = get_student_snapshot(user_id)
+        if snapshot is None:
+            abort(404)
         
         return jsonify({
             'success': True,
             'profile': {
-                'id': user.id,
-                'fullname': user.fullname,
-                'email': user.email,
-                'username': user.username,
-                'role': user.role,
-                'total_borrowed': total_borrowed,
-                'currently_borrowed': currently_borrowed,
-                'total_fines': float(total_fines)
+                'id': snapshot['id'],
+                'fullname': snapshot['fullname'],
+                'email': snapshot['email'],
+                'username': snapshot['username'],
+                'role': snapshot['role'],
+                'total_borrowed': snapshot['lifetime_borrows'],
+                'currently_borrowed': snapshot['borrowed_count'],
+                'total_fines': snapshot['total_fines']
             }
         })
         
@@ -401,6 +429,7 @@ def update_profile(user_id):
         if 'email' in data:
             user.email = data['email']
         
+        send_after_commit(user_changed, user_id=user_id, action='updated')
         db.session.commit()
         
         return jsonify({
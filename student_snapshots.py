@@ -0,0 +1,121 @@
+"""Per-student dashboard snapshots.
+
+``get_student_snapshot(user_id)`` returns the student's account fields and
+loan/fine aggregates (open and overdue loans, lifetime loans, fine total),
+computed in one statement and cached per app. An entry is dropped when a
+library signal concerns that user (borrow, return, fee, profile change)
+and otherwise lives for ``STUDENT_SNAPSHOT_TTL`` seconds, or until the
+next open loan falls due, since that changes the overdue count without
+any write. Library-wide figures come from ``stats_service.get_stats()``,
+shared by all students, so a storm of logins costs one snapshot query per
+student.
+
+Caches are per process: a write handled by another worker process is seen
+here once the entry expires.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import func, select
+from src.models import db, User, BorrowRecord, Fees
+from src.signals import book_borrowed, book_returned, user_changed
+
+STUDENT_SNAPSHOT_TTL = 60.0
+MAX_SNAPSHOTS = 10000
+
+class SnapshotCache:
+    """Thread-safe LRU of per-key snapshots with per-entry expiry."""
+
+    def __init__(self, max_entries=MAX_SNAPSHOTS):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._generations = {}
+        self.max_entries = max_entries
+
+    def get(self, key, compute):
+        """Return the cached value for ``key`` or store ``compute()``'s ``(value, expires_at)``."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() < entry[0]:
+                self._entries.move_to_end(key)
+                return entry[1]
+            generation = self._generations.get(key, 0)
+        value, expires_at = compute()
+        with self._lock:
+            # An invalidation while we computed means the value may predate the write
+            if generation == self._generations.get(key, 0):
+                self._entries[key] = (expires_at, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+def _cache(app=None):
+    app = app or current_app
+    return app.extensions.setdefault('student_snapshots', SnapshotCache())
+
+def compute_student_snapshot(user_id):
+    """One-statement snapshot for ``user_id``; returns ``(snapshot or None, next_due_date)``."""
+    now = datetime.utcnow()
+    loans = lambda *criteria: select(func.count(BorrowRecord.id)).where(
+        BorrowRecord.user_id == user_id, *criteria).scalar_subquery()
+    open_loan = BorrowRecord.return_date.is_(None)
+
+    row = db.session.execute(select(
+        User.id, User.fullname, User.email, User.username, User.role,
+        loans(open_loan).label('borrowed_count'),
+        loans(open_loan, BorrowRecord.due_date < now).label('overdue_count'),
+        loans().label('lifetime_borrows'),
+        select(func.coalesce(func.sum(Fees.amount), 0)).where(Fees.user_id == user_id)
+            .scalar_subquery().label('total_fines'),
+        select(func.min(BorrowRecord.due_date)).where(
+            BorrowRecord.user_id == user_id, open_loan, BorrowRecord.due_date >= now
+        ).scalar_subquery().label('next_due_date'),
+    ).where(User.id == user_id)).one_or_none()
+
+    if row is None:
+        return None, None
+    snapshot = {
+        'id': row.id,
+        'fullname': row.fullname,
+        'email': row.email,
+        'username': row.username,
+        'role': row.role,
+        'borrowed_count': row.borrowed_count,
+        'overdue_count': row.overdue_count,
+        'lifetime_borrows': row.lifetime_borrows,
+        'total_fines': float(row.total_fines),
+    }
+    return snapshot, row.next_due_date
+
+def get_student_snapshot(user_id):
+    """Cached snapshot for ``user_id`` (``None`` if the user does not exist)."""
+    ttl = current_app.config.get('STUDENT_SNAPSHOT_TTL', STUDENT_SNAPSHOT_TTL)
+
+    def compute():
+        snapshot, next_due = compute_student_snapshot(user_id)
+        lifetime = ttl if snapshot is not None else 0.0  # new sign-ups aren't signalled
+        if next_due is not None:
+            lifetime = min(lifetime, max(0.0, (next_due - datetime.utcnow()).total_seconds()))
+        return snapshot, time.monotonic() + lifetime
+
+    return _cache().get(user_id, compute)
+
+def invalidate_student_snapshot(sender=None, user_id=None, **data):
+    """Drop the cached snapshot of ``user_id`` for ``sender`` (the app)."""
+    if sender is not None and user_id is not None:
+        _cache(sender).invalidate(user_id)
+
+for _signal in (book_borrowed, book_returned, user_changed):
+    _signal.connect(invalidate_student_snapshot, weak=False)